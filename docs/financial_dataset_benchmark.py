@@ -0,0 +1,161 @@
+import argparse
+import datetime
+import json
+import platform
+import sys
+import tempfile
+import time
+from financial_dataset_generator import TABLE_ROWS, generate
+
+# Scale factors benchmarked by default, relative to the generator's base row counts
+DEFAULT_SCALES = [1, 10, 100]
+
+# A stage regresses when its throughput drops, or its peak memory grows, by
+# more than this fraction compared with the baseline results
+DEFAULT_THRESHOLD = 0.10
+
+# Stages faster than this in the baseline are too short to time reliably, so
+# only their peak memory is compared
+MIN_TIMED_SECONDS = 0.05
+
+# Helper function to run the generator once, in this process, into a scratch directory
+def run_once(scale, seed, trace_memory):
+    with tempfile.TemporaryDirectory() as output_dir:
+        run_start = time.perf_counter()
+        result = generate({
+            "output_dir": output_dir, "scale": scale, "seed": seed, "workers": 1, "trace_memory": trace_memory
+        })
+        result["seconds"] = time.perf_counter() - run_start
+    return result
+
+# Benchmark every stage at one scale factor. Timings are the best of `repeat`
+# untraced runs; peak memory comes from a separate run under tracemalloc, whose
+# overhead would otherwise distort the timings.
+def benchmark_scale(scale, seed, repeat, trace_memory):
+    runs = [run_once(scale, seed, trace_memory=False) for _ in range(repeat)]
+    memory_run = run_once(scale, seed, trace_memory=True) if trace_memory else None
+
+    results = []
+    for stage in runs[0]["stages"]:
+        rows = runs[0]["stages"][stage]["rows"]
+        seconds = min(run["stages"][stage]["seconds"] for run in runs)
+        results.append({
+            "scale": scale,
+            "stage": stage,
+            "rows": rows,
+            "seconds": round(seconds, 6),
+            "rows_per_second": round(rows / seconds, 1) if seconds > 0 else None,
+            "peak_memory": memory_run["stages"][stage]["peak_memory"] if memory_run else None
+        })
+
+    rows = sum(stats["rows"] for stats in runs[0]["stages"].values())
+    seconds = min(run["seconds"] for run in runs)
+    results.append({
+        "scale": scale,
+        "stage": "total",
+        "rows": rows,
+        "seconds": round(seconds, 6),
+        "rows_per_second": round(rows / seconds, 1),
+        "peak_memory": max(r["peak_memory"] for r in results) if memory_run else None
+    })
+    return results
+
+def run_benchmarks(scales, seed, repeat, trace_memory):
+    results = []
+    for scale in scales:
+        scale_results = benchmark_scale(scale, seed, repeat, trace_memory)
+        for result in scale_results:
+            print(format_result(result))
+        results.extend(scale_results)
+    return {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "repeat": repeat,
+        "base_rows": TABLE_ROWS,
+        "results": results
+    }
+
+# Helper function to format one result as a report line
+def format_result(result):
+    peak = result["peak_memory"]
+    rate = result["rows_per_second"]
+    return (
+        f"{result['scale']:>6g}x {result['stage']:<21} {result['rows']:>10} rows "
+        f"{result['seconds']:>9.3f} s {rate or 0:>12.0f} rows/s "
+        f"{'' if peak is None else f'{peak / 2**20:>9.1f} MiB'}"
+    )
+
+# Compare two results files stage by stage and return the regressions: a
+# throughput drop or peak memory growth above the threshold
+def compare_results(baseline, current, threshold):
+    baseline_results = {(r["scale"], r["stage"]): r for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        base = baseline_results.get((result["scale"], result["stage"]))
+        if base is None:
+            continue
+        for metric, worse in (("rows_per_second", lambda old, new: new < old), ("peak_memory", lambda old, new: new > old)):
+            old, new = base[metric], result[metric]
+            if not old or new is None:
+                continue
+            if metric == "rows_per_second" and base["seconds"] < MIN_TIMED_SECONDS:
+                continue
+            change = new / old - 1
+            if worse(old, new) and abs(change) > threshold:
+                regressions.append({
+                    "scale": result["scale"],
+                    "stage": result["stage"],
+                    "metric": metric,
+                    "baseline": old,
+                    "current": new,
+                    "change": round(change, 4)
+                })
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the financial dataset generator stage by stage.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="benchmark every stage and write a results file")
+    run_parser.add_argument("--scales", type=float, nargs="+", default=DEFAULT_SCALES,
+                            help="scale factors to benchmark (default: %(default)s)")
+    run_parser.add_argument("--seed", type=int, default=42, help="random seed (default: %(default)s)")
+    run_parser.add_argument("--repeat", type=int, default=1,
+                            help="timed runs per scale, the fastest is kept (default: %(default)s)")
+    run_parser.add_argument("--no-memory", dest="trace_memory", action="store_false",
+                            help="skip the tracemalloc run that measures peak memory")
+    run_parser.add_argument("--output", default="benchmark_results.json",
+                            help="results file (default: %(default)s)")
+
+    compare_parser = commands.add_parser("compare", help="flag regressions between two results files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                                help="relative change that counts as a regression (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        results = run_benchmarks(args.scales, args.seed, args.repeat, args.trace_memory)
+        with open(args.output, "w") as results_file:
+            json.dump(results, results_file, indent=2)
+        print(f"Benchmark results written to {args.output}.")
+        return 0
+
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    with open(args.current) as current_file:
+        current = json.load(current_file)
+    regressions = compare_results(baseline, current, args.threshold)
+    for regression in regressions:
+        print(
+            f"REGRESSION {regression['scale']:g}x {regression['stage']} {regression['metric']}: "
+            f"{regression['baseline']} -> {regression['current']} ({regression['change']:+.1%})"
+        )
+    if not regressions:
+        print(f"No regressions above {args.threshold:.0%}.")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
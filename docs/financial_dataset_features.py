@@ -0,0 +1,291 @@
+import argparse
+import csv
+import io
+import json
+import os
+import time
+import numpy as np
+from financial_dataset_generator import DEVICE_TYPES
+from financial_dataset_metrics import encode, load_table, month_codes, parse_ids, read_batches, table_paths
+from financial_dataset_sinks import HAVE_PYARROW
+
+# Customer feature store: one row per customer and month (from the month the
+# customer enrolled) with the rolling-window features of the Customer Insights
+# and Service Quality pages, so Power BI imports them instead of computing them
+# row by row.
+#
+# The account_balances, service_interactions and engagement rows are streamed
+# in batches and summed per month and customer into the MONTHLY_TOTALS. Months
+# are then processed in order, and the windows are sums over the totals of the
+# last FEATURE_WINDOWS months, kept in a ring of MAX_WINDOW months (one array
+# per total, typed as in RING_TYPES).
+# The ring as of the last month is saved with the store, so `update` after an
+# --append-months run only reads the last month (which an append can extend)
+# and the new ones, and rewrites the feature table from that month on.
+FEATURE_DIR = "feature_store"
+FEATURE_META = "features.json"
+FEATURE_RING = "recent_totals.npz"
+FEATURE_TABLE = "customer_features.csv"
+
+# Rolling windows, in months, each ending with the row's own month
+FEATURE_WINDOWS = [3, 6, 12]
+MAX_WINDOW = max(FEATURE_WINDOWS)
+
+# Per-customer totals of one month: net flows (contributions - withdrawals),
+# balance, interactions, satisfaction score sum, unresolved interactions,
+# engagement sessions and sessions per device type
+DEVICE_TOTALS = [device.lower().replace(" ", "_") for device in DEVICE_TYPES]
+MONTHLY_TOTALS = ["net_flow", "balance", "interactions", "satisfaction", "unresolved", "sessions"] + DEVICE_TOTALS
+
+# Ring types: money and satisfaction sums stay float64, so the windows match a
+# sum over the rows exactly; counts are kept as uint16 (widened to uint32 if a
+# customer ever has more in one month). That is 40 bytes per customer-month
+# instead of 88, or 480 bytes per customer for the whole ring.
+COUNT_TOTALS = ["interactions", "unresolved", "sessions"] + DEVICE_TOTALS
+RING_TYPES = {name: np.uint16 if name in COUNT_TOTALS else np.float64 for name in MONTHLY_TOTALS}
+
+# Feature table columns: windowed features for every window, then the device
+# mix (each device type's share of sessions) over the longest window
+WINDOWED_FEATURES = [
+    ("net_flow", "float"), ("balance_growth", "float"), ("interactions", "int"),
+    ("avg_satisfaction", "float"), ("unresolved_interactions", "int"), ("sessions", "int")
+]
+FEATURE_COLUMNS = (
+    [("customer_id", "str"), ("month", "date"), ("tenure_months", "int"), ("balance", "float")]
+    + [(f"{name}_{window}m", kind) for name, kind in WINDOWED_FEATURES for window in FEATURE_WINDOWS]
+    + [(f"{device}_share_{MAX_WINDOW}m", "float") for device in DEVICE_TOTALS]
+)
+
+# Source tables and the columns read from each
+SOURCE_COLUMNS = {
+    "account_balances": ["customer_id", "date", "balance", "contributions_mtd", "withdrawals_mtd"],
+    "service_interactions": ["customer_id", "date", "satisfaction_score", "resolution_status"],
+    "engagement": ["customer_id", "date", "device_type"]
+}
+
+# Helper function for the values a batch of a source table adds to each of its
+# monthly totals (None counts rows)
+def source_values(table, batch):
+    if table == "account_balances":
+        return {"net_flow": batch["contributions_mtd"] - batch["withdrawals_mtd"], "balance": batch["balance"]}
+    if table == "service_interactions":
+        return {
+            "interactions": None,
+            "satisfaction": batch["satisfaction_score"],
+            "unresolved": batch["resolution_status"] == "Unresolved"
+        }
+    devices = encode(batch["device_type"], DEVICE_TYPES)
+    return {"sessions": None, **{name: devices == code for code, name in enumerate(DEVICE_TOTALS)}}
+
+# Helper function to widen the monthly totals, whose first row is month first,
+# to cover months low to high - 1; returns their new first month
+def widen_totals(totals, first, low, high):
+    rows = len(totals["balance"])
+    if rows:
+        low, high = min(low, first), max(high, first + rows)
+        if (low, high) == (first, first + rows):
+            return first
+    for name, total in totals.items():
+        totals[name] = np.zeros((high - low, total.shape[1]), dtype=total.dtype)
+        if rows:
+            totals[name][first - low:first - low + rows] = total
+    return low
+
+# Helper function to sum the source tables' rows from first_month ("YYYY-MM",
+# None for all of them) per month and customer. The tables are streamed in
+# batches (see read_batches()), so only the totals are held: per monthly total,
+# a months x customers array (counts as uint32) whose first row is month
+# "first". Returns the totals and that first month (None without rows).
+def load_totals(output_dir, num_customers, first_month=None):
+    months = None if first_month is None else (first_month, "9999-12")
+    start = None if first_month is None else int(month_codes(np.datetime64(first_month, "M"), 0))
+    totals = {
+        name: np.zeros((0, num_customers), dtype=np.uint32 if name in COUNT_TOTALS else np.float64)
+        for name in MONTHLY_TOTALS
+    }
+    first = None
+    for table, columns in SOURCE_COLUMNS.items():
+        for _, batch in read_batches(table_paths(output_dir, table, months), table, columns):
+            month = month_codes(batch["date"], 0)
+            keep = slice(None) if start is None else month >= start
+            month = month[keep]
+            if not len(month):
+                continue
+
+            first = widen_totals(totals, first, int(month.min()), int(month.max()) + 1)
+            cells = (month - first, parse_ids(batch["customer_id"][keep]))
+            for name, values in source_values(table, batch).items():
+                np.add.at(totals[name], cells, 1 if values is None else values[keep])
+    return totals, first
+
+# Helper function to take one month's totals as float64 arrays, zeros for a
+# month without rows
+def month_totals(totals, first, month, num_customers):
+    if first is None or not first <= month < first + len(totals["balance"]):
+        return {name: np.zeros(num_customers) for name in MONTHLY_TOTALS}
+    return {name: total[month - first].astype(np.float64) for name, total in totals.items()}
+
+# Helper function to keep a month's totals in its slot of the ring
+def store_totals(ring, month, totals):
+    for name, total in totals.items():
+        if ring[name].dtype.kind == "u" and total.max(initial=0) > np.iinfo(ring[name].dtype).max:
+            ring[name] = ring[name].astype(np.uint32)
+        ring[name][month % MAX_WINDOW] = total
+
+# Helper function to divide where the denominator is positive, NaN elsewhere
+def ratio(numerator, denominator):
+    return np.divide(numerator, denominator, out=np.full(len(numerator), np.nan), where=denominator > 0)
+
+# Helper function to compute a month's feature columns for the given customers
+# from its totals and the ring of the MAX_WINDOW previous months' totals
+def month_features(month, totals, ring, customers, enrollment_months):
+    # Window sums of each total for the given customers, adding one earlier
+    # month of the ring at a time
+    window_totals = {window: {} for window in FEATURE_WINDOWS}
+    for name, total in totals.items():
+        running = total.copy()
+        for back in range(1, MAX_WINDOW):
+            running += ring[name][(month - back) % MAX_WINDOW]
+            if back + 1 in FEATURE_WINDOWS:
+                window_totals[back + 1][name] = running[customers]
+
+    balance = totals["balance"][customers]
+    features = {
+        "tenure_months": month - enrollment_months[customers],
+        "balance": np.round(balance, 2)
+    }
+    for window in FEATURE_WINDOWS:
+        window_sum = lambda name: window_totals[window][name]
+        earlier_balance = ring["balance"][(month - window) % MAX_WINDOW][customers]
+        interactions = window_sum("interactions")
+        features[f"net_flow_{window}m"] = np.round(window_sum("net_flow"), 2)
+        features[f"balance_growth_{window}m"] = np.round(ratio(balance, earlier_balance) - 1, 4)
+        features[f"interactions_{window}m"] = interactions
+        features[f"avg_satisfaction_{window}m"] = np.round(ratio(window_sum("satisfaction"), interactions), 2)
+        features[f"unresolved_interactions_{window}m"] = window_sum("unresolved")
+        features[f"sessions_{window}m"] = window_sum("sessions")
+    sessions = window_totals[MAX_WINDOW]["sessions"]
+    for device in DEVICE_TOTALS:
+        device_sessions = window_totals[MAX_WINDOW][device]
+        features[f"{device}_share_{MAX_WINDOW}m"] = np.round(ratio(device_sessions, sessions), 4)
+    return features
+
+# Helper function to write a month's feature columns as CSV rows to a binary
+# file, through pyarrow's CSV writer when it is installed (formatting the
+# numbers is most of the work) and the csv module otherwise. Missing ratios
+# (no earlier balance, no interactions or sessions) are left empty.
+def write_feature_rows(out, customer_ids, month_string, features):
+    columns = [customer_ids, np.full(len(customer_ids), month_string)]
+    for name, kind in FEATURE_COLUMNS[2:]:
+        # Integer counts, and floats without negative zeros
+        columns.append(features[name].astype(np.int64) if kind == "int" else features[name] + 0.0)
+
+    if HAVE_PYARROW:
+        import pyarrow as pa
+        import pyarrow.csv as pa_csv
+
+        arrow_table = pa.table(
+            [pa.array(column, from_pandas=True) for column in columns], names=[name for name, _ in FEATURE_COLUMNS]
+        )
+        pa_csv.write_csv(arrow_table, out, pa_csv.WriteOptions(include_header=False, quoting_style="none", eol="\r\n"))
+        return
+
+    text = io.StringIO(newline="")
+    csv.writer(text).writerows(zip(*(
+        np.where(np.isnan(column), None, column).tolist() if column.dtype == np.float64 else column.tolist()
+        for column in columns
+    )))
+    out.write(text.getvalue().encode())
+
+# Build the feature store from the generated tables, in any output format, or
+# with update=True extend an existing one after an --append-months run (built
+# from scratch when there is none yet). Returns the store's metadata.
+def build_features(output_dir, store_dir=None, update=False):
+    run_start = time.perf_counter()
+    store_dir = store_dir or os.path.join(output_dir, FEATURE_DIR)
+    meta_path = os.path.join(store_dir, FEATURE_META)
+    table_path = os.path.join(output_dir, FEATURE_TABLE)
+
+    customers = load_table(output_dir, "customers", ["customer_id", "enrollment_date"])
+    customer_numbers = parse_ids(customers["customer_id"])
+    num_customers = int(customer_numbers.max()) + 1 if len(customer_numbers) else 0
+    # Customers are numbered from 1; unused numbers never get a row
+    enrollment_months = np.full(num_customers, np.iinfo(np.int64).max)
+    enrollment_months[customer_numbers] = month_codes(customers["enrollment_date"], 0)
+    customer_ids = np.array([f"CUS{number:06d}" for number in range(num_customers)])
+
+    meta = None
+    if update and os.path.exists(meta_path):
+        with open(meta_path) as meta_file:
+            meta = json.load(meta_file)
+        if meta["num_customers"] != num_customers:
+            raise ValueError("The customers table changed since the feature store was built; rebuild it")
+
+    monthly, first = load_totals(output_dir, num_customers, meta and meta["last_month"])
+    if meta is not None:
+        first_month = int(month_codes(np.datetime64(meta["last_month"], "M"), 0))
+        with np.load(os.path.join(store_dir, FEATURE_RING)) as archive:
+            ring = {name: archive[name] for name in MONTHLY_TOTALS}
+    else:
+        first_month = first if first is not None else 0
+        ring = {name: np.zeros((MAX_WINDOW, num_customers), dtype=dtype) for name, dtype in RING_TYPES.items()}
+    last_month = first_month if first is None else max(first + len(monthly["balance"]) - 1, first_month)
+
+    os.makedirs(store_dir, exist_ok=True)
+    if meta is not None:
+        # The previous last month is rewritten, with any rows appended to it since
+        with open(table_path, "r+b") as table_file:
+            table_file.truncate(meta["last_month_offset"])
+        row_count = meta["rows"] - meta["last_month_rows"]
+    else:
+        row_count = 0
+    with open(table_path, "ab" if meta is not None else "wb") as table_file:
+        if meta is None:
+            table_file.write((",".join(name for name, _ in FEATURE_COLUMNS) + "\r\n").encode())
+        for month in range(first_month, last_month + 1):
+            totals = month_totals(monthly, first, month, num_customers)
+            if month == last_month:
+                # Saved before the last month goes in, as an update starts from it
+                last_month_offset = table_file.tell()
+                np.savez(os.path.join(store_dir, FEATURE_RING), **ring)
+            enrolled = np.nonzero(enrollment_months <= month)[0]
+            features = month_features(month, totals, ring, enrolled, enrollment_months)
+            month_string = f"{np.datetime64(month, 'M')}-01"
+            write_feature_rows(table_file, customer_ids[enrolled], month_string, features)
+            row_count += len(enrolled)
+            store_totals(ring, month, totals)
+    last_month_rows = len(enrolled)
+
+    meta = {
+        "first_month": meta["first_month"] if meta is not None else str(np.datetime64(first_month, "M")),
+        "last_month": str(np.datetime64(last_month, "M")),
+        "num_customers": num_customers,
+        "rows": row_count,
+        "last_month_rows": last_month_rows,
+        "last_month_offset": last_month_offset,
+        "updated_months": last_month - first_month + 1,
+        "windows": FEATURE_WINDOWS,
+        "columns": [name for name, _ in FEATURE_COLUMNS],
+        "table": table_path,
+        "seconds": round(time.perf_counter() - run_start, 3)
+    }
+    with open(meta_path, "w") as meta_file:
+        json.dump(meta, meta_file, indent=2)
+    return meta
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or update the customer x month feature table.")
+    parser.add_argument("--output-dir", default="financial_dataset",
+                        help="directory holding the generated tables (default: %(default)s)")
+    parser.add_argument("--store-dir", help=f"feature store directory (default: OUTPUT_DIR/{FEATURE_DIR})")
+    parser.add_argument("command", choices=["build", "update"],
+                        help="build the features from scratch, or add the months appended since the last build")
+    args = parser.parse_args(argv)
+
+    meta = build_features(args.output_dir, args.store_dir, update=args.command == "update")
+    months = meta["updated_months"]
+    print(f"Computed {months} {'month' if months == 1 else 'months'} of customer features in {meta['seconds']:.2f} seconds.")
+    print(f"Wrote {meta['rows']} rows ({meta['first_month']} to {meta['last_month']}) to {meta['table']}.")
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,25 @@
+import cProfile
 import csv
 import random
+from array import array
 import datetime
+import functools
+import gzip
+import hashlib
+import itertools
+import json
+import lzma
 import math
 import os
-import numpy as np
-from faker import Faker
-
-# Initialize Faker to generate realistic data
-fake = Faker()
-random.seed(42)  # For reproducibility
-np.random.seed(42)
-
-# Create output directory if it doesn't exist
-output_dir = "financial_dataset"
-if not os.path.exists(output_dir):
-    os.makedirs(output_dir)
+import pickle
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from financial_dataset_identities import load_vocabulary, sample_identities
+from financial_dataset_instrumentation import merge_profiles, stage_report, track_progress, write_run_report
+from financial_dataset_sinks import (
+    APPENDABLE_FORMATS, FLUSH_POLICIES, OUTPUT_FORMATS, WRITER_SETTINGS, resolve_output_format, write_batches, write_output
+)
 
 # Define constants and parameters
 NUM_CUSTOMERS = 1000
@@ -26,6 +31,204 @@ START_DATE = datetime.date(2020, 1, 1)
 END_DATE = datetime.date(2024, 10, 1)
 DAYS_RANGE = (END_DATE - START_DATE).days
 
+# Account balance simulation engine: "loop" is the original month-by-month
+# Python loop, "vectorized" simulates all enrollment-months as NumPy arrays
+BALANCE_ENGINE = "loop"
+BALANCE_CHUNK_SIZE = 10000  # Enrollments simulated per vectorized chunk
+
+# Market data engine: "loop" is the original day-by-day S&P 500 / bond index
+# walk, "vectorized" draws correlated daily paths for every asset class at once
+# and gives each product its own asset mix
+MARKET_ENGINE = "loop"
+
+# Service interaction and engagement engine: "loop" draws one event at a time
+# with the random module, "vectorized" draws them as NumPy arrays in chunks
+EVENT_ENGINE = "loop"
+EVENT_CHUNK_SIZE = 100000  # Events drawn per vectorized chunk
+
+# Enrollment engine: "loop" draws each customer's products one at a time and
+# an advisor for every enrollment, "vectorized" draws them as NumPy arrays and
+# assigns each customer one advisor within their clients_count capacity
+ENROLLMENT_ENGINE = "loop"
+ENROLLMENT_BLOCK_SIZE = 100000  # Customers drawn per vectorized block
+
+# Rows handed to the CSV writer at a time
+WRITE_BATCH_SIZE = 10000
+
+# Sharded generation: customers and everything keyed off them are generated in
+# fixed-size shards, each with RNG streams derived from SEED, so the output is
+# identical for any number of WORKERS
+SEED = 42  # For reproducibility
+SHARD_SIZE = 10000  # Customers per shard
+WORKERS = os.cpu_count() or 1  # Processes generating shards in parallel
+
+# Identity pools (names, cities, email domains) are drawn from Faker once and
+# cached in this vocabulary file under the user's cache directory (not in the
+# source tree or the output folder); None rebuilds them from Faker on every run
+IDENTITY_VOCABULARY = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "financial_dataset", "identity_vocabulary.json"
+)
+IDENTITY_POOL_SIZE = 1000  # Distinct values per pool
+
+# Output format: "csv", "csv.gz", "csv.xz", "parquet", "feather" or "npz"
+# (parquet/feather need pyarrow and fall back to npz without it)
+OUTPUT_FORMAT = "csv"
+
+# Table schemas: column names and kinds ("str", "category", "date", "int",
+# "float") so typed output formats keep real column types
+TABLE_COLUMNS = {
+    "advisors": [
+        ("advisor_id", "str"), ("first_name", "category"), ("last_name", "category"),
+        ("office_location", "category"), ("certification_level", "category"),
+        ("years_experience", "int"), ("customer_satisfaction_avg", "float"), ("clients_count", "int")
+    ],
+    "products": [
+        ("product_id", "str"), ("product_name", "category"), ("product_category", "category"),
+        ("launch_date", "date"), ("min_investment", "int"), ("annual_fee_percentage", "float"),
+        ("management_fee_fixed", "int"), ("risk_level", "category"), ("active_status", "category")
+    ],
+    "customers": [
+        ("customer_id", "str"), ("first_name", "category"), ("last_name", "category"),
+        ("birth_date", "date"), ("enrollment_date", "date"), ("customer_segment", "category"),
+        ("employer_id", "category"), ("email", "str"), ("phone", "str"),
+        ("address_city", "category"), ("address_state", "category")
+    ],
+    "enrollments": [
+        ("enrollment_id", "str"), ("customer_id", "str"), ("product_id", "category"),
+        ("enrollment_date", "date"), ("initial_investment", "float"),
+        ("contribution_frequency", "category"), ("monthly_contribution", "float"),
+        ("advisor_id", "category"), ("channel", "category"), ("status", "category")
+    ],
+    "market_data": [
+        ("date", "date"), ("sp500_index", "float"), ("bond_index", "float"),
+        ("inflation_rate", "float"), ("prime_rate", "float"), ("unemployment_rate", "float")
+    ],
+    "account_balances": [
+        ("balance_id", "str"), ("customer_id", "str"), ("product_id", "category"), ("date", "date"),
+        ("balance", "float"), ("contributions_mtd", "float"), ("withdrawals_mtd", "float"),
+        ("investment_returns_mtd", "float"), ("fees_mtd", "float")
+    ],
+    "service_interactions": [
+        ("interaction_id", "str"), ("customer_id", "str"), ("date", "date"), ("channel", "category"),
+        ("reason_code", "category"), ("duration_minutes", "int"), ("satisfaction_score", "float"),
+        ("resolution_status", "category"), ("agent_id", "category")
+    ],
+    "engagement": [
+        ("engagement_id", "str"), ("customer_id", "str"), ("date", "date"), ("action_type", "category"),
+        ("device_type", "category"), ("session_duration", "int"), ("pages_viewed", "int"),
+        ("actions_taken", "int")
+    ],
+    "retention": [
+        ("customer_id", "str"), ("product_id", "category"), ("churn_date", "date"),
+        ("churn_reason", "category"), ("exit_survey_score", "float"), ("recovered_flag", "category"),
+        ("total_customer_lifetime_value", "float")
+    ]
+}
+
+# Sequential ID columns, numbered across shards when tables are finished
+TABLE_ID_FORMATS = {
+    "enrollments": "ENR{:07d}",
+    "account_balances": "BAL{:08d}",
+    "service_interactions": "INT{:06d}",
+    "engagement": "ENG{:07d}"
+}
+
+# Shared reference tables, always generated from the master seed, and the
+# customer-keyed tables generated shard by shard, in stage order
+REFERENCE_TABLES = ["advisors", "products", "market_data"]
+SHARD_TABLES = ["customers", "enrollments", "account_balances", "service_interactions", "engagement", "retention"]
+
+# Row counts at scale 1 for the tables sized directly; enrollments, balances
+# and retention follow from the number of customers and the date range
+TABLE_ROWS = {
+    "advisors": NUM_ADVISORS,
+    "products": NUM_PRODUCTS,
+    "customers": NUM_CUSTOMERS,
+    "service_interactions": NUM_INTERACTIONS,
+    "engagement": NUM_ENGAGEMENT
+}
+
+# Run configuration accepted by generate(); any key left out takes this default
+DEFAULT_CONFIG = {
+    "output_dir": "financial_dataset",
+    "seed": SEED,
+    "scale": 1.0,  # Multiplies every TABLE_ROWS count
+    "rows": {},  # Per-table row counts, overriding the scaled ones
+    "start_date": START_DATE,
+    "end_date": END_DATE,
+    "tables": None,  # Tables to write; None writes all of them
+    "output_format": OUTPUT_FORMAT,
+    "balance_engine": BALANCE_ENGINE,
+    "market_engine": MARKET_ENGINE,
+    "event_engine": EVENT_ENGINE,
+    "enrollment_engine": ENROLLMENT_ENGINE,
+    "event_chunk_size": EVENT_CHUNK_SIZE,
+    "balance_chunk_size": BALANCE_CHUNK_SIZE,
+    "shard_size": SHARD_SIZE,
+    "workers": WORKERS,
+    "identity_vocabulary": IDENTITY_VOCABULARY,
+    "identity_pool_size": IDENTITY_POOL_SIZE,
+    "progress": False,  # Live per-stage progress on stderr
+    "trace_memory": False,  # Record each stage's peak traced memory (slows the run)
+    "profile_stage": None,  # Table whose stage is run under cProfile
+    "checkpoint": True,  # Save the state append() resumes from (full runs only)
+    "rollups": False,  # Also write the monthly ROLLUP_COLUMNS tables
+    "background_writer": WRITER_SETTINGS["background"],  # Write files on a background I/O thread
+    "writer_queue_batches": WRITER_SETTINGS["queue_batches"],  # Batches queued before generation waits
+    "flush_policy": WRITER_SETTINGS["flush"],  # One of FLUSH_POLICIES
+    "partition_months": False,  # Write PARTITIONED_TABLES as one file per month
+    "exact_lifetime_value": False  # Retention lifetime values from the simulated fees (see LIFETIME_TOTALS)
+}
+
+# Run report and checkpoint written next to the tables
+RUN_REPORT = "run_report.json"
+CHECKPOINT = "checkpoint.pkl"
+
+# Month-partitioned output: these time-series tables, split on the given date
+# column, are written as TABLE/YYYY-MM files. MANIFEST lists every partition
+# with its row count, date range and the SHA-256 of its rows (as CSV text, so
+# the hash does not depend on the output format), so a BI refresh only needs to
+# re-import partitions whose hash changed. Unchanged partitions are not rewritten.
+PARTITIONED_TABLES = {"account_balances": "date", "service_interactions": "date", "engagement": "date"}
+MANIFEST = "manifest.json"
+PARTITION_BUFFER_LINES = 10000  # Lines buffered per month before they go to its part file
+
+# Rollup tables: monthly aggregates accumulated from the rows of the balance,
+# service interaction and engagement stages as they stream out, so the BI model
+# can import them instead of the row-level tables
+ROLLUP_COLUMNS = {
+    "rollup_balances": [
+        ("month", "date"), ("product_id", "category"), ("customer_segment", "category"),
+        ("balance_records", "int"), ("aum", "float"), ("contributions", "float"),
+        ("withdrawals", "float"), ("investment_returns", "float"), ("fees", "float")
+    ],
+    "rollup_service": [
+        ("month", "date"), ("channel", "category"), ("reason_code", "category"),
+        ("interactions", "int"), ("resolved_interactions", "int"), ("avg_satisfaction_score", "float")
+    ],
+    "rollup_engagement": [
+        ("month", "date"), ("device_type", "category"), ("action_type", "category"),
+        ("sessions", "int"), ("session_minutes", "int"), ("pages_viewed", "int"), ("actions_taken", "int")
+    ]
+}
+ROLLUP_STAGES = {
+    "account_balances": "rollup_balances",
+    "service_interactions": "rollup_service",
+    "engagement": "rollup_engagement"
+}
+
+# Exact lifetime values: churn dates are drawn before the balances are simulated,
+# churned enrollments get no balance rows after their churn date, and the
+# balance stage keeps these running totals per enrollment, so the retention
+# stage reads each churned enrollment's lifetime value (the fees it paid) without
+# re-reading account_balances. A churned enrollment's closing balance is its
+# balance at churn.
+LIFETIME_TOTALS = ["contributions", "withdrawals", "returns", "fees"]
+
+# Tables an append run extends: the market series, then the shard stages
+APPEND_TABLES = ["market_data", "account_balances", "service_interactions", "engagement"]
+
 # Customer segments
 CUSTOMER_SEGMENTS = ["Mass Market", "Affluent", "High Net Worth", "Ultra High Net Worth"]
 SEGMENT_WEIGHTS = [0.6, 0.25, 0.1, 0.05]
@@ -40,6 +243,39 @@ PRODUCT_CATEGORIES = [
 # Risk levels
 RISK_LEVELS = ["Low", "Medium-Low", "Medium", "Medium-High", "High"]
 
+# Asset classes simulated by the vectorized market engine, and the other daily
+# series it draws together with them
+ASSET_CLASSES = ["equities", "bonds", "real_estate", "cash"]
+MARKET_SERIES = ASSET_CLASSES + ["inflation", "unemployment"]
+
+# Daily drift and volatility of each series: returns for the asset classes,
+# percentage-point changes for inflation and unemployment
+MARKET_DRIFT = [0.0004, 0.0001, 0.0003, 0.00008, 0.0, 0.0]
+MARKET_VOLATILITY = [0.01, 0.002, 0.007, 0.0002, 0.02, 0.1]
+
+# Correlation of the daily shocks, in MARKET_SERIES order
+MARKET_CORRELATION = [
+    [1.0, -0.3, 0.6, 0.0, 0.1, -0.4],
+    [-0.3, 1.0, 0.1, 0.2, -0.4, 0.2],
+    [0.6, 0.1, 1.0, 0.0, 0.2, -0.3],
+    [0.0, 0.2, 0.0, 1.0, 0.3, 0.0],
+    [0.1, -0.4, 0.2, 0.3, 1.0, -0.1],
+    [-0.4, 0.2, -0.3, 0.0, -0.1, 1.0]
+]
+
+# Typical asset mix of each product category, in ASSET_CLASSES order
+CATEGORY_ASSET_MIX = {
+    "Retirement Account": [0.5, 0.4, 0.05, 0.05],
+    "Investment Fund": [0.6, 0.3, 0.1, 0.0],
+    "Savings Account": [0.0, 0.1, 0.0, 0.9],
+    "Stock Portfolio": [0.95, 0.0, 0.0, 0.05],
+    "Bond Fund": [0.05, 0.9, 0.0, 0.05],
+    "Real Estate Fund": [0.15, 0.05, 0.8, 0.0],
+    "ETF": [0.8, 0.15, 0.05, 0.0],
+    "Mutual Fund": [0.6, 0.35, 0.05, 0.0],
+    "Insurance Product": [0.2, 0.6, 0.1, 0.1]
+}
+
 # Contribution frequencies
 CONTRIBUTION_FREQUENCIES = ["Monthly", "Quarterly", "Bi-annual", "Annual", "One-time"]
 
@@ -80,10 +316,10 @@ US_STATES = [
 ]
 
 # Helper function to generate a random date
-def random_date(start_date, end_date):
+def random_date(start_date, end_date, rng=random):
     time_between_dates = end_date - start_date
     days_between_dates = time_between_dates.days
-    random_number_of_days = random.randrange(days_between_dates)
+    random_number_of_days = rng.randrange(days_between_dates)
     return start_date + datetime.timedelta(days=random_number_of_days)
 
 # Helper function for seasonal effects 
@@ -97,21 +333,61 @@ def seasonal_effect(date):
     else:
         return 1.0
 
+# Shared calendar of every day from five years before start_date (the earliest
+# product launch) to end_date, built once per process: ISO strings by day, and
+# per day its month index and business-day flag; per month its first and last
+# day (as ordinals), ISO first day, (year, month) key and calendar month
+@functools.lru_cache(maxsize=4)
+def build_calendar(first_ordinal, last_ordinal):
+    import numpy as np
+
+    epoch = datetime.date(1970, 1, 1).toordinal()
+    days = np.arange(first_ordinal - epoch, last_ordinal - epoch + 1).astype("datetime64[D]")
+    day_months = days.astype("datetime64[M]")
+    months = np.arange(day_months[0], day_months[-1] + 1)
+    month_starts = months.astype("datetime64[D]")
+    month_ends = (months + 1).astype("datetime64[D]") - 1
+    month_dates = month_starts.astype(datetime.date).tolist()
+    return {
+        "first_ordinal": first_ordinal,
+        "last_ordinal": last_ordinal,
+        "iso": days.astype(str).tolist(),
+        "month_index": (day_months - months[0]).astype(np.int64),
+        "business_day": np.is_busday(days),
+        "month_start": month_starts.astype(np.int64) + epoch,
+        "month_end": month_ends.astype(np.int64) + epoch,
+        "month_iso": month_starts.astype(str).tolist(),
+        "month_key": [month_key(d) for d in month_dates],
+        "month_number": np.array([d.month for d in month_dates])
+    }
+
+# Helper function for the run's shared calendar
+def calendar_for(config):
+    first_date = config["start_date"] - datetime.timedelta(days=365*5)
+    return build_calendar(first_date.toordinal(), config["end_date"].toordinal())
+
+# Helper function to format a date ordinal as an ISO string through the
+# calendar; dates outside it (birth dates) are formatted directly
+def iso_date(calendar, ordinal):
+    if calendar["first_ordinal"] <= ordinal <= calendar["last_ordinal"]:
+        return calendar["iso"][ordinal - calendar["first_ordinal"]]
+    return datetime.date.fromordinal(ordinal).isoformat()
+
 # Helper function for market fluctuations
-def market_fluctuation(date):
+def market_fluctuation(date, start_date, rng=random):
     # Simple sinusoidal pattern with some randomness
-    days_since_start = (date - START_DATE).days
+    days_since_start = (date - start_date).days
     annual_cycle = math.sin(days_since_start / 365 * 2 * math.pi)
     monthly_noise = math.sin(days_since_start / 30 * 2 * math.pi) * 0.2
-    random_factor = random.uniform(-0.1, 0.1)
+    random_factor = rng.uniform(-0.1, 0.1)
     
     return 1.0 + annual_cycle * 0.1 + monthly_noise + random_factor
 
 # Helper function for digital adoption trend
-def digital_adoption_trend(date):
+def digital_adoption_trend(date, start_date, end_date):
     # Increasing trend from 30% to 80% over the time period
-    days_since_start = (date - START_DATE).days
-    total_days = (END_DATE - START_DATE).days
+    days_since_start = (date - start_date).days
+    total_days = (end_date - start_date).days
     base_digital = 0.3
     max_increase = 0.5
     return base_digital + (days_since_start / total_days) * max_increase
@@ -139,204 +415,445 @@ def age_factor(birth_date):
     else:
         return {"digital_affinity": 0.3, "risk_tolerance": 0.3, "contribution_rate": 0.8}
 
+# Helper function to get the (year, month) key of a date
+def month_key(date):
+    return (date.year, date.month)
+
+# Helper function to step a (year, month) key back one month, across year boundaries
+def previous_month_key(key):
+    year, month = key
+    if month == 1:
+        return (year - 1, 12)
+    return (year, month - 1)
+
+# Helper function to build the month-keyed market table used by the balance stage
+def build_monthly_market(market_data, monthly_market=None):
+    # When extending the table of a previous run, months it already has keep
+    # the levels and returns their balances were simulated with
+    monthly_market = dict(monthly_market or {})
+    totals = {}
+    for m in market_data:
+        key = month_key(m["date"])
+        if key in monthly_market:
+            continue
+        if key not in totals:
+            totals[key] = [0.0, 0.0, 0, None]
+        totals[key][0] += m["sp500_index"]
+        totals[key][1] += m["bond_index"]
+        totals[key][2] += 1
+        # Asset class levels, from the vectorized market engine
+        if "asset_levels" in m:
+            if totals[key][3] is None:
+                totals[key][3] = [0.0] * len(m["asset_levels"])
+            totals[key][3] = [total + level for total, level in zip(totals[key][3], m["asset_levels"])]
+
+    for key, (sp500_total, bond_total, days, asset_totals) in totals.items():
+        monthly_market[key] = {
+            "sp500_index": sp500_total / days,
+            "bond_index": bond_total / days,
+            "market_return": 0.0,
+            "bond_return": 0.0
+        }
+        if asset_totals is not None:
+            monthly_market[key]["asset_levels"] = [total / days for total in asset_totals]
+            monthly_market[key]["asset_returns"] = [0.0] * len(asset_totals)
+
+    # Month-over-month returns; the first month has nothing to compare against
+    for key in totals:
+        month = monthly_market[key]
+        previous = monthly_market.get(previous_month_key(key))
+        if previous is not None:
+            if previous["sp500_index"] > 0:
+                month["market_return"] = month["sp500_index"] / previous["sp500_index"] - 1
+            if previous["bond_index"] > 0:
+                month["bond_return"] = month["bond_index"] / previous["bond_index"] - 1
+            if "asset_levels" in month and "asset_levels" in previous:
+                month["asset_returns"] = [
+                    level / previous_level - 1
+                    for level, previous_level in zip(month["asset_levels"], previous["asset_levels"])
+                ]
+
+    return monthly_market
+
+# Helper function to format the customer ID for a position in the customer state
+def customer_id_for(index):
+    return f"CUS{index + 1:06d}"
+
+# Helper function to view a compact state column as a NumPy array
+def column_array(column):
+    import numpy as np
+
+    return np.frombuffer(column, dtype=column.typecode)
+
+# Helper function for the writer pipeline settings of a run
+def writer_settings(config):
+    return {
+        "background": config["background_writer"],
+        "queue_batches": config["writer_queue_batches"],
+        "flush": config["flush_policy"]
+    }
+
+# Helper function to stream rows from a table generator into a headerless CSV
+# part file, WRITE_BATCH_SIZE rows per writerows() call, through the writer pipeline
+def write_table(config, path, rows):
+    rows = iter(rows)
+    batches = iter(lambda: list(itertools.islice(rows, WRITE_BATCH_SIZE)), [])
+    with open(path, "w", newline="") as csvfile:
+        return write_batches(csvfile, batches, csv.writer(csvfile).writerows, writer_settings(config))
+
+# Helper function for the part file a shard (or the reference stage) writes for a table
+def table_part(config, table, part_index):
+    return f"{config['output_dir']}/parts/{table}.{part_index:05d}.csv"
+
+# Helper function to split a table-wide row count across shards by customer share
+def shard_quota(total, num_customers, customer_start, customer_stop):
+    return total * customer_stop // num_customers - total * customer_start // num_customers
+
+# Helper function to write a table's parts, in order, to its final file through
+# the output sink, numbering its sequential ID column globally when it has one;
+# with existing_rows the parts are appended after that many rows instead
+def finish_table(config, table, num_parts, existing_rows=None):
+    output_format = config["output_format"]
+    part_paths = [table_part(config, table, i) for i in range(num_parts)]
+    row_count = write_output(
+        output_format, f"{config['output_dir']}/{table}{OUTPUT_FORMATS[output_format]}",
+        TABLE_COLUMNS[table], part_paths, TABLE_ID_FORMATS.get(table), existing_rows, writer_settings(config)
+    )
+    for part_path in part_paths:
+        os.remove(part_path)
+    return row_count
+
+# Helper function to load the partition manifest, empty when there is none yet
+def load_manifest(output_dir):
+    path = f"{output_dir}/{MANIFEST}"
+    if not os.path.exists(path):
+        return {"tables": {}}
+    with open(path) as manifest_file:
+        return json.load(manifest_file)
+
+def save_manifest(output_dir, manifest):
+    path = f"{output_dir}/{MANIFEST}"
+    with open(f"{path}.tmp", "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.replace(f"{path}.tmp", path)
+    return path
+
+# Helper function to remove a table's partitions listed in the manifest, when
+# the table is written as a single file again
+def remove_partitions(output_dir, table, manifest):
+    for partition in manifest["tables"].pop(table, {}).values():
+        if os.path.exists(f"{output_dir}/{partition['path']}"):
+            os.remove(f"{output_dir}/{partition['path']}")
+    if os.path.isdir(f"{output_dir}/{table}") and not os.listdir(f"{output_dir}/{table}"):
+        os.rmdir(f"{output_dir}/{table}")
+
+# Helper function to hash the rows already in a CSV partition, so an append
+# run's hash covers the whole partition
+def partition_hash(path):
+    opener = {".gz": gzip.open, ".xz": lzma.open}.get(os.path.splitext(path)[1], open)
+    digest = hashlib.sha256()
+    with opener(path, "rb") as partition:
+        partition.readline()
+        for block in iter(lambda: partition.read(1 << 20), b""):
+            digest.update(block)
+    return digest
+
+# Helper function to split a table's parts by month into one part file per
+# month, numbering the sequential ID column from id_offset in the same order as
+# a single-file table. Returns each month's part path, row count, date range and
+# running hash. The date is found by splitting on commas, which is safe because
+# no column before it is quoted.
+def split_months(config, table, num_parts, id_offset, manifest_partitions, output_dir):
+    id_format = TABLE_ID_FORMATS.get(table)
+    date_index = [name for name, _ in TABLE_COLUMNS[table]].index(PARTITIONED_TABLES[table])
+    if id_format is not None:
+        date_index -= 1
+
+    months = {}
+    buffers = {}
+
+    def flush(month):
+        lines = buffers.pop(month)
+        with open(months[month]["part"], "a", newline="") as part:
+            part.writelines(lines)
+        months[month]["digest"].update("".join(lines).encode())
+
+    row_number = id_offset
+    for part_path in [table_part(config, table, i) for i in range(num_parts)]:
+        with open(part_path, newline="") as part:
+            for line in part:
+                row_number += 1
+                date = line.split(",", date_index + 1)[date_index]
+                month = date[:7]
+                if month not in months:
+                    existing = manifest_partitions.get(month)
+                    months[month] = {
+                        "part": table_part(config, f"{table}.{month}", 0),
+                        "rows": 0,
+                        "first_date": date,
+                        "last_date": date,
+                        "existing_rows": existing["rows"] if existing else None,
+                        "digest": partition_hash(f"{output_dir}/{existing['path']}") if existing else hashlib.sha256()
+                    }
+                    open(months[month]["part"], "w").close()
+                stats = months[month]
+                stats["rows"] += 1
+                if date < stats["first_date"]:
+                    stats["first_date"] = date
+                elif date > stats["last_date"]:
+                    stats["last_date"] = date
+                if id_format is not None:
+                    line = f"{id_format.format(row_number)},{line}"
+                buffers.setdefault(month, []).append(line)
+                if len(buffers[month]) == PARTITION_BUFFER_LINES:
+                    flush(month)
+        os.remove(part_path)
+    for month in list(buffers):
+        flush(month)
+    return months
+
+# Helper function to write a table as one file per month through the output
+# sink and record the partitions in the manifest. With existing_rows (an append
+# run) IDs continue after that many rows and months already in the manifest are
+# extended; otherwise partitions whose rows did not change are left as they are
+# and partitions of months no longer generated are removed.
+def finish_partitions(config, table, num_parts, existing_rows, manifest):
+    output_dir = config["output_dir"]
+    extension = OUTPUT_FORMATS[config["output_format"]]
+    previous = manifest["tables"].get(table, {})
+    appending = existing_rows is not None
+    os.makedirs(f"{output_dir}/{table}", exist_ok=True)
+    months = split_months(config, table, num_parts, existing_rows or 0, previous if appending else {}, output_dir)
+
+    partitions = {month: dict(partition, changed=False) for month, partition in previous.items()} if appending else {}
+    row_count = 0
+    for month in sorted(months):
+        stats = months[month]
+        path = f"{table}/{month}{extension}"
+        partition = {
+            "path": path,
+            "rows": stats["rows"],
+            "first_date": stats["first_date"],
+            "last_date": stats["last_date"],
+            "sha256": stats["digest"].hexdigest()
+        }
+        if stats["existing_rows"] is not None:
+            partition["rows"] += stats["existing_rows"]
+            partition["first_date"] = min(partition["first_date"], previous[month]["first_date"])
+            partition["last_date"] = max(partition["last_date"], previous[month]["last_date"])
+        unchanged = (
+            not appending and previous.get(month, {}).get("sha256") == partition["sha256"]
+            and previous[month]["path"] == path and os.path.exists(f"{output_dir}/{path}")
+        )
+        if not unchanged:
+            write_output(
+                config["output_format"], f"{output_dir}/{path}", TABLE_COLUMNS[table], [stats["part"]],
+                existing_rows=stats["existing_rows"], writer=writer_settings(config)
+            )
+        os.remove(stats["part"])
+        partition["bytes"] = os.path.getsize(f"{output_dir}/{path}")
+        partition["changed"] = not unchanged
+        partitions[month] = partition
+        row_count += stats["rows"]
+
+    # Months no longer generated, or written in another format before
+    for month, partition in previous.items():
+        replaced = month not in partitions or partitions[month]["path"] != partition["path"]
+        if replaced and os.path.exists(f"{output_dir}/{partition['path']}"):
+            os.remove(f"{output_dir}/{partition['path']}")
+    # A single-file version of the table from an earlier run would shadow the partitions
+    for stale_extension in OUTPUT_FORMATS.values():
+        if os.path.exists(f"{output_dir}/{table}{stale_extension}"):
+            os.remove(f"{output_dir}/{table}{stale_extension}")
+    manifest["tables"][table] = partitions
+    return row_count
+
 # Generate Financial Advisors
-advisors = []
-advisor_offices = [f"{fake.city()}, {random.choice(US_STATES)}" for _ in range(12)]
-
-with open(f"{output_dir}/advisors.csv", "w", newline="") as csvfile:
-    writer = csv.writer(csvfile)
-    writer.writerow([
-        "advisor_id", "first_name", "last_name", "office_location", 
-        "certification_level", "years_experience", "customer_satisfaction_avg", "clients_count"
-    ])
-    
-    for i in range(1, NUM_ADVISORS + 1):
+def generate_advisors(config, advisors, rng, vocabulary):
+    advisor_offices = [f"{rng.choice(vocabulary['cities'])}, {rng.choice(US_STATES)}" for _ in range(12)]
+
+    for i in range(1, config["rows"]["advisors"] + 1):
         advisor_id = f"ADV{i:04d}"
-        first_name = fake.first_name()
-        last_name = fake.last_name()
-        office_location = random.choice(advisor_offices)
-        certification_level = random.choice(["Junior", "Associate", "Senior", "Expert", "Master"])
-        years_experience = random.randint(1, 30)
+        first_name = rng.choice(vocabulary["first_names"])
+        last_name = rng.choice(vocabulary["last_names"])
+        office_location = rng.choice(advisor_offices)
+        certification_level = rng.choice(["Junior", "Associate", "Senior", "Expert", "Master"])
+        years_experience = rng.randint(1, 30)
         # More experienced advisors tend to have better satisfaction
         base_satisfaction = 3.0 + (years_experience / 30) * 1.5
-        satisfaction_noise = random.uniform(-0.5, 0.5)
+        satisfaction_noise = rng.uniform(-0.5, 0.5)
         customer_satisfaction_avg = min(5.0, max(1.0, base_satisfaction + satisfaction_noise))
         # Experienced and higher-satisfaction advisors tend to have more clients
-        clients_count = int(random.normalvariate(20, 5) * (1 + years_experience/15) * (customer_satisfaction_avg/3))
-        
+        clients_count = int(rng.normalvariate(20, 5) * (1 + years_experience/15) * (customer_satisfaction_avg/3))
+
         advisors.append({
             "advisor_id": advisor_id,
-            "first_name": first_name,
-            "last_name": last_name,
-            "office_location": office_location,
-            "certification_level": certification_level,
             "years_experience": years_experience,
             "customer_satisfaction_avg": customer_satisfaction_avg,
             "clients_count": clients_count
         })
-        
-        writer.writerow([
-            advisor_id, first_name, last_name, office_location, 
-            certification_level, years_experience, 
+
+        yield [
+            advisor_id, first_name, last_name, office_location,
+            certification_level, years_experience,
             round(customer_satisfaction_avg, 2), clients_count
-        ])
+        ]
 
 # Generate Financial Products
-products = []
-
-with open(f"{output_dir}/products.csv", "w", newline="") as csvfile:
-    writer = csv.writer(csvfile)
-    writer.writerow([
-        "product_id", "product_name", "product_category", "launch_date", 
-        "min_investment", "annual_fee_percentage", "management_fee_fixed", 
-        "risk_level", "active_status"
-    ])
-    
-    for i in range(1, NUM_PRODUCTS + 1):
+def generate_products(config, products, rng, vocabulary):
+    start_date = config["start_date"]
+    calendar = calendar_for(config)
+
+    for i in range(1, config["rows"]["products"] + 1):
         product_id = f"PRD{i:04d}"
-        category = random.choice(PRODUCT_CATEGORIES)
-        product_name = f"{fake.company_suffix()} {category}"
+        category = rng.choice(PRODUCT_CATEGORIES)
+        product_name = f"{rng.choice(vocabulary['company_suffixes'])} {category}"
         launch_date = random_date(
-            START_DATE - datetime.timedelta(days=365*5), 
-            START_DATE + datetime.timedelta(days=365)
+            start_date - datetime.timedelta(days=365*5),
+            start_date + datetime.timedelta(days=365),
+            rng
         )
-        
+
         # Higher risk products tend to have higher min investments
-        risk_level = random.choice(RISK_LEVELS)
+        risk_level = rng.choice(RISK_LEVELS)
         risk_index = RISK_LEVELS.index(risk_level)
-        
+
         min_investment_base = [500, 1000, 2500, 5000, 10000][risk_index]
-        min_investment = min_investment_base * random.randint(1, 5)
-        
+        min_investment = min_investment_base * rng.randint(1, 5)
+
         # Fees tend to correlate with product category and risk
         if "Fund" in category or "Portfolio" in category:
-            annual_fee_percentage = random.uniform(0.5, 2.0) * (1 + risk_index/5)
+            annual_fee_percentage = rng.uniform(0.5, 2.0) * (1 + risk_index/5)
             management_fee_fixed = 0
         else:
-            annual_fee_percentage = random.uniform(0.1, 0.5) * (1 + risk_index/10)
-            management_fee_fixed = random.choice([0, 25, 50, 100])
-            
-        active_status = random.choices(["Active", "Inactive"], weights=[0.9, 0.1])[0]
-        
+            annual_fee_percentage = rng.uniform(0.1, 0.5) * (1 + risk_index/10)
+            management_fee_fixed = rng.choice([0, 25, 50, 100])
+
+        active_status = rng.choices(["Active", "Inactive"], weights=[0.9, 0.1])[0]
+
         products.append({
             "product_id": product_id,
-            "product_name": product_name,
             "product_category": category,
             "launch_date": launch_date,
             "min_investment": min_investment,
             "annual_fee_percentage": round(annual_fee_percentage, 2),
             "management_fee_fixed": management_fee_fixed,
-            "risk_level": risk_level,
-            "active_status": active_status
+            "risk_level": risk_level
         })
-        
-        writer.writerow([
-            product_id, product_name, category, launch_date.strftime("%Y-%m-%d"),
+
+        yield [
+            product_id, product_name, category, iso_date(calendar, launch_date.toordinal()),
             min_investment, round(annual_fee_percentage, 2), management_fee_fixed,
             risk_level, active_status
-        ])
+        ]
 
 # Generate Customers
-customers = []
-
-with open(f"{output_dir}/customers.csv", "w", newline="") as csvfile:
-    writer = csv.writer(csvfile)
-    writer.writerow([
-        "customer_id", "first_name", "last_name", "birth_date", "enrollment_date",
-        "customer_segment", "employer_id", "email", "phone", "address_city", "address_state"
-    ])
-    
-    for i in range(1, NUM_CUSTOMERS + 1):
+# Only the compact per-customer state later stages need is kept, position i
+# being the shard's i-th customer: dates as ordinals, segment index and age factors
+def generate_customers(shard):
+    rng = shard["rng"]
+    customer_state = shard["customers"]
+    calendar = shard["calendar"]
+    start_date, end_date = shard["start_date"], shard["end_date"]
+
+    # Names, emails, phones and cities for the whole shard in one vectorized draw
+    identities = sample_identities(
+        shard["np_rng"], shard["vocabulary"], shard["customer_stop"] - shard["customer_start"]
+    )
+
+    for offset, i in enumerate(range(shard["customer_start"] + 1, shard["customer_stop"] + 1)):
         customer_id = f"CUS{i:06d}"
-        first_name = fake.first_name()
-        last_name = fake.last_name()
-        
+        first_name = identities["first_name"][offset]
+        last_name = identities["last_name"][offset]
+
         # Age distribution skewed toward adults
-        age = random.choices(
-            [random.randint(18, 30), random.randint(30, 50), random.randint(50, 75), random.randint(75, 90)],
+        age = rng.choices(
+            [rng.randint(18, 30), rng.randint(30, 50), rng.randint(50, 75), rng.randint(75, 90)],
             weights=[0.2, 0.4, 0.3, 0.1]
         )[0]
         birth_date = datetime.date.today() - datetime.timedelta(days=int(age*365.25))
-        
-        enrollment_date = random_date(START_DATE, END_DATE - datetime.timedelta(days=30))
-        customer_segment = random.choices(CUSTOMER_SEGMENTS, weights=SEGMENT_WEIGHTS)[0]
-        employer_id = f"EMP{random.randint(1, 500):04d}"
-        
-        email = f"{first_name.lower()}.{last_name.lower()}@{fake.free_email_domain()}"
-        phone = fake.phone_number()
-        address_city = fake.city()
-        address_state = random.choice(US_STATES)
-        
-        customers.append({
-            "customer_id": customer_id,
-            "first_name": first_name,
-            "last_name": last_name,
-            "birth_date": birth_date,
-            "enrollment_date": enrollment_date,
-            "customer_segment": customer_segment,
-            "employer_id": employer_id,
-            "email": email,
-            "phone": phone,
-            "address_city": address_city,
-            "address_state": address_state,
-            "age_factors": age_factor(birth_date),
-            "segment_multiplier": segment_multiplier(customer_segment)
-        })
-        
-        writer.writerow([
-            customer_id, first_name, last_name, birth_date.strftime("%Y-%m-%d"),
-            enrollment_date.strftime("%Y-%m-%d"), customer_segment, employer_id,
+
+        enrollment_date = random_date(start_date, end_date - datetime.timedelta(days=30), rng)
+        customer_segment = rng.choices(CUSTOMER_SEGMENTS, weights=SEGMENT_WEIGHTS)[0]
+        employer_id = f"EMP{rng.randint(1, 500):04d}"
+
+        email = identities["email"][offset]
+        phone = identities["phone"][offset]
+        address_city = identities["address_city"][offset]
+        address_state = rng.choice(US_STATES)
+
+        age_factors = age_factor(birth_date)
+        birth_ordinal, enrollment_ordinal = birth_date.toordinal(), enrollment_date.toordinal()
+        customer_state["birth_date"].append(birth_ordinal)
+        customer_state["enrollment_date"].append(enrollment_ordinal)
+        customer_state["segment"].append(CUSTOMER_SEGMENTS.index(customer_segment))
+        customer_state["digital_affinity"].append(age_factors["digital_affinity"])
+        customer_state["contribution_rate"].append(age_factors["contribution_rate"])
+
+        yield [
+            customer_id, first_name, last_name, iso_date(calendar, birth_ordinal),
+            iso_date(calendar, enrollment_ordinal), customer_segment, employer_id,
             email, phone, address_city, address_state
-        ])
+        ]
 
 # Generate Customer Product Enrollments
-enrollments = []
-
-with open(f"{output_dir}/enrollments.csv", "w", newline="") as csvfile:
-    writer = csv.writer(csvfile)
-    writer.writerow([
-        "enrollment_id", "customer_id", "product_id", "enrollment_date",
-        "initial_investment", "contribution_frequency", "monthly_contribution",
-        "advisor_id", "channel", "status"
-    ])
-    
-    enrollment_id = 1
-    
+# Per-enrollment simulation parameters are kept as compact columns for the
+# balance and retention stages
+def generate_enrollments(shard):
+    rng = shard["rng"]
+    customer_state = shard["customers"]
+    enrollment_state = shard["enrollments"]
+    products = shard["products"]
+    advisors = shard["advisors"]
+    calendar = shard["calendar"]
+    start_date, end_date = shard["start_date"], shard["end_date"]
+
+    # Higher net worth customers get more experienced advisors; the ranking is
+    # the same for every enrollment, so it is sorted once
+    suitable_advisors = sorted(
+        advisors,
+        key=lambda a: a["years_experience"] + a["customer_satisfaction_avg"],
+        reverse=True
+    )
+
     # Determine number of products per customer based on segment
-    for customer in customers:
-        segment = customer["customer_segment"]
+    for customer_index in range(len(customer_state["segment"])):
+        customer_id = customer_id_for(shard["customer_start"] + customer_index)
+        customer_enrollment_date = datetime.date.fromordinal(customer_state["enrollment_date"][customer_index])
+        segment = CUSTOMER_SEGMENTS[customer_state["segment"][customer_index]]
         if segment == "Ultra High Net Worth":
-            num_products = random.randint(3, 8)
+            num_products = rng.randint(3, 8)
         elif segment == "High Net Worth":
-            num_products = random.randint(2, 5)
+            num_products = rng.randint(2, 5)
         elif segment == "Affluent":
-            num_products = random.randint(1, 3)
+            num_products = rng.randint(1, 3)
         else:  # Mass Market
-            num_products = random.randint(1, 2)
-            
+            num_products = rng.randint(1, 2)
+
         # Select products for this customer
-        customer_products = random.sample(products, min(num_products, len(products)))
-        
-        for product in customer_products:
-            enrollment_date = max(customer["enrollment_date"], product["launch_date"])
-            
+        customer_products = rng.sample(range(len(products)), min(num_products, len(products)))
+
+        for product_index in customer_products:
+            product = products[product_index]
+            enrollment_date = max(customer_enrollment_date, product["launch_date"])
+
             # Make sure enrollment date is within our time range
-            if enrollment_date > END_DATE:
+            if enrollment_date > end_date:
                 continue
-                
+
             # Calculate initial investment based on customer segment and product minimum
-            segment_mult = customer["segment_multiplier"]
+            segment_mult = segment_multiplier(segment)
             base_investment = product["min_investment"]
-            initial_investment = base_investment * random.uniform(1.0, 2.0) * segment_mult
-            
+            initial_investment = base_investment * rng.uniform(1.0, 2.0) * segment_mult
+
             # Determine contribution frequency and monthly amount
-            contribution_frequency = random.choice(CONTRIBUTION_FREQUENCIES)
-            
+            contribution_frequency = rng.choice(CONTRIBUTION_FREQUENCIES)
+
             # Monthly contribution based on customer segment and age
             base_monthly = initial_investment * 0.02  # 2% of initial investment per month
-            age_contribution_factor = customer["age_factors"]["contribution_rate"]
+            age_contribution_factor = customer_state["contribution_rate"][customer_index]
             monthly_contribution = base_monthly * age_contribution_factor * segment_mult
-            
+
             if contribution_frequency == "Quarterly":
                 monthly_contribution *= 3
             elif contribution_frequency == "Bi-annual":
@@ -345,471 +862,1770 @@ with open(f"{output_dir}/enrollments.csv", "w", newline="") as csvfile:
                 monthly_contribution *= 12
             elif contribution_frequency == "One-time":
                 monthly_contribution = 0
-                
+
             # Assign advisor - higher net worth customers get more experienced advisors
-            suitable_advisors = sorted(
-                advisors, 
-                key=lambda a: a["years_experience"] + a["customer_satisfaction_avg"],
-                reverse=True
-            )
-            
             if segment == "Ultra High Net Worth":
-                advisor = suitable_advisors[random.randint(0, min(5, len(suitable_advisors)-1))]
+                advisor = suitable_advisors[rng.randint(0, min(5, len(suitable_advisors)-1))]
             elif segment == "High Net Worth":
-                advisor = suitable_advisors[random.randint(0, min(10, len(suitable_advisors)-1))]
+                advisor = suitable_advisors[rng.randint(0, min(10, len(suitable_advisors)-1))]
             else:
-                advisor = random.choice(advisors)
-                
+                advisor = rng.choice(advisors)
+
             # Determine channel based on age and digital trends
-            digital_affinity = customer["age_factors"]["digital_affinity"]
-            enrollment_days_since_start = (enrollment_date - START_DATE).days
-            digital_trend = digital_adoption_trend(enrollment_date)
-            
-            if random.random() < digital_affinity * digital_trend:
-                channel = random.choice(["Web", "Mobile App"])
+            digital_affinity = customer_state["digital_affinity"][customer_index]
+            digital_trend = digital_adoption_trend(enrollment_date, start_date, end_date)
+
+            if rng.random() < digital_affinity * digital_trend:
+                channel = rng.choice(["Web", "Mobile App"])
             else:
-                channel = random.choice(["Phone", "In-person"])
-                
+                channel = rng.choice(["Phone", "In-person"])
+
             status = "Active"
-            
-            enrollments.append({
-                "enrollment_id": f"ENR{enrollment_id:07d}",
-                "customer_id": customer["customer_id"],
-                "product_id": product["product_id"],
-                "enrollment_date": enrollment_date,
-                "initial_investment": round(initial_investment, 2),
-                "contribution_frequency": contribution_frequency,
-                "monthly_contribution": round(monthly_contribution, 2),
-                "advisor_id": advisor["advisor_id"],
-                "channel": channel,
-                "status": status
-            })
-            
-            writer.writerow([
-                f"ENR{enrollment_id:07d}", customer["customer_id"], product["product_id"],
-                enrollment_date.strftime("%Y-%m-%d"), round(initial_investment, 2),
+
+            enrollment_state["customer"].append(customer_index)
+            enrollment_state["product"].append(product_index)
+            enrollment_ordinal = enrollment_date.toordinal()
+            enrollment_state["enrollment_date"].append(enrollment_ordinal)
+            enrollment_state["initial_investment"].append(round(initial_investment, 2))
+            enrollment_state["contribution_frequency"].append(CONTRIBUTION_FREQUENCIES.index(contribution_frequency))
+            enrollment_state["monthly_contribution"].append(round(monthly_contribution, 2))
+
+            # The enrollment_id column is numbered globally when shards are merged
+            yield [
+                customer_id, product["product_id"],
+                iso_date(calendar, enrollment_ordinal), round(initial_investment, 2),
                 contribution_frequency, round(monthly_contribution, 2),
                 advisor["advisor_id"], channel, status
-            ])
-            
-            enrollment_id += 1
+            ]
+
+# Helper function for capacity-aware advisor assignment: one advisor per
+# customer, within each advisor's share of clients_count for this shard.
+# Advisors are ranked as in generate_enrollments() and their capacity laid out
+# as slots in rank order; Ultra High Net Worth customers take random free
+# slots among the top 6 advisors, High Net Worth among the top 11 and everyone
+# else among all advisors, spilling over to the best-ranked free slots when
+# those are taken. When clients_count adds up to fewer than the customers,
+# every capacity is scaled up by the same factor; only if the shard still runs
+# out of slots are the rest assigned regardless of capacity.
+def assign_advisors(shard, np_rng, segments):
+    import numpy as np
+
+    advisors = shard["advisors"]
+    total_customers = shard["config"]["rows"]["customers"]
+    score = np.array([a["years_experience"] + a["customer_satisfaction_avg"] for a in advisors])
+    ranking = np.argsort(-score, kind="stable")
+
+    capacity = np.maximum(np.array([a["clients_count"] for a in advisors], dtype=np.int64), 0)
+    if capacity.sum() < total_customers:
+        capacity = np.maximum(capacity, 1)
+        capacity = np.ceil(capacity * total_customers / capacity.sum()).astype(np.int64)
+    capacity = shard_quota(capacity, total_customers, shard["customer_start"], shard["customer_stop"])
+    slots = np.repeat(np.arange(len(advisors)), capacity[ranking])  # Rank of each slot, best first
+    free = np.ones(len(slots), dtype=bool)
+
+    assigned = np.empty(len(segments), dtype=np.int64)
+    tiers = [
+        (segments == CUSTOMER_SEGMENTS.index("Ultra High Net Worth"), 6),
+        (segments == CUSTOMER_SEGMENTS.index("High Net Worth"), 11),
+        (segments < CUSTOMER_SEGMENTS.index("High Net Worth"), len(advisors))
+    ]
+    for tier, top in tiers:
+        customers = np.nonzero(tier)[0]
+        candidates = np.nonzero(free & (slots < top))[0]
+        taken = np_rng.choice(candidates, min(len(customers), len(candidates)), replace=False)
+        if len(taken) < len(customers):
+            spill = np.nonzero(free)[0]
+            spill = spill[slots[spill] >= top][:len(customers) - len(taken)]
+            taken = np.concatenate([taken, spill])
+        free[taken] = False
+        ranks = slots[taken]
+        if len(ranks) < len(customers):
+            ranks = np.concatenate([ranks, np_rng.integers(0, min(top, len(advisors)), len(customers) - len(ranks))])
+        assigned[customers] = ranking[ranks]
+    return assigned
+
+# Vectorized enrollment engine: products per customer, enrollment dates,
+# investments, contribution frequencies and channels are drawn as NumPy arrays
+# for blocks of customers. Unlike the loop engine, which draws an advisor for
+# every enrollment, every customer keeps one advisor for all their products,
+# because clients_count caps an advisor's clients (see assign_advisors())
+def generate_enrollments_vectorized(shard):
+    import numpy as np
+
+    np_rng = shard["np_rng"]
+    customer_state = shard["customers"]
+    enrollment_state = shard["enrollments"]
+    products = shard["products"]
+    calendar = shard["calendar"]
+    first_ordinal = calendar["first_ordinal"]
+    start_ordinal, end_ordinal = shard["start_date"].toordinal(), shard["end_date"].toordinal()
+    total_days = end_ordinal - start_ordinal
+
+    segments = column_array(customer_state["segment"]).astype(np.int64)
+    customer_ordinals = column_array(customer_state["enrollment_date"])
+    contribution_rates = column_array(customer_state["contribution_rate"])
+    digital_affinity = column_array(customer_state["digital_affinity"])
+    customer_ids = [customer_id_for(shard["customer_start"] + i) for i in range(len(segments))]
+    advisor_ids = np.array([a["advisor_id"] for a in shard["advisors"]], dtype=object)
+    customer_advisors = advisor_ids[assign_advisors(shard, np_rng, segments)]
+
+    product_ids = np.array([p["product_id"] for p in products], dtype=object)
+    launch_ordinals = np.array([p["launch_date"].toordinal() for p in products])
+    min_investments = np.array([p["min_investment"] for p in products], dtype=np.float64)
+    segment_multipliers = np.array([segment_multiplier(segment) for segment in CUSTOMER_SEGMENTS])
+    # Products per customer by segment: Mass Market 1-2, Affluent 1-3, HNW 2-5, UHNW 3-8
+    fewest_products = np.array([1, 1, 2, 3])
+    most_products = np.array([2, 3, 5, 8])
+    # Monthly contribution multiplier per frequency; one-time plans contribute nothing after enrollment
+    frequency_multipliers = np.array([1, 3, 6, 12, 0])
+    frequency_names = np.array(CONTRIBUTION_FREQUENCIES, dtype=object)
+    digital_channels = np.array(["Web", "Mobile App"], dtype=object)
+    assisted_channels = np.array(["Phone", "In-person"], dtype=object)
+
+    num_products = len(products)
+    max_picks = min(most_products.max(), num_products)
+    for block_start in range(0, len(segments), ENROLLMENT_BLOCK_SIZE):
+        block = slice(block_start, min(block_start + ENROLLMENT_BLOCK_SIZE, len(segments)))
+        block_segments = segments[block]
+        count = len(block_segments)
+
+        # Distinct products for each customer, drawn one pick at a time: a pick
+        # that repeats one of the customer's earlier picks is redrawn, which
+        # samples without replacement like rng.sample() in the loop engine
+        # while the cost grows with the picks rather than with the catalogue
+        wanted = np.minimum(
+            np_rng.integers(fewest_products[block_segments], most_products[block_segments] + 1), num_products
+        )
+        choices = np.empty((count, max_picks), dtype=np.int64)
+        for pick in range(max_picks):
+            pending = np.nonzero(wanted > pick)[0]
+            while len(pending):
+                draws = np_rng.integers(0, num_products, len(pending))
+                choices[pending, pick] = draws
+                pending = pending[(choices[pending, :pick] == draws[:, None]).any(axis=1)]
+        rows, picks = np.nonzero(np.arange(max_picks) < wanted[:, None])
+        customers = block_start + rows
+        product_index = choices[rows, picks]
+
+        # Enrollment on the later of customer enrollment and product launch, within the period
+        enrollment_ordinals = np.maximum(customer_ordinals[customers], launch_ordinals[product_index])
+        in_period = enrollment_ordinals <= end_ordinal
+        customers, product_index, enrollment_ordinals = (
+            customers[in_period], product_index[in_period], enrollment_ordinals[in_period]
+        )
+        count = len(customers)
+
+        segment_mult = segment_multipliers[segments[customers]]
+        initial_investment = min_investments[product_index] * np_rng.uniform(1.0, 2.0, count) * segment_mult
+        frequencies = np_rng.integers(0, len(CONTRIBUTION_FREQUENCIES), count)
+        monthly_contribution = (
+            initial_investment * 0.02 * contribution_rates[customers] * segment_mult * frequency_multipliers[frequencies]
+        )
+
+        # Channel based on digital affinity and the digital adoption trend
+        digital_trend = 0.3 + (enrollment_ordinals - start_ordinal) / total_days * 0.5
+        digital = np_rng.random(count) < digital_affinity[customers] * digital_trend
+        channels = np.where(
+            digital, digital_channels[np_rng.integers(0, 2, count)], assisted_channels[np_rng.integers(0, 2, count)]
+        )
+
+        initial_investment = np.round(initial_investment, 2)
+        monthly_contribution = np.round(monthly_contribution, 2)
+        enrollment_state["customer"].extend(customers.tolist())
+        enrollment_state["product"].extend(product_index.tolist())
+        enrollment_state["enrollment_date"].extend(enrollment_ordinals.tolist())
+        enrollment_state["initial_investment"].extend(initial_investment.tolist())
+        enrollment_state["contribution_frequency"].extend(frequencies.tolist())
+        enrollment_state["monthly_contribution"].extend(monthly_contribution.tolist())
+
+        # The enrollment_id column is numbered globally when shards are merged
+        yield from zip(
+            [customer_ids[c] for c in customers.tolist()],
+            product_ids[product_index].tolist(),
+            [calendar["iso"][o - first_ordinal] for o in enrollment_ordinals.tolist()],
+            initial_investment.tolist(),
+            frequency_names[frequencies].tolist(),
+            monthly_contribution.tolist(),
+            customer_advisors[customers].tolist(),
+            channels.tolist(),
+            itertools.repeat("Active")
+        )
+
+ENROLLMENT_ENGINES = {
+    "loop": generate_enrollments,
+    "vectorized": generate_enrollments_vectorized
+}
 
 # Generate Market Data
-market_data = []
-current_date = START_DATE
-sp500_index = 3000  # Starting value
-bond_index = 100    # Starting value
-inflation_rate = 2.0  # Starting value
-prime_rate = 3.5     # Starting value
-unemployment_rate = 4.5  # Starting value
-
-with open(f"{output_dir}/market_data.csv", "w", newline="") as csvfile:
-    writer = csv.writer(csvfile)
-    writer.writerow([
-        "date", "sp500_index", "bond_index", "inflation_rate", 
-        "prime_rate", "unemployment_rate"
-    ])
-    
-    while current_date <= END_DATE:
+# The series starts from market_state when given (an append run) and leaves
+# its final levels and next date there
+def generate_market_data(config, market_data, rng, market_state=None, products=()):
+    start_date, end_date = config["start_date"], config["end_date"]
+    calendar = calendar_for(config)
+    market_state = {} if market_state is None else market_state
+    current_date = market_state.get("date", start_date)
+    sp500_index = market_state.get("sp500_index", 3000)  # Starting value
+    bond_index = market_state.get("bond_index", 100)    # Starting value
+    inflation_rate = market_state.get("inflation_rate", 2.0)  # Starting value
+    prime_rate = market_state.get("prime_rate", 3.5)     # Starting value
+    unemployment_rate = market_state.get("unemployment_rate", 4.5)  # Starting value
+
+    while current_date <= end_date:
         # Market fluctuations
-        market_factor = market_fluctuation(current_date)
-        
+        market_factor = market_fluctuation(current_date, start_date, rng)
+
         # SP500 changes with some randomness and market factor
-        sp500_change = random.normalvariate(0.0004, 0.01) * market_factor  # ~10% annual growth with volatility
+        sp500_change = rng.normalvariate(0.0004, 0.01) * market_factor  # ~10% annual growth with volatility
         sp500_index = max(sp500_index * (1 + sp500_change), 1000)  # Ensure it doesn't go too low
-        
+
         # Bond index changes more slowly
-        bond_change = random.normalvariate(0.0001, 0.002) * (1 / market_factor)  # Inverse relationship with stocks
+        bond_change = rng.normalvariate(0.0001, 0.002) * (1 / market_factor)  # Inverse relationship with stocks
         bond_index = max(bond_index * (1 + bond_change), 90)
-        
+
         # Inflation changes slowly with some correlation to market
-        inflation_change = random.normalvariate(0, 0.05) * market_factor
+        inflation_change = rng.normalvariate(0, 0.05) * market_factor
         inflation_rate = max(min(inflation_rate + inflation_change, 8.0), 0.5)  # Keep between 0.5% and 8%
-        
+
         # Prime rate follows inflation with a lag
-        if random.random() < 0.05:  # Rate changes are infrequent
+        if rng.random() < 0.05:  # Rate changes are infrequent
             if inflation_rate > 4.0 and prime_rate < 7.0:
-                prime_rate += random.uniform(0.25, 0.5)
+                prime_rate += rng.uniform(0.25, 0.5)
             elif inflation_rate < 2.0 and prime_rate > 3.0:
-                prime_rate -= random.uniform(0.25, 0.5)
-        
+                prime_rate -= rng.uniform(0.25, 0.5)
+
         # Unemployment rate
-        if random.random() < 0.1:  # Unemployment changes monthly
-            unemployment_change = random.normalvariate(0, 0.1) * (1 / market_factor)  # Better market, lower unemployment
+        if rng.random() < 0.1:  # Unemployment changes monthly
+            unemployment_change = rng.normalvariate(0, 0.1) * (1 / market_factor)  # Better market, lower unemployment
             unemployment_rate = max(min(unemployment_rate + unemployment_change, 10.0), 3.0)  # Keep between 3% and 10%
-        
+
+        # Only the index levels are needed to build the monthly market table
         market_data.append({
             "date": current_date,
             "sp500_index": round(sp500_index, 2),
-            "bond_index": round(bond_index, 2),
-            "inflation_rate": round(inflation_rate, 2),
-            "prime_rate": round(prime_rate, 2),
-            "unemployment_rate": round(unemployment_rate, 2)
+            "bond_index": round(bond_index, 2)
         })
-        
-        writer.writerow([
-            current_date.strftime("%Y-%m-%d"),
+
+        yield [
+            iso_date(calendar, current_date.toordinal()),
             round(sp500_index, 2),
             round(bond_index, 2),
             round(inflation_rate, 2),
             round(prime_rate, 2),
             round(unemployment_rate, 2)
-        ])
-        
+        ]
+
         # Advance to next date (using business days approximation)
         current_date += datetime.timedelta(days=1)
         if current_date.weekday() >= 5:  # Skip weekends
             current_date += datetime.timedelta(days=8 - current_date.weekday())
 
-# Generate Account Balances
-# We'll generate monthly balances for each enrollment
-balance_id = 1
-
-with open(f"{output_dir}/account_balances.csv", "w", newline="") as csvfile:
-    writer = csv.writer(csvfile)
-    writer.writerow([
-        "balance_id", "customer_id", "product_id", "date",
-        "balance", "contributions_mtd", "withdrawals_mtd", 
-        "investment_returns_mtd", "fees_mtd"
-    ])
-    
-    for enrollment in enrollments:
-        customer_id = enrollment["customer_id"]
-        product_id = enrollment["product_id"]
-        enrollment_date = enrollment["enrollment_date"]
-        
-        # Find the customer and product details
-        customer = next(c for c in customers if c["customer_id"] == customer_id)
-        product = next(p for p in products if p["product_id"] == product_id)
-        
+    market_state.update({
+        "date": current_date,
+        "sp500_index": sp500_index,
+        "bond_index": bond_index,
+        "inflation_rate": inflation_rate,
+        "prime_rate": prime_rate,
+        "unemployment_rate": unemployment_rate
+    })
+
+# Helper function to give every product its own asset mix: the category's
+# typical mix, tilted towards equities for riskier products, then perturbed
+def assign_asset_mixes(products, np_rng):
+    import numpy as np
+
+    for product in products:
+        if "asset_mix" in product:
+            continue
+        mix = np.array(CATEGORY_ASSET_MIX[product["product_category"]])
+        risk_factor = (RISK_LEVELS.index(product["risk_level"]) + 1) / len(RISK_LEVELS)
+        mix[0] += 0.3 * (risk_factor - 0.6)
+        mix = np.clip(mix, 0, None)
+        product["asset_mix"] = np_rng.dirichlet(mix / mix.sum() * 40 + 0.1).tolist()
+
+# Vectorized market engine: every business day of the period is drawn at once.
+# Daily shocks for MARKET_SERIES are correlated through the Cholesky factor of
+# their covariance matrix; asset class levels compound their returns, inflation
+# and unemployment accumulate their changes within bounds, and the prime rate
+# follows inflation on the infrequent days it changes. The S&P 500 and bond
+# columns of the table are the equity and bond levels.
+def generate_market_data_vectorized(config, market_data, rng, market_state=None, products=()):
+    import numpy as np
+
+    np_rng = np.random.default_rng(rng.getrandbits(64))
+    start_date, end_date = config["start_date"], config["end_date"]
+    market_state = {} if market_state is None else market_state
+    current_date = market_state.get("date", start_date)
+    asset_levels = np.array(market_state.get("asset_levels", [
+        market_state.get("sp500_index", 3000), market_state.get("bond_index", 100), 100.0, 100.0
+    ]))
+    inflation_rate = market_state.get("inflation_rate", 2.0)
+    prime_rate = market_state.get("prime_rate", 3.5)
+    unemployment_rate = market_state.get("unemployment_rate", 4.5)
+    assign_asset_mixes(products, np_rng)
+
+    # Business days of the period from the shared calendar; like the loop
+    # engine, a first day on a weekend is still recorded
+    calendar = calendar_for(config)
+    period = slice(current_date.toordinal() - calendar["first_ordinal"], end_date.toordinal() - calendar["first_ordinal"] + 1)
+    ordinals = np.arange(current_date.toordinal(), end_date.toordinal() + 1)
+    recorded = calendar["business_day"][period].copy()
+    recorded[:1] = True
+    ordinals = ordinals[recorded]
+    num_days = len(ordinals)
+
+    # Correlated daily shocks, scaled by the market cycle of market_fluctuation()
+    volatility = np.array(MARKET_VOLATILITY)
+    covariance = np.array(MARKET_CORRELATION) * np.outer(volatility, volatility)
+    shocks = np_rng.standard_normal((num_days, len(MARKET_SERIES))) @ np.linalg.cholesky(covariance).T
+    shocks += MARKET_DRIFT
+    days_since_start = (ordinals - start_date.toordinal()).astype(np.float64)
+    market_factor = (
+        1.0 + np.sin(days_since_start / 365 * 2 * np.pi) * 0.1
+        + np.sin(days_since_start / 30 * 2 * np.pi) * 0.2
+        + np_rng.uniform(-0.1, 0.1, num_days)
+    )
+
+    # Equities and real estate ride the cycle, bonds move against it
+    asset_returns = shocks[:, :len(ASSET_CLASSES)]
+    asset_returns[:, [0, 2]] *= market_factor[:, None]
+    asset_returns[:, 1] /= market_factor
+    levels = asset_levels * np.exp(np.cumsum(np.log1p(asset_returns), axis=0))
+
+    inflation = np.clip(inflation_rate + np.cumsum(shocks[:, 4]), 0.5, 8.0)
+
+    # Unemployment changes on about one day in ten
+    unemployment_changes = np.where(np_rng.random(num_days) < 0.1, shocks[:, 5], 0.0)
+    unemployment = np.clip(unemployment_rate + np.cumsum(unemployment_changes), 3.0, 10.0)
+
+    # On rate change days the prime rate moves to 1.5 points above inflation,
+    # in quarter points between 3% and 7.5%, and holds until the next change
+    change_days = np_rng.random(num_days) < 0.05
+    targets = np.clip(np.round((inflation + 1.5) * 4) / 4, 3.0, 7.5)
+    last_change = np.maximum.accumulate(np.where(change_days, np.arange(num_days), -1))
+    prime = np.where(last_change >= 0, targets[np.maximum(last_change, 0)], prime_rate)
+
+    dates = [datetime.date.fromordinal(o) for o in ordinals.tolist()]
+    date_strings = [calendar["iso"][o - calendar["first_ordinal"]] for o in ordinals.tolist()]
+    rounded = np.round(np.column_stack([levels[:, 0], levels[:, 1], inflation, prime, unemployment]), 2)
+    level_rows = levels.tolist()
+    for date, date_string, row, asset_row in zip(dates, date_strings, rounded.tolist(), level_rows):
+        market_data.append({
+            "date": date,
+            "sp500_index": row[0],
+            "bond_index": row[1],
+            "asset_levels": asset_row
+        })
+        yield [date_string] + row
+
+    if num_days:
+        next_date = dates[-1] + datetime.timedelta(days=1)
+        if next_date.weekday() >= 5:
+            next_date += datetime.timedelta(days=7 - next_date.weekday())
+        market_state.update({
+            "date": next_date,
+            "asset_levels": level_rows[-1],
+            "sp500_index": level_rows[-1][0],
+            "bond_index": level_rows[-1][1],
+            "inflation_rate": float(inflation[-1]),
+            "prime_rate": float(prime[-1]),
+            "unemployment_rate": float(unemployment[-1])
+        })
+
+MARKET_ENGINES = {
+    "loop": generate_market_data,
+    "vectorized": generate_market_data_vectorized
+}
+
+# Helper function to draw the churned enrollments (~5%) and their churn dates
+# before the balance stage, for exact lifetime values. Churn dates are ordinals,
+# 0 for enrollments that do not churn; the LIFETIME_TOTALS start at zero.
+def draw_churn(shard):
+    rng = shard["rng"]
+    enrollment_state = shard["enrollments"]
+    end_date = shard["end_date"]
+    num_enrollments = len(enrollment_state["customer"])
+    lifetime = {
+        "churned": array("i"),
+        "churn_date": array("i", bytes(4 * num_enrollments)),
+        **{name: array("d", bytes(8 * num_enrollments)) for name in LIFETIME_TOTALS}
+    }
+
+    for enrollment_index in rng.sample(range(num_enrollments), int(num_enrollments * 0.05)):
+        # Churn date is at least 90 days after enrollment and before end date
+        enrollment_date = datetime.date.fromordinal(enrollment_state["enrollment_date"][enrollment_index])
+        min_churn = enrollment_date + datetime.timedelta(days=90)
+        if min_churn >= end_date:
+            continue
+        lifetime["churned"].append(enrollment_index)
+        lifetime["churn_date"][enrollment_index] = random_date(min_churn, end_date, rng).toordinal()
+    shard["lifetime"] = lifetime
+
+# Legacy engine: walk every enrollment month by month in Python
+# Balances start from the enrollment, or in an append run from the opening
+# balance at balance_start; each enrollment's final balance goes to closing_balances
+def simulate_balances_loop(shard):
+    rng = shard["rng"]
+    customer_state = shard["customers"]
+    enrollment_state = shard["enrollments"]
+    products = shard["products"]
+    monthly_market = shard["monthly_market"]
+    end_ordinal = shard["end_date"].toordinal()
+
+    # Dates are day ordinals; months are indexes into the shared calendar
+    calendar = shard["calendar"]
+    first_ordinal = calendar["first_ordinal"]
+    day_months = calendar["month_index"].tolist()
+    month_ends = calendar["month_end"].tolist()
+    month_numbers = calendar["month_number"].tolist()
+    month_markets = [monthly_market.get(key) for key in calendar["month_key"]]
+    seasonal_effects = [seasonal_effect(datetime.date(year, month, 1)) for year, month in calendar["month_key"]]
+    lifetime = shard["lifetime"]
+
+    for enrollment_index in range(len(enrollment_state["customer"])):
+        customer_index = enrollment_state["customer"][enrollment_index]
+        customer_id = customer_id_for(shard["customer_start"] + customer_index)
+        product = products[enrollment_state["product"][enrollment_index]]
+        product_id = product["product_id"]
+        enrollment_ordinal = enrollment_state["enrollment_date"][enrollment_index]
+        birth_ordinal = customer_state["birth_date"][customer_index]
+        contribution_frequency = CONTRIBUTION_FREQUENCIES[enrollment_state["contribution_frequency"][enrollment_index]]
+        monthly_contribution = enrollment_state["monthly_contribution"][enrollment_index]
+
         # Set up initial balance and date
-        current_date = enrollment_date
-        balance = enrollment["initial_investment"]
-        
+        current_ordinal = max(enrollment_ordinal, shard["balance_start"].toordinal())
+        if shard["opening_balances"] is not None:
+            balance = shard["opening_balances"][enrollment_index]
+        else:
+            balance = enrollment_state["initial_investment"][enrollment_index]
+
+        # Churned enrollments stop on their churn date
+        last_ordinal = end_ordinal
+        if lifetime is not None and lifetime["churn_date"][enrollment_index]:
+            last_ordinal = min(end_ordinal, lifetime["churn_date"][enrollment_index])
+        totals = [0.0] * len(LIFETIME_TOTALS)
+
         # Monthly processing until end date
-        while current_date <= END_DATE:
-            # Calculate month-end date
-            month_end = datetime.date(current_date.year, current_date.month, 1)
-            month_end = month_end.replace(day=28) + datetime.timedelta(days=4)
-            month_end = month_end - datetime.timedelta(days=month_end.day)
-            
-            # If we're past month-end, move to next month
-            if current_date.day > month_end.day:
-                current_date = datetime.date(
-                    current_date.year + (current_date.month // 12), 
-                    (current_date.month % 12) + 1, 
-                    1
-                )
-                continue
-                
+        while current_ordinal <= last_ordinal:
+            month = day_months[current_ordinal - first_ordinal]
+            calendar_month = month_numbers[month]
+
             # Get market data for this month
-            monthly_market_data = [m for m in market_data if m["date"].year == current_date.year and m["date"].month == current_date.month]
-            if not monthly_market_data:
+            month_market = month_markets[month]
+            if month_market is None:
                 # No market data for this month, move to next
-                current_date = datetime.date(
-                    current_date.year + (current_date.month // 12), 
-                    (current_date.month % 12) + 1, 
-                    1
-                )
+                current_ordinal = month_ends[month] + 1
                 continue
-                
+
             # Calculate monthly contributions based on frequency
             contributions_mtd = 0
-            if enrollment["contribution_frequency"] == "Monthly":
-                contributions_mtd = enrollment["monthly_contribution"]
-            elif enrollment["contribution_frequency"] == "Quarterly" and current_date.month % 3 == 0:
-                contributions_mtd = enrollment["monthly_contribution"]
-            elif enrollment["contribution_frequency"] == "Bi-annual" and current_date.month in [6, 12]:
-                contributions_mtd = enrollment["monthly_contribution"]
-            elif enrollment["contribution_frequency"] == "Annual" and current_date.month == 12:
-                contributions_mtd = enrollment["monthly_contribution"]
-                
+            if contribution_frequency == "Monthly":
+                contributions_mtd = monthly_contribution
+            elif contribution_frequency == "Quarterly" and calendar_month % 3 == 0:
+                contributions_mtd = monthly_contribution
+            elif contribution_frequency == "Bi-annual" and calendar_month in [6, 12]:
+                contributions_mtd = monthly_contribution
+            elif contribution_frequency == "Annual" and calendar_month == 12:
+                contributions_mtd = monthly_contribution
+
             # Apply seasonal effect to contributions
-            seasonal = seasonal_effect(current_date)
+            seasonal = seasonal_effects[month]
             contributions_mtd = contributions_mtd * seasonal
-            
+
             # Calculate withdrawals (random, but more common for older customers)
             withdrawals_mtd = 0
-            age = (current_date - customer["birth_date"]).days / 365
-            
+            age = (current_ordinal - birth_ordinal) / 365
+
             withdrawal_probability = 0.01  # Base 1% chance per month
             if age > 60:  # Retirement age
                 withdrawal_probability = 0.05  # 5% chance
-            
-            if random.random() < withdrawal_probability:
-                withdrawals_mtd = balance * random.uniform(0.01, 0.05)  # 1-5% withdrawal
-                
+
+            if rng.random() < withdrawal_probability:
+                withdrawals_mtd = balance * rng.uniform(0.01, 0.05)  # 1-5% withdrawal
+
             # Calculate investment returns based on market performance and risk
             risk_level = product["risk_level"]
             risk_index = RISK_LEVELS.index(risk_level)
             risk_factor = (risk_index + 1) / len(RISK_LEVELS)  # Normalize to 0-1
-            
-            # Average market performance this month
-            avg_market = np.mean([m["sp500_index"] for m in monthly_market_data])
-            avg_prev_market = np.mean([m["sp500_index"] for m in market_data 
-                                    if m["date"].year == current_date.year and m["date"].month == current_date.month - 1]) \
-                             if current_date.month > 1 else np.mean([m["sp500_index"] for m in monthly_market_data])
-            
-            market_return = (avg_market / avg_prev_market) - 1 if avg_prev_market > 0 else 0
-            
-            # Bond performance (inverse to market)
-            avg_bonds = np.mean([m["bond_index"] for m in monthly_market_data])
-            avg_prev_bonds = np.mean([m["bond_index"] for m in market_data 
-                                   if m["date"].year == current_date.year and m["date"].month == current_date.month - 1]) \
-                           if current_date.month > 1 else np.mean([m["bond_index"] for m in monthly_market_data])
-            
-            bond_return = (avg_bonds / avg_prev_bonds) - 1 if avg_prev_bonds > 0 else 0
-            
+
+            # Month-over-month market and bond performance (bonds move inverse to market)
+            market_return = month_market["market_return"]
+            bond_return = month_market["bond_return"]
+
             # Calculate weighted return based on risk profile
             # Higher risk = more market exposure, less bond exposure
-            weighted_return = (market_return * risk_factor) + (bond_return * (1 - risk_factor))
-            
+            # With asset class returns, the product's own mix of them is used instead
+            if "asset_returns" in month_market and "asset_mix" in product:
+                weighted_return = sum(w * r for w, r in zip(product["asset_mix"], month_market["asset_returns"]))
+            else:
+                weighted_return = (market_return * risk_factor) + (bond_return * (1 - risk_factor))
+
             # Add some noise
-            weighted_return += random.normalvariate(0, 0.005)
-            
+            weighted_return += rng.normalvariate(0, 0.005)
+
             # Calculate investment returns
             investment_returns_mtd = balance * weighted_return
-            
+
             # Calculate fees
             annual_fee_pct = product["annual_fee_percentage"] / 100
             monthly_fee_pct = annual_fee_pct / 12
             monthly_fee_fixed = product["management_fee_fixed"] / 12 if product["management_fee_fixed"] > 0 else 0
-            
+
             fees_mtd = (balance * monthly_fee_pct) + monthly_fee_fixed
-            
+
             # Update balance
             balance = balance + contributions_mtd - withdrawals_mtd + investment_returns_mtd - fees_mtd
-            
-            # Record the balance
-            writer.writerow([
-                f"BAL{balance_id:08d}", customer_id, product_id, 
-                current_date.strftime("%Y-%m-%d"), round(balance, 2),
+            if lifetime is not None:
+                for i, value in enumerate((contributions_mtd, withdrawals_mtd, investment_returns_mtd, fees_mtd)):
+                    totals[i] += value
+
+            # Record the balance (balance_id is numbered when shards are merged)
+            yield [
+                customer_id, product_id,
+                iso_date(calendar, current_ordinal), round(balance, 2),
                 round(contributions_mtd, 2), round(withdrawals_mtd, 2),
                 round(investment_returns_mtd, 2), round(fees_mtd, 2)
-            ])
-            
-            balance_id += 1
-            
+            ]
+
             # Move to next month
-            current_date = datetime.date(
-                current_date.year + (current_date.month // 12), 
-                (current_date.month % 12) + 1, 
-                1
+            current_ordinal = month_ends[month] + 1
+
+        shard["closing_balances"].append(balance)
+        if lifetime is not None:
+            for name, total in zip(LIFETIME_TOTALS, totals):
+                lifetime[name][enrollment_index] += total
+
+# Vectorized engine: simulate enrollments x months as NumPy arrays
+def simulate_balances_vectorized(shard):
+    import numpy as np
+
+    np_rng = shard["np_rng"]
+    customer_state = shard["customers"]
+    enrollment_state = shard["enrollments"]
+    products = shard["products"]
+    monthly_market = shard["monthly_market"]
+
+    # Month grid covering the simulation period, cut from the shared calendar
+    calendar = shard["calendar"]
+    first_ordinal = calendar["first_ordinal"]
+    first_month = int(calendar["month_index"][shard["balance_start"].toordinal() - first_ordinal])
+    last_month = int(calendar["month_index"][shard["end_date"].toordinal() - first_ordinal])
+    grid = slice(first_month, last_month + 1)
+    num_months = last_month - first_month + 1
+    month_numbers = calendar["month_number"][grid]
+    month_ordinals = calendar["month_start"][grid]
+    month_strings = calendar["month_iso"][grid]
+    seasonal = np.array([seasonal_effect(datetime.date(year, month, 1)) for year, month in calendar["month_key"][grid]])
+
+    # Market returns per month from the precomputed monthly table
+    month_markets = [monthly_market.get(key) for key in calendar["month_key"][grid]]
+    has_market_data = np.array([mm is not None for mm in month_markets])
+    market_return = np.array([mm["market_return"] if mm else 0.0 for mm in month_markets])
+    bond_return = np.array([mm["bond_return"] if mm else 0.0 for mm in month_markets])
+
+    # Each product's own monthly returns (products x months) from its asset mix,
+    # when the market engine simulated asset classes
+    use_asset_mix = all("asset_mix" in p for p in products) and all(
+        "asset_returns" in mm for mm in month_markets if mm
+    )
+    if use_asset_mix:
+        asset_returns = np.array([mm["asset_returns"] if mm else [0.0] * len(ASSET_CLASSES) for mm in month_markets])
+        product_returns = np.array([p["asset_mix"] for p in products]) @ asset_returns.T
+
+    # Contribution schedule per frequency and calendar month
+    schedule = np.zeros((len(CONTRIBUTION_FREQUENCIES), 12))
+    schedule[CONTRIBUTION_FREQUENCIES.index("Monthly"), :] = 1
+    schedule[CONTRIBUTION_FREQUENCIES.index("Quarterly"), [2, 5, 8, 11]] = 1
+    schedule[CONTRIBUTION_FREQUENCIES.index("Bi-annual"), [5, 11]] = 1
+    schedule[CONTRIBUTION_FREQUENCIES.index("Annual"), 11] = 1
+
+    # Per-product parameters
+    product_ids = [p["product_id"] for p in products]
+    product_risk_factor = np.array([(RISK_LEVELS.index(p["risk_level"]) + 1) / len(RISK_LEVELS) for p in products])
+    product_fee_pct = np.array([p["annual_fee_percentage"] / 100 / 12 for p in products])
+    product_fee_fixed = np.array([p["management_fee_fixed"] / 12 for p in products])
+
+    birth_ordinals = column_array(customer_state["birth_date"])
+    enrollment_customers = column_array(enrollment_state["customer"])
+    enrollment_products = column_array(enrollment_state["product"])
+    enrollment_ordinals = column_array(enrollment_state["enrollment_date"])
+    if shard["opening_balances"] is not None:
+        initial_investments = column_array(shard["opening_balances"])
+    else:
+        initial_investments = column_array(enrollment_state["initial_investment"])
+    monthly_contributions = column_array(enrollment_state["monthly_contribution"])
+    frequencies = column_array(enrollment_state["contribution_frequency"])
+    num_enrollments = len(enrollment_customers)
+
+    # Churn dates and running totals, for exact lifetime values
+    lifetime = shard["lifetime"]
+    if lifetime is not None:
+        churn_ordinals = column_array(lifetime["churn_date"])
+        lifetime_totals = [column_array(lifetime[name]) for name in LIFETIME_TOTALS]
+
+    chunk_size = shard["config"]["balance_chunk_size"]
+    for chunk_start in range(0, num_enrollments, chunk_size):
+        chunk = slice(chunk_start, min(chunk_start + chunk_size, num_enrollments))
+        chunk_customers = enrollment_customers[chunk]
+        chunk_products = enrollment_products[chunk]
+
+        # Per-enrollment parameters
+        start_ordinal = enrollment_ordinals[chunk]
+        # Enrollments from before the grid (an append run) start on its first month
+        enrolled_before = start_ordinal < month_ordinals[0]
+        start_idx = np.maximum(calendar["month_index"][start_ordinal - first_ordinal] - first_month, 0)
+        balance = initial_investments[chunk].copy()
+        birth_ordinal = birth_ordinals[chunk_customers]
+        risk_factor = product_risk_factor[chunk_products]
+        monthly_fee_pct = product_fee_pct[chunk_products]
+        monthly_fee_fixed = product_fee_fixed[chunk_products]
+
+        # Enrollment x month masks; the first row is dated on the enrollment day
+        month_grid = np.arange(num_months)
+        active = (month_grid >= start_idx[:, None]) & has_market_data
+        opening_month = (month_grid == start_idx[:, None]) & ~enrolled_before[:, None]
+        row_ordinals = np.where(opening_month, start_ordinal[:, None], month_ordinals)
+        if lifetime is not None:
+            # Churned enrollments stop on their churn date
+            churn_ordinal = churn_ordinals[chunk][:, None]
+            active &= (churn_ordinal == 0) | (row_ordinals <= churn_ordinal)
+
+        contributions = (
+            monthly_contributions[chunk][:, None]
+            * schedule[frequencies[chunk][:, None], month_numbers - 1]
+            * seasonal
+        )
+
+        # Withdrawals are more common after retirement age
+        age = (row_ordinals - birth_ordinal[:, None]) / 365
+        withdrawal_probability = np.where(age > 60, 0.05, 0.01)
+        shape = active.shape
+        withdrawal_rate = np.where(
+            np_rng.random(shape) < withdrawal_probability,
+            np_rng.uniform(0.01, 0.05, shape),
+            0.0
+        )
+
+        # Risk-weighted market and bond returns (or the product's own returns) plus noise
+        if use_asset_mix:
+            weighted_return = product_returns[chunk_products] + np_rng.normal(0, 0.005, shape)
+        else:
+            weighted_return = (
+                market_return * risk_factor[:, None]
+                + bond_return * (1 - risk_factor[:, None])
+                + np_rng.normal(0, 0.005, shape)
             )
 
+        # Balance recursion, one month at a time across all enrollments
+        balances = np.zeros(shape)
+        withdrawals = np.zeros(shape)
+        returns = np.zeros(shape)
+        fees = np.zeros(shape)
+        for idx in range(num_months):
+            withdrawals[:, idx] = balance * withdrawal_rate[:, idx]
+            returns[:, idx] = balance * weighted_return[:, idx]
+            fees[:, idx] = balance * monthly_fee_pct + monthly_fee_fixed
+            updated = balance + contributions[:, idx] - withdrawals[:, idx] + returns[:, idx] - fees[:, idx]
+            balance = np.where(active[:, idx], updated, balance)
+            balances[:, idx] = balance
+        shard["closing_balances"].extend(balance.tolist())
+        if lifetime is not None:
+            for total, values in zip(lifetime_totals, (contributions, withdrawals, returns, fees)):
+                total[chunk] += np.where(active, values, 0.0).sum(axis=1)
+
+        # Emit the active cells in enrollment order, gathering every column
+        # from NumPy arrays (balance_id is numbered when shards are merged)
+        rows, cols = np.nonzero(active)
+        customer_ids = np.array([customer_id_for(shard["customer_start"] + c) for c in chunk_customers.tolist()], dtype=object)
+        chunk_product_ids = np.array(product_ids, dtype=object)[chunk_products]
+        start_strings = np.array([calendar["iso"][o - first_ordinal] for o in start_ordinal.tolist()], dtype=object)
+        dates = np.where(opening_month[rows, cols], start_strings[rows], np.array(month_strings, dtype=object)[cols])
+        yield from zip(
+            customer_ids[rows].tolist(),
+            chunk_product_ids[rows].tolist(),
+            dates.tolist(),
+            np.round(balances[rows, cols], 2).tolist(),
+            np.round(contributions[rows, cols], 2).tolist(),
+            np.round(withdrawals[rows, cols], 2).tolist(),
+            np.round(returns[rows, cols], 2).tolist(),
+            np.round(fees[rows, cols], 2).tolist()
+        )
+
 # Generate Customer Service Interactions
-interactions = []
-
-with open(f"{output_dir}/service_interactions.csv", "w", newline="") as csvfile:
-    writer = csv.writer(csvfile)
-    writer.writerow([
-        "interaction_id", "customer_id", "date", "channel", 
-        "reason_code", "duration_minutes", "satisfaction_score", "resolution_status", "agent_id"
-    ])
-    
-    for _ in range(NUM_INTERACTIONS):
+# Only the per-customer flags the retention stage needs are kept
+def generate_service_interactions(shard):
+    rng = shard["rng"]
+    customer_state = shard["customers"]
+    interaction_state = shard["interactions"]
+    num_customers = len(customer_state["segment"])
+    calendar = shard["calendar"]
+    start_date, end_date = shard["start_date"], shard["end_date"]
+
+    for _ in range(shard["num_interactions"]):
         # Pick a random customer
-        customer = random.choice(customers)
-        customer_id = customer["customer_id"]
-        
+        customer_index = rng.randrange(num_customers)
+        customer_id = customer_id_for(shard["customer_start"] + customer_index)
+        customer_enrollment_date = datetime.date.fromordinal(customer_state["enrollment_date"][customer_index])
+
         # Generate interaction date
         interaction_date = random_date(
-            max(customer["enrollment_date"], START_DATE),
-            END_DATE
+            max(customer_enrollment_date, shard["period_start"]),
+            end_date,
+            rng
         )
-        
+
         # Determine channel based on age and digital trend
-        digital_affinity = customer["age_factors"]["digital_affinity"]
-        digital_trend = digital_adoption_trend(interaction_date)
-        
-        if random.random() < digital_affinity * digital_trend:
-            channel = random.choice(["Web", "Mobile App", "Email", "Chat"])
+        digital_affinity = customer_state["digital_affinity"][customer_index]
+        digital_trend = digital_adoption_trend(interaction_date, start_date, end_date)
+
+        if rng.random() < digital_affinity * digital_trend:
+            channel = rng.choice(["Web", "Mobile App", "Email", "Chat"])
         else:
-            channel = random.choice(["Phone", "In-person"])
-            
+            channel = rng.choice(["Phone", "In-person"])
+
         # Reason code
-        reason_code = random.choice(REASON_CODES)
-        
+        reason_code = rng.choice(REASON_CODES)
+
         # Duration varies by channel and reason
         if channel in ["Phone", "In-person"]:
-            base_duration = random.randint(5, 30)
+            base_duration = rng.randint(5, 30)
         else:
-            base_duration = random.randint(2, 15)
-            
+            base_duration = rng.randint(2, 15)
+
         if reason_code in ["Complaint", "Transaction Issue"]:
             base_duration *= 1.5
-            
+
         duration_minutes = int(base_duration)
-        
+
         # Satisfaction score
         # Base satisfaction influenced by duration and reason
         base_satisfaction = 4.0  # Start with good satisfaction
-        
+
         if duration_minutes > 20:
             base_satisfaction -= 0.5  # Longer interactions less satisfying
-            
+
         if reason_code in ["Complaint", "Transaction Issue", "Technical Support"]:
             base_satisfaction -= 1.0  # Problem-based interactions less satisfying
-            
+
         # Add random variation
-        satisfaction_noise = random.normalvariate(0, 0.5)
+        satisfaction_noise = rng.normalvariate(0, 0.5)
         satisfaction_score = max(1, min(5, base_satisfaction + satisfaction_noise))
-        
+
         # Resolution status
         if satisfaction_score >= 4.0:
             resolution_status = "Resolved"
         elif satisfaction_score >= 3.0:
-            resolution_status = random.choice(["Resolved", "Partially Resolved"])
+            resolution_status = rng.choice(["Resolved", "Partially Resolved"])
         else:
-            resolution_status = random.choice(["Partially Resolved", "Unresolved"])
-            
-        # Agent ID 
-        agent_id = f"AGT{random.randint(1, 100):04d}"
-        
-        interactions.append({
-            "interaction_id": f"INT{_+1:06d}",
-            "customer_id": customer_id,
-            "date": interaction_date.strftime("%Y-%m-%d"),
-            "channel": channel,
-            "reason_code": reason_code,
-            "duration_minutes": duration_minutes,
-            "satisfaction_score": round(satisfaction_score, 1),
-            "resolution_status": resolution_status,
-            "agent_id": agent_id
-        })
-        
-        writer.writerow([
-            f"INT{_+1:06d}", customer_id, interaction_date.strftime("%Y-%m-%d"),
-            channel, reason_code, duration_minutes, 
+            resolution_status = rng.choice(["Partially Resolved", "Unresolved"])
+
+        # Agent ID
+        agent_id = f"AGT{rng.randint(1, 100):04d}"
+
+        if resolution_status == "Unresolved":
+            interaction_state["unresolved"][customer_index] = 1
+        if reason_code == "Fee Inquiry":
+            interaction_state["fee_inquiry"][customer_index] = 1
+
+        # The interaction_id column is numbered globally when shards are merged
+        yield [
+            customer_id, iso_date(calendar, interaction_date.toordinal()),
+            channel, reason_code, duration_minutes,
             round(satisfaction_score, 1), resolution_status, agent_id
-        ])
+        ]
 
 # Generate Customer Engagement
-engagements = []
-
-with open(f"{output_dir}/engagement.csv", "w", newline="") as csvfile:
-    writer = csv.writer(csvfile)
-    writer.writerow([
-        "engagement_id", "customer_id", "date", "action_type",
-        "device_type", "session_duration", "pages_viewed", "actions_taken"
-    ])
-    
-    for i in range(NUM_ENGAGEMENT):
+def generate_engagement(shard):
+    rng = shard["rng"]
+    customer_state = shard["customers"]
+    num_customers = len(customer_state["segment"])
+    calendar = shard["calendar"]
+    end_date = shard["end_date"]
+
+    for _ in range(shard["num_engagement"]):
         # Pick a random customer
-        customer = random.choice(customers)
-        customer_id = customer["customer_id"]
-        
+        customer_index = rng.randrange(num_customers)
+        customer_id = customer_id_for(shard["customer_start"] + customer_index)
+        customer_enrollment_date = datetime.date.fromordinal(customer_state["enrollment_date"][customer_index])
+
         # Generate engagement date
         engagement_date = random_date(
-            max(customer["enrollment_date"], START_DATE),
-            END_DATE
+            max(customer_enrollment_date, shard["period_start"]),
+            end_date,
+            rng
         )
-        
+
         # Action type based on age
-        action_type = random.choice(ACTION_TYPES)
-        
+        action_type = rng.choice(ACTION_TYPES)
+
         # Device type based on age
-        digital_affinity = customer["age_factors"]["digital_affinity"]
-        if random.random() < digital_affinity:
-            device_type = random.choice(["Mobile Phone", "Tablet"])
+        digital_affinity = customer_state["digital_affinity"][customer_index]
+        if rng.random() < digital_affinity:
+            device_type = rng.choice(["Mobile Phone", "Tablet"])
         else:
-            device_type = random.choice(["Desktop", "Smart TV", "Voice Assistant"])
-        
+            device_type = rng.choice(["Desktop", "Smart TV", "Voice Assistant"])
+
         # Session duration
         if action_type in ["Login", "Update Profile", "Download Statement"]:
-            session_minutes = random.randint(1, 5)
+            session_minutes = rng.randint(1, 5)
         elif action_type in ["Research Product", "Watch Educational Video", "Use Planning Tool"]:
-            session_minutes = random.randint(5, 30)
+            session_minutes = rng.randint(5, 30)
         else:
-            session_minutes = random.randint(2, 10)
-            
+            session_minutes = rng.randint(2, 10)
+
         # Pages viewed
         pages_viewed = max(1, int(session_minutes / 2))
-        
+
         # Actions taken
         actions_taken = max(1, int(pages_viewed / 2))
-        
-        engagements.append({
-            "engagement_id": f"ENG{i+1:07d}",
-            "customer_id": customer_id,
-            "date": engagement_date.strftime("%Y-%m-%d"),
-            "action_type": action_type,
-            "device_type": device_type, 
-            "session_duration": session_minutes,
-            "pages_viewed": pages_viewed,
-            "actions_taken": actions_taken
-        })
-        
-        writer.writerow([
-            f"ENG{i+1:07d}", customer_id, engagement_date.strftime("%Y-%m-%d"),
+
+        # The engagement_id column is numbered globally when shards are merged
+        yield [
+            customer_id, iso_date(calendar, engagement_date.toordinal()),
             action_type, device_type, session_minutes, pages_viewed, actions_taken
-        ])
+        ]
+
+# Helper function for the batch event engines: per chunk of `count` events,
+# random customers of the shard and a date for each in [max(enrollment date,
+# period start), end date), like random_date(); returns customer indexes and
+# date ordinals
+def draw_event_customers(shard, np_rng, count):
+    import numpy as np
+
+    enrollment_ordinals = column_array(shard["customers"]["enrollment_date"])
+    customer_index = np_rng.integers(0, len(enrollment_ordinals), count)
+    first_day = np.maximum(enrollment_ordinals[customer_index], shard["period_start"].toordinal())
+    days = np.maximum(shard["end_date"].toordinal() - first_day, 1)
+    return customer_index, first_day + (np_rng.random(count) * days).astype(np.int64)
+
+# Helper function for the lookups the batch event engines format rows with:
+# customer IDs by shard position and the calendar's ISO dates by ordinal
+def event_labels(shard):
+    import numpy as np
+
+    customer_ids = np.array([
+        customer_id_for(shard["customer_start"] + i) for i in range(len(shard["customers"]["segment"]))
+    ], dtype=object)
+    calendar = shard["calendar"]
+    return customer_ids, calendar["first_ordinal"], np.array(calendar["iso"], dtype=object)
+
+# Batch version of generate_service_interactions(): the same rules applied to
+# EVENT_CHUNK_SIZE interactions at a time as NumPy arrays
+def generate_service_interactions_vectorized(shard):
+    import numpy as np
+
+    np_rng = shard["np_rng"]
+    customer_state = shard["customers"]
+    interaction_state = shard["interactions"]
+    start_ordinal = shard["start_date"].toordinal()
+    total_days = (shard["end_date"] - shard["start_date"]).days
+    digital_affinity = column_array(customer_state["digital_affinity"])
+    unresolved = np.frombuffer(interaction_state["unresolved"], dtype=np.uint8)
+    fee_inquiry = np.frombuffer(interaction_state["fee_inquiry"], dtype=np.uint8)
+    customer_ids, first_ordinal, date_strings = event_labels(shard)
+
+    digital_channels = np.array(["Web", "Mobile App", "Email", "Chat"], dtype=object)
+    assisted_channels = np.array(["Phone", "In-person"], dtype=object)
+    reason_codes = np.array(REASON_CODES, dtype=object)
+    long_reasons = np.isin(reason_codes, ["Complaint", "Transaction Issue"])
+    problem_reasons = np.isin(reason_codes, ["Complaint", "Transaction Issue", "Technical Support"])
+    statuses = np.array(["Resolved", "Partially Resolved", "Unresolved"], dtype=object)
+    agent_ids = np.array([f"AGT{i:04d}" for i in range(1, 101)], dtype=object)
+
+    remaining = shard["num_interactions"]
+    while remaining > 0:
+        count = min(remaining, shard["config"]["event_chunk_size"])
+        remaining -= count
+        customer_index, ordinals = draw_event_customers(shard, np_rng, count)
+
+        # Channel based on digital affinity and the digital adoption trend
+        digital_trend = 0.3 + (ordinals - start_ordinal) / total_days * 0.5
+        digital = np_rng.random(count) < digital_affinity[customer_index] * digital_trend
+        channels = np.where(
+            digital, digital_channels[np_rng.integers(0, 4, count)], assisted_channels[np_rng.integers(0, 2, count)]
+        )
+        reasons = np_rng.integers(0, len(REASON_CODES), count)
+
+        # Duration varies by channel and reason
+        durations = np.where(digital, np_rng.integers(2, 16, count), np_rng.integers(5, 31, count))
+        durations = np.where(long_reasons[reasons], durations * 1.5, durations).astype(np.int64)
+
+        # Satisfaction falls for long and problem-based interactions
+        satisfaction = 4.0 - 0.5 * (durations > 20) - 1.0 * problem_reasons[reasons]
+        satisfaction = np.clip(satisfaction + np_rng.normal(0, 0.5, count), 1, 5)
+
+        # Resolved from 4.0 up; a coin flip between the two nearest statuses below
+        coin = np_rng.integers(0, 2, count)
+        status_codes = np.where(satisfaction >= 4.0, 0, np.where(satisfaction >= 3.0, coin, 1 + coin))
+
+        unresolved[customer_index[status_codes == 2]] = 1
+        fee_inquiry[customer_index[reasons == REASON_CODES.index("Fee Inquiry")]] = 1
+
+        # The interaction_id column is numbered globally when shards are merged
+        yield from zip(
+            customer_ids[customer_index].tolist(),
+            date_strings[ordinals - first_ordinal].tolist(),
+            channels.tolist(),
+            reason_codes[reasons].tolist(),
+            durations.tolist(),
+            np.round(satisfaction, 1).tolist(),
+            statuses[status_codes].tolist(),
+            agent_ids[np_rng.integers(0, 100, count)].tolist()
+        )
+
+# Batch version of generate_engagement(): the same rules applied to
+# EVENT_CHUNK_SIZE events at a time as NumPy arrays
+def generate_engagement_vectorized(shard):
+    import numpy as np
+
+    np_rng = shard["np_rng"]
+    digital_affinity = column_array(shard["customers"]["digital_affinity"])
+    customer_ids, first_ordinal, date_strings = event_labels(shard)
+
+    action_types = np.array(ACTION_TYPES, dtype=object)
+    mobile_devices = np.array(["Mobile Phone", "Tablet"], dtype=object)
+    other_devices = np.array(["Desktop", "Smart TV", "Voice Assistant"], dtype=object)
+    # Session length range per action type: short tasks, research, everything else
+    short_actions = np.isin(action_types, ["Login", "Update Profile", "Download Statement"])
+    long_actions = np.isin(action_types, ["Research Product", "Watch Educational Video", "Use Planning Tool"])
+    session_low = np.where(short_actions, 1, np.where(long_actions, 5, 2))
+    session_high = np.where(short_actions, 5, np.where(long_actions, 30, 10))
+
+    remaining = shard["num_engagement"]
+    while remaining > 0:
+        count = min(remaining, shard["config"]["event_chunk_size"])
+        remaining -= count
+        customer_index, ordinals = draw_event_customers(shard, np_rng, count)
+
+        actions = np_rng.integers(0, len(ACTION_TYPES), count)
+        mobile = np_rng.random(count) < digital_affinity[customer_index]
+        devices = np.where(
+            mobile, mobile_devices[np_rng.integers(0, 2, count)], other_devices[np_rng.integers(0, 3, count)]
+        )
+        session_minutes = np_rng.integers(session_low[actions], session_high[actions] + 1)
+        pages_viewed = np.maximum(1, session_minutes // 2)
+        actions_taken = np.maximum(1, pages_viewed // 2)
+
+        # The engagement_id column is numbered globally when shards are merged
+        yield from zip(
+            customer_ids[customer_index].tolist(),
+            date_strings[ordinals - first_ordinal].tolist(),
+            action_types[actions].tolist(),
+            devices.tolist(),
+            session_minutes.tolist(),
+            pages_viewed.tolist(),
+            actions_taken.tolist()
+        )
+
+EVENT_ENGINES = {
+    "loop": {"service_interactions": generate_service_interactions, "engagement": generate_engagement},
+    "vectorized": {
+        "service_interactions": generate_service_interactions_vectorized,
+        "engagement": generate_engagement_vectorized
+    }
+}
 
 # Generate Customer Retention/Churn
 # We'll churn a small percentage of customers
-with open(f"{output_dir}/retention.csv", "w", newline="") as csvfile:
-    writer = csv.writer(csvfile)
-    writer.writerow([
-        "customer_id", "product_id", "churn_date", "churn_reason",
-        "exit_survey_score", "recovered_flag", "total_customer_lifetime_value"
-    ])
-    
-    # Choose ~5% of enrollments to churn
-    churn_enrollments = random.sample(enrollments, int(len(enrollments) * 0.05))
-    
-    for enrollment in churn_enrollments:
-        customer_id = enrollment["customer_id"]
-        product_id = enrollment["product_id"]
-        enrollment_date = enrollment["enrollment_date"]
-        
+def generate_retention(shard):
+    rng = shard["rng"]
+    enrollment_state = shard["enrollments"]
+    interaction_state = shard["interactions"]
+    products = shard["products"]
+    calendar = shard["calendar"]
+    end_date = shard["end_date"]
+    lifetime = shard["lifetime"]
+
+    # Choose ~5% of enrollments to churn (already drawn for exact lifetime values)
+    num_enrollments = len(enrollment_state["customer"])
+    if lifetime is None:
+        churn_enrollments = rng.sample(range(num_enrollments), int(num_enrollments * 0.05))
+    else:
+        churn_enrollments = lifetime["churned"]
+
+    for enrollment_index in churn_enrollments:
+        customer_index = enrollment_state["customer"][enrollment_index]
+        customer_id = customer_id_for(shard["customer_start"] + customer_index)
+        product = products[enrollment_state["product"][enrollment_index]]
+        product_id = product["product_id"]
+        enrollment_date = datetime.date.fromordinal(enrollment_state["enrollment_date"][enrollment_index])
+
         # Churn date is at least 90 days after enrollment and before end date
-        min_churn = enrollment_date + datetime.timedelta(days=90)
-        if min_churn >= END_DATE:
-            continue
-            
-        churn_date = random_date(min_churn, END_DATE)
-        
-        # Find related data for this customer+product
-        customer = next(c for c in customers if c["customer_id"] == customer_id)
-        
-        # Find interactions for this customer
-        customer_interactions = [i for i in interactions if i["customer_id"] == customer_id]
-        
+        if lifetime is None:
+            min_churn = enrollment_date + datetime.timedelta(days=90)
+            if min_churn >= end_date:
+                continue
+            churn_date = random_date(min_churn, end_date, rng)
+        else:
+            churn_date = datetime.date.fromordinal(lifetime["churn_date"][enrollment_index])
+
         # Determine churn reason based on interaction history
-        if any(i["resolution_status"] == "Unresolved" for i in customer_interactions) and random.random() < 0.7:
+        if interaction_state["unresolved"][customer_index] and rng.random() < 0.7:
             churn_reason = "Service Issue"
-        elif any(i["reason_code"] == "Fee Inquiry" for i in customer_interactions) and random.random() < 0.5:
+        elif interaction_state["fee_inquiry"][customer_index] and rng.random() < 0.5:
             churn_reason = "Fee Concerns"
         else:
-            churn_reason = random.choice(CHURN_REASONS)
-            
+            churn_reason = rng.choice(CHURN_REASONS)
+
         # Exit survey score
         if churn_reason in ["Service Issue", "Fee Concerns", "Poor Performance", "Product Dissatisfaction"]:
-            exit_survey_score = random.uniform(1.0, 3.0)
+            exit_survey_score = rng.uniform(1.0, 3.0)
         else:
-            exit_survey_score = random.uniform(2.0, 4.0)
-            
+            exit_survey_score = rng.uniform(2.0, 4.0)
+
         # Recovery flag
         recovered_flag = "No"
-        if exit_survey_score > 3.0 and random.random() < 0.3:
+        if exit_survey_score > 3.0 and rng.random() < 0.3:
             recovered_flag = "Yes"
-            
+
         # Calculate lifetime value
         # Sum of all balances * fee percentage, plus fixed fees
-        # We'll approximate with their enrollment details
-        enrollment_duration_years = (churn_date - enrollment_date).days / 365
-        annual_fees = enrollment["initial_investment"] * (product["annual_fee_percentage"] / 100)
-        fixed_fees = product["management_fee_fixed"] * 12
-        total_annual_revenue = annual_fees + fixed_fees
-        lifetime_value = total_annual_revenue * enrollment_duration_years
-        
-        writer.writerow([
-            customer_id, product_id, churn_date.strftime("%Y-%m-%d"),
+        if lifetime is None:
+            # We'll approximate with their enrollment details
+            enrollment_duration_years = (churn_date - enrollment_date).days / 365
+            annual_fees = enrollment_state["initial_investment"][enrollment_index] * (product["annual_fee_percentage"] / 100)
+            fixed_fees = product["management_fee_fixed"] * 12
+            total_annual_revenue = annual_fees + fixed_fees
+            lifetime_value = total_annual_revenue * enrollment_duration_years
+        else:
+            # The fees the balance stage charged up to the churn date
+            lifetime_value = lifetime["fees"][enrollment_index]
+
+        yield [
+            customer_id, product_id, iso_date(calendar, churn_date.toordinal()),
             churn_reason, round(exit_survey_score, 1), recovered_flag,
             round(lifetime_value, 2)
-        ])
+        ]
+
+
+# Pass a stage's rows through while adding them to the shard's rollup
+# accumulator, a dict of group key -> running totals
+def rollup_rows(shard, table, rows):
+    totals_by_key = shard["rollups"].setdefault(ROLLUP_STAGES[table], {})
+
+    if table == "account_balances":
+        segments = shard["customers"]["segment"]
+        first_customer = shard["customer_start"] + 1
+        for row in rows:
+            customer_id, product_id, date, balance, contributions, withdrawals, returns, fees = row
+            key = (date[:7], product_id, segments[int(customer_id[3:]) - first_customer])
+            totals = totals_by_key.get(key)
+            if totals is None:
+                totals = totals_by_key[key] = [0, 0.0, 0.0, 0.0, 0.0, 0.0]
+            totals[0] += 1
+            totals[1] += balance
+            totals[2] += contributions
+            totals[3] += withdrawals
+            totals[4] += returns
+            totals[5] += fees
+            yield row
+
+    elif table == "service_interactions":
+        for row in rows:
+            key = (row[1][:7], row[2], row[3])
+            totals = totals_by_key.get(key)
+            if totals is None:
+                totals = totals_by_key[key] = [0, 0, 0.0]
+            totals[0] += 1
+            totals[1] += row[6] == "Resolved"
+            totals[2] += row[5]
+            yield row
+
+    else:
+        for row in rows:
+            key = (row[1][:7], row[3], row[2])
+            totals = totals_by_key.get(key)
+            if totals is None:
+                totals = totals_by_key[key] = [0, 0, 0, 0]
+            totals[0] += 1
+            totals[1] += row[4]
+            totals[2] += row[5]
+            totals[3] += row[6]
+            yield row
+
+# Helper function to add one shard's rollup accumulators to the run totals
+def merge_rollups(rollups, shard_rollups):
+    for name, shard_totals in shard_rollups.items():
+        totals_by_key = rollups.setdefault(name, {})
+        for key, totals in shard_totals.items():
+            if key in totals_by_key:
+                totals_by_key[key] = [a + b for a, b in zip(totals_by_key[key], totals)]
+            else:
+                totals_by_key[key] = totals
+
+# Helper function to turn a rollup accumulator into table rows, in key order
+def rollup_table_rows(name, totals_by_key):
+    for key in sorted(totals_by_key):
+        month, first, second = key
+        totals = totals_by_key[key]
+        if name == "rollup_balances":
+            second = CUSTOMER_SEGMENTS[second]
+            values = [totals[0]] + [round(total, 2) for total in totals[1:]]
+        elif name == "rollup_service":
+            values = [totals[0], totals[1], round(totals[2] / totals[0], 2)]
+        else:
+            values = totals
+        yield [f"{month}-01", first, second] + values
+
+# Helper function to write the rollup tables through the output sink; returns
+# each one's path and row count
+def finish_rollups(config, rollups):
+    written = {}
+    for name, totals_by_key in rollups.items():
+        part_path = table_part(config, name, 0)
+        write_table(config, part_path, rollup_table_rows(name, totals_by_key))
+        path = f"{config['output_dir']}/{name}{OUTPUT_FORMATS[config['output_format']]}"
+        row_count = write_output(
+            config["output_format"], path, ROLLUP_COLUMNS[name], [part_path], writer=writer_settings(config)
+        )
+        os.remove(part_path)
+        written[name] = {"path": path, "rows": row_count, "bytes": os.path.getsize(path)}
+    return written
+
+BALANCE_ENGINES = {
+    "vectorized": simulate_balances_vectorized,
+    "loop": simulate_balances_loop
+}
+
+# Helper function to merge a run configuration over DEFAULT_CONFIG, turning
+# the scale factor and row overrides into a row count for every sized table
+def resolve_config(config=None):
+    config = dict(config or {})
+    unknown = sorted(set(config) - set(DEFAULT_CONFIG))
+    if unknown:
+        raise ValueError(f"Unknown config keys: {', '.join(unknown)}")
+    config = {**DEFAULT_CONFIG, **config}
+
+    if config["scale"] <= 0:
+        raise ValueError(f"scale must be positive, got {config['scale']!r}")
+    unknown = sorted(set(config["rows"]) - set(TABLE_ROWS))
+    if unknown:
+        raise ValueError(f"Row counts can only be set for {', '.join(TABLE_ROWS)}; got {', '.join(unknown)}")
+    rows = {table: max(1, round(count * config["scale"])) for table, count in TABLE_ROWS.items()}
+    rows.update(config["rows"])
+    if any(count < 1 for count in rows.values()):
+        raise ValueError(f"Row counts must be at least 1, got {rows!r}")
+    config["rows"] = rows
+
+    for key in ("start_date", "end_date"):
+        if isinstance(config[key], str):
+            config[key] = datetime.date.fromisoformat(config[key])
+    if (config["end_date"] - config["start_date"]).days <= 30:
+        raise ValueError("end_date must be more than 30 days after start_date")
+
+    if config["tables"] is None:
+        config["tables"] = list(TABLE_COLUMNS)
+    unknown = sorted(set(config["tables"]) - set(TABLE_COLUMNS))
+    if unknown:
+        raise ValueError(f"Unknown tables: {', '.join(unknown)}")
+    # Tables are always written in schema order
+    config["tables"] = [table for table in TABLE_COLUMNS if table in config["tables"]]
+
+    if config["profile_stage"] is not None and config["profile_stage"] not in TABLE_COLUMNS:
+        raise ValueError(f"Unknown profile stage: {config['profile_stage']!r}")
+    if config["balance_engine"] not in BALANCE_ENGINES:
+        raise ValueError(f"Unknown balance engine: {config['balance_engine']!r}")
+    if config["market_engine"] not in MARKET_ENGINES:
+        raise ValueError(f"Unknown market engine: {config['market_engine']!r}")
+    if config["event_engine"] not in EVENT_ENGINES:
+        raise ValueError(f"Unknown event engine: {config['event_engine']!r}")
+    if config["enrollment_engine"] not in ENROLLMENT_ENGINES:
+        raise ValueError(f"Unknown enrollment engine: {config['enrollment_engine']!r}")
+    if config["flush_policy"] not in FLUSH_POLICIES:
+        raise ValueError(f"Unknown flush policy: {config['flush_policy']!r}")
+    if config["writer_queue_batches"] < 1:
+        raise ValueError(f"writer_queue_batches must be at least 1, got {config['writer_queue_batches']!r}")
+    config["output_format"] = resolve_output_format(config["output_format"])
+    return config
+
+# Helper function to run a table stage: its rows go to the table's part file
+# when the table was requested and are drained otherwise, so the stage still
+# builds the state later stages need and makes the same random draws.
+# Records the stage's rows, elapsed time, bytes written and, while tracemalloc
+# is tracing, peak traced memory in stage_stats.
+def run_stage(config, table, part_index, rows, stage_stats):
+    if config["progress"]:
+        rows = track_progress(f"{table} (part {part_index})", rows)
+    profiler = cProfile.Profile() if config["profile_stage"] == table else None
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+
+    stage_start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    bytes_written = 0
+    if table in config["tables"]:
+        row_count = write_table(config, table_part(config, table, part_index), rows)
+        bytes_written = os.path.getsize(table_part(config, table, part_index))
+    else:
+        row_count = 0
+        for _ in rows:
+            row_count += 1
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(profile_part(config, table, part_index))
+
+    stage_stats[table] = {
+        "rows": row_count,
+        "seconds": time.perf_counter() - stage_start,
+        "peak_memory": tracemalloc.get_traced_memory()[1] if tracing else None,
+        "bytes_written": bytes_written
+    }
+    return row_count
+
+# Helper function for the cProfile dump of one part of the profiled stage
+def profile_part(config, table, part_index):
+    return f"{config['output_dir']}/parts/{table}.{part_index:05d}.prof"
+
+# Helper function to add one shard's stage stats to the run totals: rows and
+# seconds add up across shards, peak memory is the largest shard peak
+def merge_stage_stats(stage_stats, shard_stats):
+    for table, stats in shard_stats.items():
+        if table not in stage_stats:
+            stage_stats[table] = dict(stats)
+            continue
+        total = stage_stats[table]
+        total["rows"] += stats["rows"]
+        total["seconds"] += stats["seconds"]
+        total["bytes_written"] += stats["bytes_written"]
+        if stats["peak_memory"] is not None:
+            total["peak_memory"] = max(total["peak_memory"] or 0, stats["peak_memory"])
+
+# Generate one shard: a contiguous block of customers and everything keyed off
+# them, written as headerless CSV part files. The shard's RNG streams depend only on
+# the seed and the shard index, never on which worker runs it. An append run
+# resumes the shard from its checkpoint instead and only runs the stages that
+# extend the dataset.
+def generate_shard(spec):
+    import numpy as np
+
+    config = spec["config"]
+    # Worker processes start their own tracing
+    start_tracing = config["trace_memory"] and not tracemalloc.is_tracing()
+    if start_tracing:
+        tracemalloc.start()
+    customer_start, customer_stop = spec["customer_start"], spec["customer_stop"]
+    num_customers = customer_stop - customer_start
+    total_customers = config["rows"]["customers"]
+    row_totals = spec["row_totals"]
+
+    shard = {
+        "config": config,
+        "start_date": config["start_date"],
+        "end_date": config["end_date"],
+        "period_start": spec["period_start"],
+        "balance_start": spec["balance_start"],
+        "customer_start": customer_start,
+        "customer_stop": customer_stop,
+        "num_interactions": shard_quota(row_totals["service_interactions"], total_customers, customer_start, customer_stop),
+        "num_engagement": shard_quota(row_totals["engagement"], total_customers, customer_start, customer_stop),
+        "vocabulary": spec["vocabulary"],
+        "advisors": spec["advisors"],
+        "products": spec["products"],
+        "monthly_market": spec["monthly_market"],
+        "calendar": calendar_for(config),
+        "customers": {
+            "birth_date": array("i"),
+            "enrollment_date": array("i"),
+            "segment": array("b"),
+            "digital_affinity": array("d"),
+            "contribution_rate": array("d")
+        },
+        "enrollments": {
+            "customer": array("i"),
+            "product": array("i"),
+            "enrollment_date": array("i"),
+            "initial_investment": array("d"),
+            "contribution_frequency": array("b"),
+            "monthly_contribution": array("d")
+        },
+        "interactions": {
+            "unresolved": bytearray(num_customers),
+            "fee_inquiry": bytearray(num_customers)
+        },
+        "opening_balances": None,
+        "closing_balances": array("d"),
+        "lifetime": None,
+        "rollups": {}
+    }
+
+    resume = spec.get("resume")
+    if resume is None:
+        seed = int(spec["seed"].generate_state(1, np.uint64)[0])
+        shard["rng"] = random.Random(seed)
+        shard["np_rng"] = np.random.default_rng(spec["seed"])
+    else:
+        shard["rng"] = random.Random()
+        shard["rng"].setstate(resume["rng_state"])
+        shard["np_rng"] = np.random.default_rng()
+        shard["np_rng"].bit_generator.state = resume["np_rng_state"]
+        for key in ("customers", "enrollments", "interactions"):
+            shard[key] = resume[key]
+        shard["opening_balances"] = resume["balances"]
+        shard["lifetime"] = resume.get("lifetime")
+    index = spec["index"]
+
+    stages = {
+        "customers": generate_customers,
+        "enrollments": ENROLLMENT_ENGINES[config["enrollment_engine"]],
+        "account_balances": BALANCE_ENGINES[config["balance_engine"]],
+        "service_interactions": EVENT_ENGINES[config["event_engine"]]["service_interactions"],
+        "engagement": EVENT_ENGINES[config["event_engine"]]["engagement"],
+        "retention": generate_retention
+    }
+
+    stage_stats = {}
+    for table in spec["stages"]:
+        # Exact lifetime values need the churn dates before the balances
+        if table == "account_balances" and config["exact_lifetime_value"] and shard["lifetime"] is None:
+            draw_churn(shard)
+        rows = stages[table](shard)
+        if config["rollups"] and table in ROLLUP_STAGES:
+            rows = rollup_rows(shard, table, rows)
+        run_stage(config, table, index, rows, stage_stats)
+
+    if start_tracing:
+        tracemalloc.stop()
+
+    # Everything an append run needs to pick the shard up again
+    checkpoint = None
+    if spec["checkpoint"]:
+        checkpoint = {
+            "index": index,
+            "customer_start": customer_start,
+            "customer_stop": customer_stop,
+            "rng_state": shard["rng"].getstate(),
+            "np_rng_state": shard["np_rng"].bit_generator.state,
+            "customers": shard["customers"],
+            "enrollments": shard["enrollments"],
+            "interactions": shard["interactions"],
+            "balances": shard["closing_balances"],
+            "lifetime": shard["lifetime"]
+        }
+    return {"stages": stage_stats, "checkpoint": checkpoint, "rollups": shard["rollups"]}
+
+# Helper function to run the shard specs, in parallel when several workers are
+# available, merging their stage stats and rollups into the run totals;
+# returns the shard checkpoints
+def run_shards(config, specs, stage_stats, rollups):
+    if config["workers"] > 1 and len(specs) > 1:
+        with ProcessPoolExecutor(max_workers=min(config["workers"], len(specs))) as pool:
+            results = list(pool.map(generate_shard, specs))
+    else:
+        results = [generate_shard(spec) for spec in specs]
+    for result in results:
+        merge_stage_stats(stage_stats, result["stages"])
+        merge_rollups(rollups, result["rollups"])
+    return [result["checkpoint"] for result in results]
+
+# Helper function to write the requested tables to their final outputs, appending
+# after existing_rows[table] rows when given; returns each table's path, rows,
+# size and finishing time
+def finish_tables(config, num_shards, existing_rows=None):
+    output_dir = config["output_dir"]
+    manifest = load_manifest(output_dir)
+    tables = {}
+    for table in config["tables"]:
+        num_parts = 1 if table in REFERENCE_TABLES else num_shards
+        finish_start = time.perf_counter()
+        table_existing_rows = None if existing_rows is None else existing_rows[table]
+        if config["partition_months"] and table in PARTITIONED_TABLES:
+            row_count = finish_partitions(config, table, num_parts, table_existing_rows, manifest)
+            partitions = manifest["tables"][table]
+            tables[table] = {
+                "path": f"{output_dir}/{table}",
+                "rows": row_count,
+                "bytes": sum(partition["bytes"] for partition in partitions.values()),
+                "seconds": time.perf_counter() - finish_start,
+                "partitions": len(partitions),
+                "changed_partitions": sum(partition["changed"] for partition in partitions.values())
+            }
+            continue
+        if table in manifest["tables"]:
+            remove_partitions(output_dir, table, manifest)
+        row_count = finish_table(config, table, num_parts, table_existing_rows)
+        path = f"{output_dir}/{table}{OUTPUT_FORMATS[config['output_format']]}"
+        tables[table] = {
+            "path": path,
+            "rows": row_count,
+            "bytes": os.path.getsize(path),
+            "seconds": time.perf_counter() - finish_start
+        }
+    if manifest["tables"]:
+        save_manifest(output_dir, manifest)
+    elif os.path.exists(f"{output_dir}/{MANIFEST}"):
+        os.remove(f"{output_dir}/{MANIFEST}")
+    return tables
+
+# Helper function for the first day of the month after date
+def first_of_next_month(date):
+    return datetime.date(date.year + (date.month // 12), (date.month % 12) + 1, 1)
+
+# Helper function to save the checkpoint an append run resumes from; it is
+# replaced in one step so an interrupted save leaves the previous one intact
+def save_checkpoint(output_dir, checkpoint):
+    path = f"{output_dir}/{CHECKPOINT}"
+    with open(f"{path}.tmp", "wb") as checkpoint_file:
+        pickle.dump(checkpoint, checkpoint_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(f"{path}.tmp", path)
+    return path
+
+def load_checkpoint(output_dir):
+    path = f"{output_dir}/{CHECKPOINT}"
+    if not os.path.exists(path):
+        raise ValueError(f"No checkpoint in '{output_dir}'; generate the full dataset there first")
+    with open(path, "rb") as checkpoint_file:
+        return pickle.load(checkpoint_file)
+
+# Generate the dataset described by config (see DEFAULT_CONFIG) and return the
+# run report also written to RUN_REPORT in the output directory: the output
+# format actually written, the rows, seconds, throughput, peak traced memory and
+# bytes written of every stage run, and the row count and size of every table.
+# A run that writes every table also saves the checkpoint append() resumes from.
+def generate(config=None):
+    config = resolve_config(config)
+    output_dir = config["output_dir"]
+    os.makedirs(f"{output_dir}/parts", exist_ok=True)
+    started = datetime.datetime.now()
+    run_start = time.perf_counter()
+    start_tracing = config["trace_memory"] and not tracemalloc.is_tracing()
+    if start_tracing:
+        tracemalloc.start()
+    save = config["checkpoint"] and config["tables"] == list(TABLE_COLUMNS)
+
+    # Shared reference tables come from the master seed
+    rng = random.Random(config["seed"])
+    vocabulary = load_vocabulary(config["identity_vocabulary"], config["seed"], config["identity_pool_size"])
+
+    stage_stats = {}
+    advisors = []
+    run_stage(config, "advisors", 0, generate_advisors(config, advisors, rng, vocabulary), stage_stats)
+
+    products = []
+    run_stage(config, "products", 0, generate_products(config, products, rng, vocabulary), stage_stats)
+
+    market_data = []
+    market_state = {}
+    generate_market = MARKET_ENGINES[config["market_engine"]]
+    run_stage(config, "market_data", 0, generate_market(config, market_data, rng, market_state, products), stage_stats)
+
+    # Average index levels and returns per month, looked up by the balance stage
+    monthly_market = build_monthly_market(market_data)
+
+    # Customer-keyed tables are generated shard by shard. Stages after the last
+    # requested table are skipped; earlier ones always run so the requested
+    # tables match a full run.
+    num_shards = 0
+    shard_checkpoints = []
+    rollups = {}
+    if any(table in SHARD_TABLES for table in config["tables"]):
+        import numpy as np
+
+        last_stage = max(SHARD_TABLES.index(table) for table in config["tables"] if table in SHARD_TABLES)
+        num_customers, shard_size = config["rows"]["customers"], config["shard_size"]
+        shard_starts = list(range(0, num_customers, shard_size))
+        shard_seeds = np.random.SeedSequence(config["seed"]).spawn(len(shard_starts))
+        specs = [{
+            "index": index,
+            "customer_start": start,
+            "customer_stop": min(start + shard_size, num_customers),
+            "seed": shard_seeds[index],
+            "config": config,
+            "stages": SHARD_TABLES[:last_stage + 1],
+            "row_totals": config["rows"],
+            "period_start": config["start_date"],
+            "balance_start": datetime.date(config["start_date"].year, config["start_date"].month, 1),
+            "checkpoint": save,
+            "vocabulary": vocabulary,
+            "advisors": advisors,
+            "products": products,
+            "monthly_market": monthly_market
+        } for index, start in enumerate(shard_starts)]
+        shard_checkpoints = run_shards(config, specs, stage_stats, rollups)
+        num_shards = len(specs)
+
+    if start_tracing:
+        tracemalloc.stop()
+
+    # Write every requested table to its final output
+    tables = finish_tables(config, num_shards)
+    rollup_tables = finish_rollups(config, rollups)
+
+    profile = None
+    if config["profile_stage"] is not None:
+        table = config["profile_stage"]
+        num_parts = 1 if table in REFERENCE_TABLES else num_shards
+        profile = merge_profiles(
+            [profile_part(config, table, i) for i in range(num_parts)], f"{output_dir}/{table}.prof"
+        )
+    os.rmdir(f"{output_dir}/parts")
+
+    checkpoint = None
+    if save:
+        days = (config["end_date"] - config["start_date"]).days
+        checkpoint = save_checkpoint(output_dir, {
+            "config": config,
+            "rng_state": rng.getstate(),
+            "market_state": market_state,
+            "monthly_market": monthly_market,
+            "advisors": advisors,
+            "products": products,
+            # Service interactions and engagement accrue at the full run's daily rate
+            "daily_rows": {table: config["rows"][table] / days for table in ("service_interactions", "engagement")},
+            # Rows per table so far, which the sequential IDs continue from
+            "row_counts": {table: stats["rows"] for table, stats in tables.items()},
+            "shards": shard_checkpoints,
+            # Rollup totals, which an append run adds its months to
+            "rollups": rollups
+        })
+
+    report = {
+        "started": started.isoformat(timespec="seconds"),
+        "seconds": round(time.perf_counter() - run_start, 3),
+        "config": config,
+        "output_dir": output_dir,
+        "output_format": config["output_format"],
+        "num_shards": num_shards,
+        "stages": {table: stage_report(stats) for table, stats in stage_stats.items()},
+        "tables": tables,
+        "rollups": rollup_tables,
+        "row_counts": {table: stats["rows"] for table, stats in tables.items()},
+        "profile": profile,
+        "checkpoint": checkpoint
+    }
+    report["report"] = write_run_report(f"{output_dir}/{RUN_REPORT}", report)
+    return report
+
+# Extend a generated dataset by `months` whole calendar months, resuming from the
+# checkpoint in output_dir. Only the new months are simulated: their rows are
+# appended to the market data, account balance, service interaction and
+# engagement tables, existing rows are left untouched and sequential IDs carry
+# on. Months already in the dataset keep the market levels their balances were
+# simulated with. Returns the run report, as generate() does.
+def append(output_dir, months=1, workers=None, progress=False):
+    if months < 1:
+        raise ValueError(f"months must be at least 1, got {months!r}")
+    checkpoint = load_checkpoint(output_dir)
+    # Options added since the checkpoint was saved take their defaults
+    config = dict(DEFAULT_CONFIG, **checkpoint["config"])
+    config.update(output_dir=output_dir, tables=APPEND_TABLES, progress=progress, trace_memory=False, profile_stage=None)
+    if workers is not None:
+        config["workers"] = workers
+    if config["output_format"] not in APPENDABLE_FORMATS:
+        raise ValueError(f"Rows can only be appended to {', '.join(APPENDABLE_FORMATS)} outputs, not {config['output_format']}")
+
+    # The new period runs from the day after the previous end date to the last
+    # day of the final new month; balances restart on the first new month
+    previous_end = config["end_date"]
+    balance_start = first_of_next_month(previous_end)
+    last_month = balance_start
+    for _ in range(months - 1):
+        last_month = first_of_next_month(last_month)
+    config["end_date"] = first_of_next_month(last_month) - datetime.timedelta(days=1)
+    period_start = previous_end + datetime.timedelta(days=1)
+
+    os.makedirs(f"{output_dir}/parts", exist_ok=True)
+    started = datetime.datetime.now()
+    run_start = time.perf_counter()
+
+    rng = random.Random()
+    rng.setstate(checkpoint["rng_state"])
+    stage_stats = {}
+    market_data = []
+    market_state = checkpoint["market_state"]
+    generate_market = MARKET_ENGINES[config["market_engine"]]
+    run_stage(
+        config, "market_data", 0,
+        generate_market(config, market_data, rng, market_state, checkpoint["products"]), stage_stats
+    )
+    monthly_market = build_monthly_market(market_data, checkpoint["monthly_market"])
+
+    new_days = (config["end_date"] - previous_end).days
+    row_totals = {table: round(rate * new_days) for table, rate in checkpoint["daily_rows"].items()}
+    specs = [{
+        "index": shard["index"],
+        "customer_start": shard["customer_start"],
+        "customer_stop": shard["customer_stop"],
+        "resume": shard,
+        "config": config,
+        "stages": APPEND_TABLES[1:],
+        "row_totals": row_totals,
+        "period_start": period_start,
+        "balance_start": balance_start,
+        "checkpoint": True,
+        "vocabulary": None,
+        "advisors": checkpoint["advisors"],
+        "products": checkpoint["products"],
+        "monthly_market": monthly_market
+    } for shard in checkpoint["shards"]]
+    # Rollups are small, so they are rewritten whole with the new months added
+    rollups = checkpoint.get("rollups", {})
+    shard_checkpoints = run_shards(config, specs, stage_stats, rollups)
+
+    tables = finish_tables(config, len(specs), checkpoint["row_counts"])
+    rollup_tables = finish_rollups(config, rollups)
+    os.rmdir(f"{output_dir}/parts")
+
+    for table, stats in tables.items():
+        checkpoint["row_counts"][table] += stats["rows"]
+    checkpoint.update({
+        "config": dict(config, tables=checkpoint["config"]["tables"]),
+        "rng_state": rng.getstate(),
+        "market_state": market_state,
+        "monthly_market": monthly_market,
+        "shards": shard_checkpoints,
+        "rollups": rollups
+    })
+    checkpoint_path = save_checkpoint(output_dir, checkpoint)
+
+    report = {
+        "started": started.isoformat(timespec="seconds"),
+        "seconds": round(time.perf_counter() - run_start, 3),
+        "config": config,
+        "output_dir": output_dir,
+        "output_format": config["output_format"],
+        "num_shards": len(specs),
+        "appended": {"start_date": period_start, "end_date": config["end_date"], "months": months},
+        "stages": {table: stage_report(stats) for table, stats in stage_stats.items()},
+        "tables": tables,
+        "rollups": rollup_tables,
+        "row_counts": {table: stats["rows"] for table, stats in tables.items()},
+        "total_row_counts": checkpoint["row_counts"],
+        "profile": None,
+        "checkpoint": checkpoint_path
+    }
+    report["report"] = write_run_report(f"{output_dir}/{RUN_REPORT}", report)
+    return report
+
+# Helper function to parse a --rows TABLE=COUNT argument
+def parse_row_count(value):
+    import argparse
+
+    table, _, count = value.partition("=")
+    if table not in TABLE_ROWS or not count.isdigit():
+        raise argparse.ArgumentTypeError(
+            f"expected TABLE=COUNT with TABLE one of {', '.join(TABLE_ROWS)}, got {value!r}"
+        )
+    return table, int(count)
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Generate the synthetic financial dataset behind the Power BI dashboard."
+    )
+    parser.add_argument("--output-dir", default=DEFAULT_CONFIG["output_dir"],
+                        help="directory the tables are written to (default: %(default)s)")
+    parser.add_argument("--scale", type=float, default=DEFAULT_CONFIG["scale"],
+                        help="scale factor applied to every table's row count (default: %(default)s)")
+    parser.add_argument("--rows", type=parse_row_count, nargs="+", default=[], metavar="TABLE=COUNT",
+                        help=f"row count for a table, overriding --scale; TABLE is one of {', '.join(TABLE_ROWS)}")
+    parser.add_argument("--start-date", type=datetime.date.fromisoformat, default=START_DATE,
+                        help="first simulated day, YYYY-MM-DD (default: %(default)s)")
+    parser.add_argument("--end-date", type=datetime.date.fromisoformat, default=END_DATE,
+                        help="last simulated day, YYYY-MM-DD (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=SEED, help="random seed (default: %(default)s)")
+    parser.add_argument("--tables", nargs="+", choices=list(TABLE_COLUMNS), metavar="TABLE",
+                        help=f"only write these tables: {', '.join(TABLE_COLUMNS)}")
+    parser.add_argument("--format", dest="output_format", choices=list(OUTPUT_FORMATS), default=OUTPUT_FORMAT,
+                        help="output format (default: %(default)s)")
+    parser.add_argument("--balance-engine", choices=list(BALANCE_ENGINES), default=BALANCE_ENGINE,
+                        help="account balance simulation engine (default: %(default)s)")
+    parser.add_argument("--market-engine", choices=list(MARKET_ENGINES), default=MARKET_ENGINE,
+                        help="market data simulation engine (default: %(default)s)")
+    parser.add_argument("--enrollment-engine", choices=list(ENROLLMENT_ENGINES), default=ENROLLMENT_ENGINE,
+                        help="enrollment and advisor assignment engine (default: %(default)s)")
+    parser.add_argument("--event-engine", choices=list(EVENT_ENGINES), default=EVENT_ENGINE,
+                        help="service interaction and engagement engine (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="processes generating shards in parallel (default: %(default)s)")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE,
+                        help="customers per shard (default: %(default)s)")
+    parser.add_argument("--progress", action="store_true", help="show live per-stage progress on stderr")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="record each stage's peak traced memory in the run report (slower)")
+    parser.add_argument("--profile-stage", choices=list(TABLE_COLUMNS), metavar="TABLE",
+                        help="run this table's stage under cProfile and write <output-dir>/TABLE.prof")
+    parser.add_argument("--rollups", action="store_true",
+                        help="also write the monthly rollup tables (rollup_balances, rollup_service, rollup_engagement)")
+    parser.add_argument("--background-writer", action="store_true",
+                        help="write files on a background I/O thread, overlapping generation and compression with disk writes")
+    parser.add_argument("--writer-queue-batches", type=int, default=WRITER_SETTINGS["queue_batches"], metavar="N",
+                        help="row batches the background writer queues before generation waits (default: %(default)s)")
+    parser.add_argument("--flush-policy", choices=FLUSH_POLICIES, default=WRITER_SETTINGS["flush"],
+                        help="flush files after every batch ('batch') or also fsync them ('fsync') (default: %(default)s)")
+    parser.add_argument("--partition-months", action="store_true",
+                        help=f"write {', '.join(PARTITIONED_TABLES)} as one file per month (TABLE/YYYY-MM) "
+                             f"listed in {MANIFEST}")
+    parser.add_argument("--exact-lifetime-value", action="store_true",
+                        help="stop churned enrollments' balances on their churn date and take retention "
+                             "lifetime values from the fees they paid, instead of estimating them")
+    parser.add_argument("--append-months", type=int, metavar="N",
+                        help="extend the dataset in --output-dir by N months from its checkpoint "
+                             "instead of generating it; only --workers and --progress apply")
+    args = parser.parse_args(argv)
+
+    if args.append_months is not None:
+        try:
+            result = append(args.output_dir, args.append_months, args.workers, args.progress)
+        except ValueError as error:
+            parser.error(str(error))
+        appended = result["appended"]
+        print(f"Appended {appended['start_date']} to {appended['end_date']} to the '{result['output_dir']}' dataset in {result['seconds']:.2f} seconds.")
+        for table, row_count in result["row_counts"].items():
+            print(f"Appended {row_count} {table} rows ({result['total_row_counts'][table]} in total).")
+        for name, rollup in result["rollups"].items():
+            print(f"Rewrote {rollup['rows']} {name} rows.")
+        print(f"Run report written to {result['report']}.")
+        return
+
+    config = {
+        "output_dir": args.output_dir,
+        "seed": args.seed,
+        "scale": args.scale,
+        "rows": dict(args.rows),
+        "start_date": args.start_date,
+        "end_date": args.end_date,
+        "tables": args.tables,
+        "output_format": args.output_format,
+        "balance_engine": args.balance_engine,
+        "market_engine": args.market_engine,
+        "event_engine": args.event_engine,
+        "enrollment_engine": args.enrollment_engine,
+        "shard_size": args.shard_size,
+        "workers": args.workers,
+        "progress": args.progress,
+        "trace_memory": args.trace_memory,
+        "profile_stage": args.profile_stage,
+        "rollups": args.rollups,
+        "background_writer": args.background_writer,
+        "writer_queue_batches": args.writer_queue_batches,
+        "flush_policy": args.flush_policy,
+        "partition_months": args.partition_months,
+        "exact_lifetime_value": args.exact_lifetime_value
+    }
+    try:
+        resolve_config(config)
+    except ValueError as error:
+        parser.error(str(error))
+    result = generate(config)
+
+    if result["output_format"] != args.output_format:
+        print(f"pyarrow is not installed; wrote {result['output_format']} instead of {args.output_format}.")
+    print(f"Synthetic financial dataset generated in the '{result['output_dir']}' directory in {result['seconds']:.2f} seconds.")
+    for table, row_count in result["row_counts"].items():
+        stage = result["stages"][table]
+        print(f"Generated {row_count} {table} rows in {stage['seconds']:.2f} seconds ({stage['rows_per_second'] or 0:,.0f} rows/s).")
+    for table, stats in result["tables"].items():
+        if "partitions" in stats:
+            print(f"Wrote {stats['changed_partitions']} of {stats['partitions']} {table} partitions (the rest were unchanged).")
+    if "account_balances" in result["row_counts"]:
+        print(f"Account balances simulated with the {args.balance_engine} engine.")
+    for name, rollup in result["rollups"].items():
+        print(f"Wrote {rollup['rows']} {name} rows.")
+    if result["profile"] is not None:
+        print(f"Profile of the {args.profile_stage} stage written to {result['profile']}.")
+    print(f"Run report written to {result['report']}.")
 
-print(f"Synthetic financial dataset generated in the '{output_dir}' directory.")
-print(f"Generated {len(customers)} customers, {len(products)} products, and {len(enrollments)} enrollments.")
-print(f"Generated {balance_id} account balance records, {len(interactions)} service interactions.")
-print(f"Generated {len(engagements)} engagement records and {len(market_data)} market data points.")
+if __name__ == "__main__":
+    main()
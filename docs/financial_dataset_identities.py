@@ -0,0 +1,97 @@
+import json
+import os
+
+# Faker's en_US phone number formats: "#" is any digit, "$" a digit from 2 to 9
+PHONE_FORMATS = [
+    "$##$######", "$##-$##-####", "($##)$##-####", "$##.$##.####",
+    "$##-$##-####x###", "$##-$##-####x####", "$##-$##-####x#####",
+    "($##)$##-####x###", "($##)$##-####x####", "($##)$##-####x#####",
+    "$##.$##.####x###", "$##.$##.####x####", "$##.$##.####x#####",
+    "+1-$##-$##-####", "001-$##-$##-####",
+    "+1-$##-$##-####x###", "+1-$##-$##-####x####", "+1-$##-$##-####x#####",
+    "001-$##-$##-####x###", "001-$##-$##-####x####", "001-$##-$##-####x#####"
+]
+
+# Build the identity pools (names, cities, email domains, company suffixes) by
+# drawing distinct values from a seeded Faker; Faker is only imported here
+def build_vocabulary(seed, pool_size):
+    from faker import Faker
+
+    fake = Faker("en_US")
+    fake.seed_instance(seed)
+    vocabulary = {"seed": seed, "pool_size": pool_size}
+    for name, draw in (
+        ("first_names", fake.first_name),
+        ("last_names", fake.last_name),
+        ("cities", fake.city),
+        ("email_domains", fake.free_email_domain),
+        ("company_suffixes", fake.company_suffix)
+    ):
+        # dict keeps first-seen order, so the pools do not depend on string hashing
+        values = {}
+        for _ in range(pool_size * 20):
+            values[draw()] = None
+            if len(values) == pool_size:
+                break
+        vocabulary[name] = list(values)
+    return vocabulary
+
+# Load the identity pools from the cached vocabulary file, (re)building it with
+# Faker when it is missing or was built for another seed or pool size. With no
+# path the pools are built from Faker on every run.
+def load_vocabulary(path, seed, pool_size):
+    if path is None:
+        return build_vocabulary(seed, pool_size)
+
+    if os.path.exists(path):
+        with open(path) as vocabulary_file:
+            vocabulary = json.load(vocabulary_file)
+        if vocabulary.get("seed") == seed and vocabulary.get("pool_size") == pool_size:
+            return vocabulary
+
+    vocabulary = build_vocabulary(seed, pool_size)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # Written under a temporary name and renamed, so concurrent runs never read a partial file
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as vocabulary_file:
+        json.dump(vocabulary, vocabulary_file)
+    os.replace(temp_path, path)
+    return vocabulary
+
+# Synthesize phone numbers from the format templates, one template per row
+def synthesize_phones(np_rng, count):
+    import numpy as np
+
+    templates = np_rng.integers(0, len(PHONE_FORMATS), size=count)
+    phones = np.empty(count, dtype=object)
+    for template_index, template in enumerate(PHONE_FORMATS):
+        rows = np.nonzero(templates == template_index)[0]
+        if len(rows) == 0:
+            continue
+        chars = np.tile(np.array(list(template)), (len(rows), 1))
+        for symbol, low in (("#", 0), ("$", 2)):
+            positions = [i for i, ch in enumerate(template) if ch == symbol]
+            chars[:, positions] = np_rng.integers(low, 10, size=(len(rows), len(positions))).astype(str)
+        # View each row of single characters as one fixed-width string
+        phones[rows] = chars.view(f"<U{len(template)}").ravel()
+    return phones.tolist()
+
+# Assign identities to a block of customers by sampling pool indexes with NumPy
+def sample_identities(np_rng, vocabulary, count):
+    import numpy as np
+
+    first_names = np.array(vocabulary["first_names"], dtype=object)
+    last_names = np.array(vocabulary["last_names"], dtype=object)
+    cities = np.array(vocabulary["cities"], dtype=object)
+    email_domains = np.array(vocabulary["email_domains"], dtype=object)
+
+    first = first_names[np_rng.integers(0, len(first_names), size=count)].tolist()
+    last = last_names[np_rng.integers(0, len(last_names), size=count)].tolist()
+    domains = email_domains[np_rng.integers(0, len(email_domains), size=count)].tolist()
+    return {
+        "first_name": first,
+        "last_name": last,
+        "email": [f"{f.lower()}.{l.lower()}@{d}" for f, l, d in zip(first, last, domains)],
+        "phone": synthesize_phones(np_rng, count),
+        "address_city": cities[np_rng.integers(0, len(cities), size=count)].tolist()
+    }
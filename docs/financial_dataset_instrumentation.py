@@ -0,0 +1,56 @@
+import json
+import os
+import pstats
+import sys
+import time
+
+# Seconds between live progress updates
+PROGRESS_INTERVAL = 0.5
+
+# Pass a stage's rows through while showing a live row count and rate on
+# stderr: updated in place on a terminal, a single summary line otherwise
+def track_progress(label, rows):
+    interactive = sys.stderr.isatty()
+    stage_start = last_update = time.perf_counter()
+    row_count = 0
+    for row in rows:
+        yield row
+        row_count += 1
+        if interactive and row_count % 1000 == 0:
+            now = time.perf_counter()
+            if now - last_update >= PROGRESS_INTERVAL:
+                last_update = now
+                rate = row_count / (now - stage_start)
+                sys.stderr.write(f"\r{label}: {row_count:,} rows, {rate:,.0f} rows/s")
+                sys.stderr.flush()
+
+    elapsed = time.perf_counter() - stage_start
+    line_start = "\r" if interactive else ""
+    sys.stderr.write(f"{line_start}{label}: {row_count:,} rows in {elapsed:.2f} s\n")
+    sys.stderr.flush()
+
+# Combine the cProfile dumps of a stage's parts into one stats file
+def merge_profiles(part_paths, path):
+    part_paths = [part_path for part_path in part_paths if os.path.exists(part_path)]
+    if not part_paths:
+        return None
+    stats = pstats.Stats(*part_paths)
+    stats.dump_stats(path)
+    for part_path in part_paths:
+        os.remove(part_path)
+    return path
+
+# Add the derived throughput to a stage's stats for the run report
+def stage_report(stats):
+    seconds = stats["seconds"]
+    return {
+        **stats,
+        "seconds": round(seconds, 6),
+        "rows_per_second": round(stats["rows"] / seconds, 1) if seconds > 0 else None
+    }
+
+# Write the run report as JSON; dates and other non-JSON values are written as strings
+def write_run_report(path, report):
+    with open(path, "w") as report_file:
+        json.dump(report, report_file, indent=2, default=str)
+    return path
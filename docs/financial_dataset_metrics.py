@@ -0,0 +1,536 @@
+import argparse
+import csv
+import gzip
+import json
+import lzma
+import os
+import numpy as np
+from financial_dataset_generator import CHANNELS, CUSTOMER_SEGMENTS, MANIFEST, TABLE_COLUMNS
+from financial_dataset_sinks import HAVE_PYARROW, OUTPUT_FORMATS
+
+# Python versions of the measures in docs/DAX Calculations, evaluated over the
+# generated tables with vectorized group-bys instead of inside Power BI.
+#
+# Every measure can be sliced by any combination of these dimensions:
+#   month    calendar month of the fact's own date (balance date, enrollment
+#            date, interaction/engagement date, churn date)
+#   product  product_id
+#   segment  customer_segment of the fact's customer
+#   channel  enrollment channel, or the interaction channel for service measures
+DIMENSIONS = ["month", "product", "segment", "channel"]
+
+# Measures and the fact table each one is computed from
+MEASURES = {
+    "Total AUM": "account_balances",
+    "Current Month AUM": "account_balances",
+    "Net Flows": "account_balances",
+    "Net Revenue": "account_balances",
+    "Investment Returns": "account_balances",
+    "Avg Balance Per Customer": "account_balances",
+    "Customer Retention Rate": "enrollments",
+    "Products Per Customer": "enrollments",
+    "First Call Resolution Rate": "service_interactions",
+    "Avg Satisfaction Score": "service_interactions",
+    "Digital Engagement Rate": "engagement",
+    "Avg Session Duration": "engagement",
+    "New Customers MTD": "customers",
+    "Churned Customers MTD": "retention",
+    "Net Customers MTD": "customers"
+}
+
+# Columns read from each table
+METRIC_COLUMNS = {
+    "customers": ["customer_id", "enrollment_date", "customer_segment"],
+    "enrollments": ["customer_id", "product_id", "enrollment_date", "channel", "status"],
+    "account_balances": [
+        "customer_id", "product_id", "date", "balance",
+        "contributions_mtd", "withdrawals_mtd", "investment_returns_mtd", "fees_mtd"
+    ],
+    "service_interactions": ["customer_id", "date", "channel", "satisfaction_score", "resolution_status"],
+    "engagement": ["customer_id", "date", "session_duration"],
+    "retention": ["customer_id", "product_id", "churn_date", "recovered_flag"]
+}
+
+# Rows per batch when streaming without pyarrow or from parquet, and bytes per
+# pyarrow CSV block
+BATCH_ROWS = 100000
+BLOCK_BYTES = 16 << 20
+
+# Largest group x ID bitmap (in cells, one byte each) used for distinct counts
+DISTINCT_BITMAP_LIMIT = 200_000_000
+
+# Helper function to find a table's output file, whichever format it was written in
+def table_path(output_dir, table):
+    for extension in OUTPUT_FORMATS.values():
+        path = os.path.join(output_dir, f"{table}{extension}")
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f"No output file for the {table} table in '{output_dir}'")
+
+# Helper function to find a table's output files: its month partitions, in
+# month order, when it was written with --partition-months (only the months
+# from first to last, "YYYY-MM", when given), or its single output file
+def table_paths(output_dir, table, months=None):
+    manifest_path = os.path.join(output_dir, MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as manifest_file:
+            partitions = json.load(manifest_file)["tables"].get(table)
+        if partitions is not None:
+            first, last = months if months is not None else (min(partitions, default=""), max(partitions, default=""))
+            return [
+                os.path.join(output_dir, partition["path"])
+                for month, partition in sorted(partitions.items()) if first <= month <= last
+            ]
+    return [table_path(output_dir, table)]
+
+# Helper function to convert a column to its typed NumPy array: text columns
+# become fixed-width strings, dates datetime64[D]
+def typed_array(values, kind):
+    if kind in ("str", "category"):
+        return np.asarray(values, dtype=str)
+    if kind == "date":
+        return np.asarray(values, dtype="datetime64[D]")
+    return np.asarray(values, dtype=np.int64 if kind == "int" else np.float64)
+
+# Load the given columns of a generated table as NumPy arrays, from any output
+# format: Arrow-based formats and CSVs read through pyarrow when it is
+# installed, .npz archives directly, and CSVs with the csv module otherwise.
+# A month-partitioned table is loaded from its partitions, only those from
+# months[0] to months[1] ("YYYY-MM") when months is given.
+def load_table(output_dir, table, columns, months=None):
+    paths = table_paths(output_dir, table, months)
+    if len(paths) == 1:
+        return load_file(paths[0], table, columns)
+    kinds = dict(TABLE_COLUMNS[table])
+    parts = [load_file(path, table, columns) for path in paths]
+    return {
+        name: np.concatenate([part[name] for part in parts]) if parts else typed_array([], kinds[name])
+        for name in columns
+    }
+
+# Helper function to load the given columns of one output file of a table
+def load_file(path, table, columns):
+    kinds = dict(TABLE_COLUMNS[table])
+
+    if path.endswith(".npz"):
+        with np.load(path) as archive:
+            loaded = {}
+            for name in columns:
+                if kinds[name] == "category":
+                    loaded[name] = archive[f"{name}.categories"][archive[name]]
+                else:
+                    loaded[name] = archive[name]
+            return loaded
+
+    opener = {".gz": gzip.open, ".xz": lzma.open}.get(os.path.splitext(path)[1], open)
+    try:
+        import pyarrow
+    except ImportError:
+        pyarrow = None
+
+    if pyarrow is not None:
+        if path.endswith(".parquet"):
+            import pyarrow.parquet as pa_parquet
+            arrow_table = pa_parquet.read_table(path, columns=columns)
+        elif path.endswith(".feather"):
+            import pyarrow.feather as pa_feather
+            arrow_table = pa_feather.read_table(path, columns=columns)
+        else:
+            import pyarrow.csv as pa_csv
+            # Compressed CSVs are decompressed by Python: pyarrow builds may lack the xz codec
+            with opener(path, "rb") as table_file:
+                arrow_table = pa_csv.read_csv(table_file, convert_options=pa_csv.ConvertOptions(
+                    include_columns=columns,
+                    column_types={name: pyarrow.date32() for name in columns if kinds[name] == "date"}
+                ))
+        return {
+            name: typed_array(arrow_table.column(name).to_numpy(zero_copy_only=False), kinds[name])
+            for name in columns
+        }
+
+    with opener(path, "rt", newline="") as table_file:
+        reader = csv.reader(table_file)
+        header = next(reader)
+        indexes = [header.index(name) for name in columns]
+        values = [[] for _ in columns]
+        for row in reader:
+            for column_values, index in zip(values, indexes):
+                column_values.append(row[index])
+    return {name: typed_array(column_values, kinds[name]) for name, column_values in zip(columns, values)}
+
+# Stream the given columns of a table's output files (see table_paths()) as
+# typed NumPy batches, with the row number of each batch's first row (1 is the
+# first row after the header; a partitioned table's rows are counted across its
+# partitions in month order)
+def read_batches(paths, table, columns):
+    first_row = 1
+    for path in paths:
+        for batch in read_file_batches(path, table, columns):
+            yield first_row, batch
+            first_row += len(batch[columns[0]])
+
+# Helper function to stream one output file's columns as typed NumPy batches:
+# CSVs a block at a time, parquet files BATCH_ROWS rows at a time, and feather
+# and .npz files, which cannot be streamed, in one batch
+def read_file_batches(path, table, columns):
+    kinds = dict(TABLE_COLUMNS[table])
+    if path.endswith((".npz", ".feather")):
+        yield load_file(path, table, columns)
+        return
+
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pa_parquet
+        for batch in pa_parquet.ParquetFile(path).iter_batches(batch_size=BATCH_ROWS, columns=columns):
+            yield {
+                name: typed_array(batch.column(name).to_numpy(zero_copy_only=False), kinds[name])
+                for name in columns
+            }
+        return
+
+    opener = {".gz": gzip.open, ".xz": lzma.open}.get(os.path.splitext(path)[1], open)
+
+    if HAVE_PYARROW:
+        import pyarrow
+        import pyarrow.csv as pa_csv
+
+        arrow_types = {"str": pyarrow.string(), "category": pyarrow.string(), "date": pyarrow.date32(),
+                       "int": pyarrow.int64(), "float": pyarrow.float64()}
+        with opener(path, "rb") as table_file:
+            reader = pa_csv.open_csv(
+                table_file,
+                read_options=pa_csv.ReadOptions(block_size=BLOCK_BYTES),
+                convert_options=pa_csv.ConvertOptions(
+                    include_columns=columns, column_types={name: arrow_types[kinds[name]] for name in columns}
+                )
+            )
+            for batch in reader:
+                yield {
+                    name: typed_array(batch.column(name).to_numpy(zero_copy_only=False), kinds[name])
+                    for name in columns
+                }
+        return
+
+    with opener(path, "rt", newline="") as table_file:
+        reader = csv.reader(table_file)
+        header = next(reader)
+        indexes = [header.index(name) for name in columns]
+        while True:
+            values = [[] for _ in columns]
+            for row in reader:
+                for column_values, index in zip(values, indexes):
+                    column_values.append(row[index])
+                if len(values[0]) == BATCH_ROWS:
+                    break
+            if not values[0]:
+                return
+            yield {name: typed_array(v, kinds[name]) for name, v in zip(columns, values)}
+
+def load_tables(output_dir):
+    return {table: load_table(output_dir, table, columns) for table, columns in METRIC_COLUMNS.items()}
+
+# Helper function to turn IDs such as CUS000123 into their number, reading the
+# digits straight from the string array's character codes. IDs outgrow their
+# zero padding (CUS999999, CUS1000000), so shorter IDs in the same array end in
+# NUL padding, which leaves their number as it is.
+def parse_ids(ids):
+    ids = np.asarray(ids, dtype=str)
+    width = ids.dtype.itemsize // 4
+    codes = ids.view(np.uint32).reshape(len(ids), width)
+    numbers = np.zeros(len(ids), dtype=np.int64)
+    for column in range(3, width):
+        digits = codes[:, column]
+        numbers = np.where(digits != 0, numbers * 10 + (digits.astype(np.int64) - ord("0")), numbers)
+    return numbers
+
+# Helper function to encode text values as their position in a fixed vocabulary
+def encode(values, vocabulary):
+    uniques, inverse = np.unique(values, return_inverse=True)
+    unknown = sorted(set(uniques.tolist()) - set(vocabulary))
+    if unknown:
+        raise ValueError(f"Values outside {vocabulary!r}: {unknown!r}")
+    return np.array([vocabulary.index(value) for value in uniques.tolist()], dtype=np.int64)[inverse]
+
+# Helper function to map dates to month numbers counted from the first month
+def month_codes(dates, first_month):
+    return dates.astype("datetime64[M]").astype(np.int64) - first_month
+
+# Build the coded facts the measures are computed from: per fact table, the
+# customer code and the code of every dimension the table can be sliced by
+def prepare_facts(tables):
+    customers = tables["customers"]
+    enrollments = tables["enrollments"]
+    balances = tables["account_balances"]
+    interactions = tables["service_interactions"]
+    engagement = tables["engagement"]
+    retention = tables["retention"]
+
+    customer_ids = parse_ids(customers["customer_id"])
+    num_customers = int(customer_ids.max()) + 1
+    customer_segment = np.zeros(num_customers, dtype=np.int64)
+    customer_segment[customer_ids] = encode(customers["customer_segment"], CUSTOMER_SEGMENTS)
+
+    product_ids = [parse_ids(t["product_id"]) for t in (enrollments, balances, retention) if len(t["product_id"])]
+    num_products = max(int(ids.max()) for ids in product_ids) + 1
+
+    all_dates = [
+        customers["enrollment_date"], enrollments["enrollment_date"], balances["date"],
+        interactions["date"], engagement["date"], retention["churn_date"]
+    ]
+    first_month = min(int(d.astype("datetime64[M]").min().astype(np.int64)) for d in all_dates if len(d))
+    last_month = max(int(d.astype("datetime64[M]").max().astype(np.int64)) for d in all_dates if len(d))
+
+    # Enrollment channel per (customer, product), looked up by the facts that
+    # only carry the pair
+    enrollment_customers = parse_ids(enrollments["customer_id"])
+    enrollment_products = parse_ids(enrollments["product_id"])
+    enrollment_keys = enrollment_customers * num_products + enrollment_products
+    key_order = np.argsort(enrollment_keys, kind="stable")
+    sorted_keys = enrollment_keys[key_order]
+    enrollment_channels = encode(enrollments["channel"], CHANNELS)[key_order]
+
+    def enrollment_channel(customer, product):
+        positions = np.searchsorted(sorted_keys, customer * num_products + product)
+        return enrollment_channels[np.minimum(positions, len(sorted_keys) - 1)]
+
+    def fact(customer, month=None, product=None, channel=None, **values):
+        codes = {"segment": customer_segment[customer]}
+        if month is not None:
+            codes["month"] = month_codes(month, first_month)
+        if product is not None:
+            codes["product"] = product
+        if channel is not None:
+            codes["channel"] = channel
+        return {"customer": customer, "codes": codes, **values}
+
+    balance_customers = parse_ids(balances["customer_id"])
+    balance_products = parse_ids(balances["product_id"])
+    retention_customers = parse_ids(retention["customer_id"])
+    retention_products = parse_ids(retention["product_id"])
+    return {
+        "sizes": {
+            "month": last_month - first_month + 1,
+            "product": num_products,
+            "segment": len(CUSTOMER_SEGMENTS),
+            "channel": len(CHANNELS)
+        },
+        "first_month": first_month,
+        "num_customers": num_customers,
+        "customers": fact(customer_ids, month=customers["enrollment_date"]),
+        "enrollments": fact(
+            enrollment_customers, month=enrollments["enrollment_date"], product=enrollment_products,
+            channel=encode(enrollments["channel"], CHANNELS),
+            open=enrollments["status"] != "Closed"
+        ),
+        "account_balances": fact(
+            balance_customers, month=balances["date"], product=balance_products,
+            channel=enrollment_channel(balance_customers, balance_products),
+            date=balances["date"].astype(np.int64),
+            balance=balances["balance"],
+            net_flows=balances["contributions_mtd"] - balances["withdrawals_mtd"],
+            returns=balances["investment_returns_mtd"],
+            fees=balances["fees_mtd"]
+        ),
+        "service_interactions": fact(
+            parse_ids(interactions["customer_id"]), month=interactions["date"],
+            channel=encode(interactions["channel"], CHANNELS),
+            satisfaction=interactions["satisfaction_score"],
+            phone=interactions["channel"] == "Phone",
+            resolved=interactions["resolution_status"] == "Resolved"
+        ),
+        "engagement": fact(
+            parse_ids(engagement["customer_id"]), month=engagement["date"],
+            session_duration=engagement["session_duration"]
+        ),
+        "retention": fact(
+            retention_customers, month=retention["churn_date"], product=retention_products,
+            channel=enrollment_channel(retention_customers, retention_products),
+            not_recovered=retention["recovered_flag"] == "No"
+        )
+    }
+
+# Helper function for the flat group index of every row of a fact, or None
+# when the fact cannot be sliced by one of the dimensions
+def group_index(facts, fact, by):
+    if any(dim not in fact["codes"] for dim in by):
+        return None, 0
+    sizes = [facts["sizes"][dim] for dim in by]
+    if not by:
+        return np.zeros(len(fact["customer"]), dtype=np.int64), 1
+    return np.ravel_multi_index([fact["codes"][dim] for dim in by], sizes), int(np.prod(sizes))
+
+# Grouped reductions over a flat group index
+def group_sum(groups, num_groups, values=None, mask=None):
+    if mask is not None:
+        groups = groups[mask]
+        values = None if values is None else values[mask]
+    return np.bincount(groups, weights=values, minlength=num_groups).astype(np.float64)
+
+# Distinct IDs per group: marked in a group x ID bitmap when that fits in
+# DISTINCT_BITMAP_LIMIT cells, otherwise by sorting the (group, ID) pairs
+def group_distinct(groups, num_groups, ids, num_ids, mask=None):
+    if mask is not None:
+        groups, ids = groups[mask], ids[mask]
+    if num_groups * num_ids <= DISTINCT_BITMAP_LIMIT:
+        seen = np.zeros(num_groups * num_ids, dtype=bool)
+        seen[groups * num_ids + ids] = True
+        return seen.reshape(num_groups, num_ids).sum(axis=1).astype(np.float64)
+    pairs = np.unique(groups * num_ids + ids)
+    return np.bincount(pairs // num_ids, minlength=num_groups).astype(np.float64)
+
+def group_max(groups, num_groups, values):
+    maxima = np.full(num_groups, np.iinfo(np.int64).min)
+    np.maximum.at(maxima, groups, values)
+    return maxima
+
+# DAX DIVIDE: blank (NaN) where the denominator is zero
+def divide(numerator, denominator):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator != 0, numerator / np.where(denominator != 0, denominator, 1), np.nan)
+
+# Compute every measure sliced by the dimensions in `by` (a subset of
+# DIMENSIONS, empty for grand totals). Returns, per measure, the label of each
+# dimension and the value for every group that has rows; measures whose fact
+# table cannot be sliced by a requested dimension are left out.
+def compute_metrics(facts, by=()):
+    by = list(by)
+    unknown = [dim for dim in by if dim not in DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown dimensions: {', '.join(unknown)}")
+    results = {}
+
+    def emit(groups, num_groups, measures):
+        present = np.bincount(groups, minlength=num_groups) > 0
+        keys = np.nonzero(present)[0]
+        labels = group_labels(facts, by, keys)
+        for name, values in measures.items():
+            results[name] = {"labels": labels, "values": values[keys]}
+
+    num_customers = facts["num_customers"]
+
+    balances = facts["account_balances"]
+    groups, num_groups = group_index(facts, balances, by)
+    if groups is not None:
+        total_aum = group_sum(groups, num_groups, balances["balance"])
+        # LASTDATE: only the rows on the latest balance date within each group
+        last_date = group_max(groups, num_groups, balances["date"])
+        emit(groups, num_groups, {
+            "Total AUM": total_aum,
+            "Current Month AUM": group_sum(groups, num_groups, balances["balance"], balances["date"] == last_date[groups]),
+            "Net Flows": group_sum(groups, num_groups, balances["net_flows"]),
+            "Net Revenue": group_sum(groups, num_groups, balances["fees"]),
+            "Investment Returns": group_sum(groups, num_groups, balances["returns"]),
+            "Avg Balance Per Customer": divide(
+                total_aum, group_distinct(groups, num_groups, balances["customer"], num_customers)
+            )
+        })
+
+    enrollments = facts["enrollments"]
+    groups, num_groups = group_index(facts, enrollments, by)
+    if groups is not None:
+        enrolled_customers = group_distinct(groups, num_groups, enrollments["customer"], num_customers)
+        emit(groups, num_groups, {
+            "Customer Retention Rate": divide(
+                group_distinct(groups, num_groups, enrollments["customer"], num_customers, enrollments["open"]),
+                enrolled_customers
+            ),
+            "Products Per Customer": divide(group_sum(groups, num_groups), enrolled_customers)
+        })
+
+    interactions = facts["service_interactions"]
+    groups, num_groups = group_index(facts, interactions, by)
+    if groups is not None:
+        emit(groups, num_groups, {
+            "First Call Resolution Rate": divide(
+                group_sum(groups, num_groups, mask=interactions["phone"] & interactions["resolved"]),
+                group_sum(groups, num_groups, mask=interactions["phone"])
+            ),
+            "Avg Satisfaction Score": divide(
+                group_sum(groups, num_groups, interactions["satisfaction"]), group_sum(groups, num_groups)
+            )
+        })
+
+    # Total Customers, the denominator of the engagement rate, is only sliced by segment
+    engagement = facts["engagement"]
+    groups, num_groups = group_index(facts, engagement, by)
+    if groups is not None:
+        customers = facts["customers"]
+        segment_customers = np.bincount(customers["codes"]["segment"], minlength=facts["sizes"]["segment"])
+        if "segment" in by:
+            total_customers = segment_customers[np.unravel_index(
+                np.arange(num_groups), [facts["sizes"][dim] for dim in by]
+            )[by.index("segment")]]
+        else:
+            total_customers = np.full(num_groups, segment_customers.sum())
+        emit(groups, num_groups, {
+            "Digital Engagement Rate": divide(
+                group_distinct(groups, num_groups, engagement["customer"], num_customers), total_customers
+            ),
+            "Avg Session Duration": divide(
+                group_sum(groups, num_groups, engagement["session_duration"]), group_sum(groups, num_groups)
+            )
+        })
+
+    # New and churned customers per group; net customers covers the groups of both
+    customers = facts["customers"]
+    retention = facts["retention"]
+    churn_groups, num_groups = group_index(facts, retention, by)
+    if churn_groups is not None:
+        churned = group_distinct(churn_groups, num_groups, retention["customer"], num_customers, retention["not_recovered"])
+        emit(churn_groups, num_groups, {"Churned Customers MTD": churned})
+    new_groups, num_groups = group_index(facts, customers, by)
+    if new_groups is not None:
+        new = group_distinct(new_groups, num_groups, customers["customer"], num_customers)
+        emit(new_groups, num_groups, {"New Customers MTD": new})
+        # Every dimension of the customers fact also slices retention
+        emit(np.concatenate([new_groups, churn_groups]), num_groups, {"Net Customers MTD": new - churned})
+
+    return {name: results[name] for name in MEASURES if name in results}
+
+# Helper function for the labels of the groups with the given flat indexes
+def group_labels(facts, by, keys):
+    if not by:
+        return {}
+    codes = np.unravel_index(keys, [facts["sizes"][dim] for dim in by])
+    labels = {}
+    for dim, dim_codes in zip(by, codes):
+        if dim == "month":
+            labels[dim] = (dim_codes + facts["first_month"]).astype("datetime64[M]").astype(str)
+        elif dim == "product":
+            labels[dim] = np.char.add("PRD", np.char.zfill(dim_codes.astype(str), 4))
+        elif dim == "segment":
+            labels[dim] = np.array(CUSTOMER_SEGMENTS)[dim_codes]
+        else:
+            labels[dim] = np.array(CHANNELS)[dim_codes]
+    return labels
+
+# Flatten computed metrics into (measure, dimension labels..., value) rows
+def metric_rows(metrics, by=()):
+    for name, result in metrics.items():
+        labels = [result["labels"][dim].tolist() for dim in by]
+        for index, value in enumerate(result["values"].tolist()):
+            yield [name] + [dim_labels[index] for dim_labels in labels] + [value]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute the dashboard's DAX measures over the generated tables.")
+    parser.add_argument("--output-dir", default="financial_dataset",
+                        help="directory holding the generated tables (default: %(default)s)")
+    parser.add_argument("--by", nargs="+", choices=DIMENSIONS, default=[],
+                        help="dimensions to slice every measure by (default: grand totals)")
+    parser.add_argument("--output", help="write the metrics to this CSV file instead of printing them")
+    args = parser.parse_args(argv)
+
+    facts = prepare_facts(load_tables(args.output_dir))
+    metrics = compute_metrics(facts, args.by)
+    rows = metric_rows(metrics, args.by)
+    if args.output is None:
+        for row in rows:
+            print(", ".join(str(value) for value in row))
+        return
+    with open(args.output, "w", newline="") as metrics_file:
+        writer = csv.writer(metrics_file)
+        writer.writerow(["measure"] + args.by + ["value"])
+        writer.writerows(rows)
+    print(f"Metrics written to {args.output}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from financial_dataset_generator import (
+    ASSET_CLASSES, CONTRIBUTION_FREQUENCIES, CUSTOMER_SEGMENTS, MARKET_CORRELATION, MARKET_DRIFT, MARKET_VOLATILITY,
+    RISK_LEVELS, SEED, WORKERS, build_calendar, column_array, first_of_next_month, load_checkpoint, month_key,
+    seasonal_effect
+)
+
+# Monte Carlo scenario mode: the generated dataset's enrollments, from their
+# closing balances in the checkpoint, are projected over the months after its
+# end date under many simulated market paths, and the spread of the outcomes
+# is reported as percentile bands per month, product and customer segment.
+#
+# Market paths follow the vectorized market engine's model (correlated daily
+# asset class returns riding the market cycle), and balances the balance
+# engines' monthly rules (contributions, withdrawals, return noise and fees).
+# Scenarios are simulated in blocks: each block draws its market paths and
+# pushes every enrollment through all of them at once, as scenario x
+# enrollment arrays (with each scenario's draws from its own random streams),
+# and blocks run in parallel worker processes. Enrollments
+# are sorted by product and segment, so per-scenario totals for each month and
+# group are summed with np.add.reduceat as balances are updated; no
+# per-scenario balance rows are kept. Blocks write their totals into a shared
+# memory-mapped scratch file, from which the percentiles are computed a few
+# groups at a time, so memory does not grow with the number of scenarios.
+SCENARIO_OUTPUT = "scenario_bands.csv"
+SCENARIO_TOTALS = "scenario_totals.npy"  # Scratch file, removed once the bands are written
+NUM_SCENARIOS = 1000
+PROJECTION_MONTHS = 12
+SCENARIO_BLOCK = 100  # Scenarios simulated together by one worker task
+SCENARIO_CELLS = 1 << 20  # Scenario x enrollment cells simulated per chunk
+PERCENTILES = [5, 25, 50, 75, 95]
+
+# Monthly totals kept per measure, month, product x segment group and scenario
+SCENARIO_MEASURES = ["aum", "fee_revenue", "net_flows"]
+
+# Helper function to gather the enrollments of every shard in the checkpoint
+# as NumPy arrays sorted by product x segment group; enrollments that churned
+# (with exact lifetime values) are left out
+def scenario_enrollments(checkpoint):
+    columns = {name: [] for name in (
+        "product", "segment", "birth_date", "balance", "monthly_contribution", "contribution_frequency"
+    )}
+    for shard in checkpoint["shards"]:
+        customers, enrollments = shard["customers"], shard["enrollments"]
+        customer = column_array(enrollments["customer"])
+        keep = np.ones(len(customer), dtype=bool)
+        if shard.get("lifetime") is not None:
+            keep = column_array(shard["lifetime"]["churn_date"]) == 0
+        columns["product"].append(column_array(enrollments["product"])[keep])
+        columns["segment"].append(column_array(customers["segment"])[customer][keep])
+        columns["birth_date"].append(column_array(customers["birth_date"])[customer][keep])
+        columns["balance"].append(column_array(shard["balances"])[keep])
+        columns["monthly_contribution"].append(column_array(enrollments["monthly_contribution"])[keep])
+        columns["contribution_frequency"].append(column_array(enrollments["contribution_frequency"])[keep])
+
+    enrollments = {
+        name: np.concatenate(values).astype(np.float64 if name in ("balance", "monthly_contribution") else np.int64)
+        for name, values in columns.items()
+    }
+    enrollments["group"] = enrollments["product"] * len(CUSTOMER_SEGMENTS) + enrollments["segment"]
+    order = np.argsort(enrollments["group"], kind="stable")
+    return {name: values[order] for name, values in enrollments.items()}
+
+# Helper function to set up the projection: the months after the dataset's end
+# date, the business days the market paths are drawn for (from the day after
+# the last market_data row), and the levels the paths start from and the
+# first month's returns are measured against
+def projection_setup(checkpoint, months):
+    config = checkpoint["config"]
+    market_state = checkpoint["market_state"]
+    month_starts = [first_of_next_month(config["end_date"])]
+    for _ in range(months - 1):
+        month_starts.append(first_of_next_month(month_starts[-1]))
+    first_ordinal = market_state["date"].toordinal()
+    last_ordinal = first_of_next_month(month_starts[-1]).toordinal() - 1
+
+    # Like the market engines, a first day on a weekend is still recorded
+    calendar = build_calendar(first_ordinal, last_ordinal)
+    recorded = calendar["business_day"].copy()
+    recorded[:1] = True
+    ordinals = np.arange(first_ordinal, last_ordinal + 1)[recorded]
+    days_since_start = (ordinals - config["start_date"].toordinal()).astype(np.float64)
+
+    levels = lambda state: state.get("asset_levels", [state["sp500_index"], state["bond_index"], 100.0, 100.0])
+    last_month = checkpoint["monthly_market"].get(month_key(config["end_date"]))
+    products = checkpoint["products"]
+    month_ordinals = np.array([date.toordinal() for date in month_starts])
+    return {
+        "month_starts": month_starts,
+        "month_ordinals": month_ordinals,
+        "month_numbers": np.array([date.month for date in month_starts]),
+        "seasonal": np.array([seasonal_effect(date) for date in month_starts]),
+        "month_bounds": np.searchsorted(ordinals, month_ordinals),
+        "market_cycle": (
+            1.0 + np.sin(days_since_start / 365 * 2 * np.pi) * 0.1
+            + np.sin(days_since_start / 30 * 2 * np.pi) * 0.2
+        ),
+        "start_levels": np.array(levels(market_state)),
+        "previous_levels": np.array(levels(last_month if last_month is not None else market_state)),
+        # Products' own asset mixes, when the market engine gave them one, or their risk factors
+        "asset_mix": np.array([p["asset_mix"] for p in products]) if all("asset_mix" in p for p in products) else None,
+        "risk_factor": np.array([(RISK_LEVELS.index(p["risk_level"]) + 1) / len(RISK_LEVELS) for p in products]),
+        "fee_pct": np.array([p["annual_fee_percentage"] / 100 / 12 for p in products]),
+        "fee_fixed": np.array([p["management_fee_fixed"] / 12 for p in products])
+    }
+
+# Helper function for a scenario's random stream: stream 0 draws its market
+# path, and for each month stream 1 its withdrawals and stream 2 its return
+# noise. Streams are derived from the seed and the scenario number alone, so a
+# scenario's draws do not depend on the block or chunk it is simulated in.
+def scenario_rng(seed, scenario, stream, month=0):
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(scenario, stream, month)))
+
+# Helper function to draw a block of market paths, each from its scenario's
+# stream: daily asset class returns averaged into monthly levels whose
+# month-over-month changes give each product's monthly return (scenarios x
+# products x months)
+def market_paths(setup, seed, scenarios):
+    num_scenarios = len(scenarios)
+    num_assets = len(ASSET_CLASSES)
+    num_days = len(setup["market_cycle"])
+    volatility = np.array(MARKET_VOLATILITY[:num_assets])
+    covariance = np.array(MARKET_CORRELATION)[:num_assets, :num_assets] * np.outer(volatility, volatility)
+    market_rngs = [scenario_rng(seed, scenario, 0) for scenario in scenarios]
+    returns = np.stack([np_rng.standard_normal((num_days, num_assets)) for np_rng in market_rngs])
+    returns = returns @ np.linalg.cholesky(covariance).T
+    returns += MARKET_DRIFT[:num_assets]
+
+    # Equities and real estate ride the cycle, bonds move against it
+    market_factor = setup["market_cycle"] + np.stack([np_rng.uniform(-0.1, 0.1, num_days) for np_rng in market_rngs])
+    returns[:, :, [0, 2]] *= market_factor[:, :, None]
+    returns[:, :, 1] /= market_factor
+    levels = setup["start_levels"] * np.exp(np.cumsum(np.log1p(returns), axis=1))
+
+    # Monthly average levels; days before the first projected month only move the levels
+    bounds = setup["month_bounds"]
+    day_counts = np.diff(np.append(bounds, num_days))
+    monthly_levels = np.add.reduceat(levels, bounds, axis=1) / day_counts[:, None]
+    previous_levels = np.concatenate([
+        np.broadcast_to(setup["previous_levels"], (num_scenarios, 1, num_assets)), monthly_levels[:, :-1]
+    ], axis=1)
+    asset_returns = monthly_levels / previous_levels - 1
+
+    if setup["asset_mix"] is not None:
+        return np.einsum("pa,sma->spm", setup["asset_mix"], asset_returns)
+    risk_factor = setup["risk_factor"][None, :, None]
+    return asset_returns[:, None, :, 0] * risk_factor + asset_returns[:, None, :, 1] * (1 - risk_factor)
+
+# Simulate one block of scenarios, writing its totals to its slice of the
+# scratch file
+def simulate_block(spec):
+    setup, enrollments = spec["setup"], spec["enrollments"]
+    num_scenarios, num_groups = spec["num_scenarios"], spec["num_groups"]
+    scenarios = range(spec["scenario_start"], spec["scenario_start"] + num_scenarios)
+    product_returns = market_paths(setup, spec["seed"], scenarios)
+    num_months = len(setup["month_starts"])
+    withdrawal_rngs = [[scenario_rng(spec["seed"], s, 1, month) for s in scenarios] for month in range(num_months)]
+    noise_rngs = [[scenario_rng(spec["seed"], s, 2, month) for s in scenarios] for month in range(num_months)]
+
+    # Contribution schedule per frequency and calendar month
+    schedule = np.zeros((len(CONTRIBUTION_FREQUENCIES), 12))
+    schedule[CONTRIBUTION_FREQUENCIES.index("Monthly"), :] = 1
+    schedule[CONTRIBUTION_FREQUENCIES.index("Quarterly"), [2, 5, 8, 11]] = 1
+    schedule[CONTRIBUTION_FREQUENCIES.index("Bi-annual"), [5, 11]] = 1
+    schedule[CONTRIBUTION_FREQUENCIES.index("Annual"), 11] = 1
+
+    totals = np.zeros((len(SCENARIO_MEASURES), num_months, num_groups, num_scenarios))
+    num_enrollments = len(enrollments["group"])
+    chunk_size = max(1, SCENARIO_CELLS // num_scenarios)
+    for chunk_start in range(0, num_enrollments, chunk_size):
+        chunk = slice(chunk_start, min(chunk_start + chunk_size, num_enrollments))
+        products = enrollments["product"][chunk]
+        # Each group's first enrollment in the chunk
+        groups = enrollments["group"][chunk]
+        group_starts = np.flatnonzero(np.diff(groups, prepend=-1))
+        chunk_groups = groups[group_starts]
+
+        contributions = (
+            enrollments["monthly_contribution"][chunk][:, None]
+            * schedule[enrollments["contribution_frequency"][chunk][:, None], setup["month_numbers"] - 1]
+            * setup["seasonal"]
+        )
+        # Withdrawals are more common after retirement age
+        age = (setup["month_ordinals"] - enrollments["birth_date"][chunk][:, None]) / 365
+        withdrawal_probability = np.where(age > 60, 0.05, 0.01)
+        monthly_fee_pct = setup["fee_pct"][products]
+        monthly_fee_fixed = setup["fee_fixed"][products]
+
+        balance = np.repeat(enrollments["balance"][chunk][None, :], num_scenarios, axis=0)
+        shape = balance.shape
+        for month in range(num_months):
+            # One uniform draw decides both whether a 1-5% withdrawal is made
+            # and its size (below the probability it is itself uniform)
+            draws = np.stack([np_rng.random(shape[1]) for np_rng in withdrawal_rngs[month]])
+            probability = withdrawal_probability[:, month]
+            withdrawals = balance * np.where(draws < probability, 0.01 + 0.04 * draws / probability, 0.0)
+            noise = np.stack([np_rng.normal(0, 0.005, shape[1]) for np_rng in noise_rngs[month]])
+            returns = balance * (product_returns[:, products, month] + noise)
+            fees = balance * monthly_fee_pct + monthly_fee_fixed
+            balance = balance + contributions[:, month] - withdrawals + returns - fees
+
+            for measure, values in enumerate((balance, fees, contributions[:, month] - withdrawals)):
+                totals[measure, month, chunk_groups] += np.add.reduceat(values, group_starts, axis=1).T
+
+    scratch = np.load(spec["totals_path"], mmap_mode="r+")
+    scratch[..., spec["scenario_start"]:spec["scenario_start"] + num_scenarios] = totals
+    scratch.flush()
+
+# Project the dataset in output_dir over `months` months under `scenarios`
+# market paths and write the percentile bands of each measure to a CSV file:
+# one row per month for all products and segments together, then one per
+# month, product and segment. Returns the output path, row count and timings.
+def run_scenarios(output_dir, scenarios=NUM_SCENARIOS, months=PROJECTION_MONTHS, workers=None, seed=SEED,
+                  output=None):
+    if scenarios < 1:
+        raise ValueError(f"scenarios must be at least 1, got {scenarios!r}")
+    if months < 1:
+        raise ValueError(f"months must be at least 1, got {months!r}")
+    run_start = time.perf_counter()
+    output = output or os.path.join(output_dir, SCENARIO_OUTPUT)
+    workers = workers or WORKERS
+    checkpoint = load_checkpoint(output_dir)
+    products = checkpoint["products"]
+    enrollments = scenario_enrollments(checkpoint)
+    setup = projection_setup(checkpoint, months)
+    num_groups = len(products) * len(CUSTOMER_SEGMENTS)
+
+    # Totals per measure, month, group and scenario, filled in by the blocks
+    totals_path = os.path.join(output_dir, SCENARIO_TOTALS)
+    shape = (len(SCENARIO_MEASURES), months, num_groups, scenarios)
+    np.lib.format.open_memmap(totals_path, mode="w+", shape=shape).flush()
+
+    try:
+        # Scenarios draw from their own streams (see scenario_rng()), so results
+        # do not depend on the worker count or on how scenarios are split into blocks
+        specs = [{
+            "seed": seed,
+            "scenario_start": start,
+            "num_scenarios": min(SCENARIO_BLOCK, scenarios - start),
+            "num_groups": num_groups,
+            "totals_path": totals_path,
+            "setup": setup,
+            "enrollments": enrollments
+        } for start in range(0, scenarios, SCENARIO_BLOCK)]
+        if workers > 1 and len(specs) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(specs))) as pool:
+                list(pool.map(simulate_block, specs))
+        else:
+            for spec in specs:
+                simulate_block(spec)
+        simulate_seconds = time.perf_counter() - run_start
+
+        # Percentiles across scenarios of each group's totals, a few groups at
+        # a time, and of the overall totals
+        totals = np.load(totals_path, mmap_mode="r")
+        group_bands = np.empty((len(PERCENTILES),) + shape[:3])
+        overall_totals = np.zeros((len(SCENARIO_MEASURES), months, scenarios))
+        group_chunk = max(1, SCENARIO_CELLS // (len(SCENARIO_MEASURES) * months * scenarios))
+        for group_start in range(0, num_groups, group_chunk):
+            chunk = slice(group_start, group_start + group_chunk)
+            chunk_totals = np.array(totals[:, :, chunk])
+            group_bands[..., chunk] = np.percentile(chunk_totals, PERCENTILES, axis=-1)
+            overall_totals += chunk_totals.sum(axis=2)
+        del totals
+    finally:
+        os.remove(totals_path)
+    group_bands = np.round(group_bands, 2)
+    overall_bands = np.round(np.percentile(overall_totals, PERCENTILES, axis=-1), 2)
+    groups = np.flatnonzero(np.bincount(enrollments["group"], minlength=num_groups))
+
+    row_count = 0
+    with open(output, "w", newline="") as output_file:
+        writer = csv.writer(output_file)
+        writer.writerow(["month", "product_id", "customer_segment"] + [
+            f"{measure}_p{percentile:02d}" for measure in SCENARIO_MEASURES for percentile in PERCENTILES
+        ])
+        for month, month_start in enumerate(setup["month_starts"]):
+            month_string = month_start.isoformat()
+            writer.writerow([month_string, "All", "All"] + overall_bands[:, :, month].T.ravel().tolist())
+            for group in groups.tolist():
+                product, segment = divmod(group, len(CUSTOMER_SEGMENTS))
+                writer.writerow([month_string, products[product]["product_id"], CUSTOMER_SEGMENTS[segment]]
+                                + group_bands[:, :, month, group].T.ravel().tolist())
+            row_count += len(groups) + 1
+
+    return {
+        "path": output,
+        "rows": row_count,
+        "scenarios": scenarios,
+        "months": months,
+        "enrollments": len(enrollments["group"]),
+        "first_month": setup["month_starts"][0].isoformat(),
+        "simulate_seconds": round(simulate_seconds, 3),
+        "seconds": round(time.perf_counter() - run_start, 3)
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Project the generated dataset's AUM, fee revenue and net flows under simulated market scenarios."
+    )
+    parser.add_argument("--output-dir", default="financial_dataset",
+                        help="directory holding the generated tables and checkpoint (default: %(default)s)")
+    parser.add_argument("--scenarios", type=int, default=NUM_SCENARIOS,
+                        help="market paths to simulate (default: %(default)s)")
+    parser.add_argument("--months", type=int, default=PROJECTION_MONTHS,
+                        help="months to project after the dataset's end date (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="processes simulating scenario blocks in parallel (default: %(default)s, the CPU count)")
+    parser.add_argument("--seed", type=int, default=SEED, help="seed of the market paths (default: %(default)s)")
+    parser.add_argument("--output", help=f"percentile bands CSV file (default: OUTPUT_DIR/{SCENARIO_OUTPUT})")
+    args = parser.parse_args(argv)
+
+    try:
+        result = run_scenarios(args.output_dir, args.scenarios, args.months, args.workers, args.seed, args.output)
+    except ValueError as error:
+        parser.error(str(error))
+    print(f"Simulated {result['scenarios']} scenarios of {result['months']} months for {result['enrollments']} "
+          f"enrollments in {result['simulate_seconds']:.2f} seconds.")
+    print(f"Percentile bands from {result['first_month']} written to {result['path']} ({result['rows']} rows).")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+import csv
+import functools
+import gzip
+import importlib.util
+import itertools
+import lzma
+import os
+import queue
+import tempfile
+import threading
+import zipfile
+
+# Columnar formats need pyarrow; without it they fall back to NumPy .npz archives.
+# pyarrow and NumPy are only imported by the sinks that use them.
+HAVE_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+# Output formats and the file extension each one writes
+OUTPUT_FORMATS = {
+    "csv": ".csv",
+    "csv.gz": ".csv.gz",
+    "csv.xz": ".csv.xz",
+    "parquet": ".parquet",
+    "feather": ".feather",
+    "npz": ".npz"
+}
+
+# Column kinds used by the table schemas:
+#   "str"      free text or IDs
+#   "category" low-cardinality text, dictionary-encoded in typed formats
+#   "date"     ISO dates, stored as dates in typed formats
+#   "int"      int64
+#   "float"    float64 (money, rates, scores)
+NUMPY_TYPES = {"str": "str", "date": "datetime64[D]", "int": "int64", "float": "float64"}
+
+# Writer pipeline settings (see write_batches()):
+#   background    write on a dedicated I/O thread instead of the calling thread
+#   queue_batches batches the I/O thread's queue holds before producers block
+#   flush         "none" leaves buffering to the file object and the OS,
+#                 "batch" flushes after every batch, "fsync" also fsyncs it
+WRITER_SETTINGS = {"background": False, "queue_batches": 8, "flush": "none"}
+FLUSH_POLICIES = ["none", "batch", "fsync"]
+
+# Characters of part-file lines per batch the CSV sinks hand to the writer
+LINE_BATCH_CHARS = 1 << 20
+
+# Part-file rows per batch the .npz sink parses and writes
+NPZ_BATCH_ROWS = 100000
+
+# Formats written through the writer pipeline
+PIPELINED_FORMATS = ["csv", "csv.gz", "csv.xz"]
+
+# Helper function to pick the format actually written for a requested format
+def resolve_output_format(output_format):
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {output_format!r}")
+    if output_format in ("parquet", "feather") and not HAVE_PYARROW:
+        return "npz"
+    return output_format
+
+# Helper function to map a column kind to its Arrow type
+def arrow_type(kind):
+    import pyarrow as pa
+
+    return {
+        "str": pa.string(),
+        "category": pa.dictionary(pa.int32(), pa.string()),
+        "date": pa.date32(),
+        "int": pa.int64(),
+        "float": pa.float64()
+    }[kind]
+
+# Helper function to flush an output file after a batch, per the flush policy
+def flush_output(out, flush):
+    if flush == "none":
+        return
+    out.flush()
+    if flush == "fsync":
+        os.fsync(out.fileno())
+
+# Write batches of rows (or lines) to an open file with write_batch, returning
+# the number of rows written. With a background writer the batches go through
+# a bounded queue to an I/O thread, so producing the next batch overlaps with
+# formatting, compressing and writing the previous ones; a producer that gets
+# queue_batches ahead blocks until the thread catches up, which bounds memory.
+def write_batches(out, batches, write_batch, writer=None):
+    settings = {**WRITER_SETTINGS, **(writer or {})}
+    row_count = 0
+    if not settings["background"]:
+        for batch in batches:
+            write_batch(batch)
+            flush_output(out, settings["flush"])
+            row_count += len(batch)
+        return row_count
+
+    pending = queue.Queue(maxsize=settings["queue_batches"])
+    failures = []
+
+    def drain():
+        # After a failure keep taking batches, so the producer never blocks on a full queue
+        while (batch := pending.get()) is not None:
+            if failures:
+                continue
+            try:
+                write_batch(batch)
+                flush_output(out, settings["flush"])
+            except Exception as error:
+                failures.append(error)
+
+    thread = threading.Thread(target=drain, daemon=True)
+    thread.start()
+    try:
+        for batch in batches:
+            if failures:
+                break
+            pending.put(batch)
+            row_count += len(batch)
+    finally:
+        pending.put(None)
+        thread.join()
+    if failures:
+        raise failures[0]
+    return row_count
+
+# Helper function to read the part files' lines in batches, prefixed with their
+# sequential ID when id_format is given
+def part_line_batches(part_paths, id_format, id_offset):
+    line_number = id_offset
+    for part_path in part_paths:
+        with open(part_path, newline="") as part:
+            while True:
+                lines = part.readlines(LINE_BATCH_CHARS)
+                if not lines:
+                    break
+                if id_format is not None:
+                    lines = [f"{id_format.format(line_number + i)},{line}" for i, line in enumerate(lines, 1)]
+                line_number += len(lines)
+                yield lines
+
+# CSV sink: concatenate the part files under a header, optionally compressed.
+# With existing_rows the parts are appended to the file (as a new gzip/xz
+# stream for the compressed formats) and numbered after those rows.
+# The file is written in binary mode, a batch at a time, so the compressor gets
+# one large buffer per batch, which it compresses without holding the GIL.
+def write_csv(path, columns, part_paths, id_format, opener=open, existing_rows=None, writer=None):
+    with opener(path, "wb" if existing_rows is None else "ab") as out:
+        if existing_rows is None:
+            out.write((",".join(name for name, _ in columns) + "\r\n").encode())
+        return write_batches(
+            out, part_line_batches(part_paths, id_format, existing_rows or 0),
+            lambda lines: out.write("".join(lines).encode()), writer
+        )
+
+# Helper function to stream the part files as typed Arrow record batches
+def read_arrow_batches(columns, part_paths, id_format):
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+    data_columns = columns[1:] if id_format is not None else columns
+    names = [name for name, _ in data_columns]
+    read_options = pa_csv.ReadOptions(column_names=names)
+    convert_options = pa_csv.ConvertOptions(
+        column_types={name: arrow_type(kind) for name, kind in data_columns}
+    )
+
+    row_count = 0
+    for part_path in part_paths:
+        if os.path.getsize(part_path) == 0:
+            continue
+        for batch in pa_csv.open_csv(part_path, read_options=read_options, convert_options=convert_options):
+            if id_format is not None:
+                ids = pa.array([id_format.format(n) for n in range(row_count + 1, row_count + batch.num_rows + 1)])
+                batch = pa.RecordBatch.from_arrays([ids] + batch.columns, names=[columns[0][0]] + names)
+            row_count += batch.num_rows
+            yield batch
+
+# Parquet sink: one row group per batch, written as the parts are read
+def write_parquet(path, columns, part_paths, id_format):
+    import pyarrow as pa
+    import pyarrow.parquet as pa_parquet
+
+    schema = pa.schema([(name, arrow_type(kind)) for name, kind in columns])
+    row_count = 0
+    with pa_parquet.ParquetWriter(path, schema, compression="zstd") as writer:
+        for batch in read_arrow_batches(columns, part_paths, id_format):
+            writer.write_batch(batch)
+            row_count += batch.num_rows
+    return row_count
+
+# Feather sink: the Arrow IPC file format holds one dictionary per column, so a
+# first pass over the parts collects the values of the category columns; the
+# second encodes each batch against those dictionaries and writes it as its own
+# record batch
+def write_feather(path, columns, part_paths, id_format):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    schema = pa.schema([(name, arrow_type(kind)) for name, kind in columns])
+    categories = {name: set() for name, kind in columns if kind == "category"}
+    for batch in read_arrow_batches(columns, part_paths, id_format):
+        for name, values in categories.items():
+            values.update(batch.column(name).dictionary.to_pylist())
+    dictionaries = {name: pa.array(sorted(values), pa.string()) for name, values in categories.items()}
+
+    row_count = 0
+    options = pa.ipc.IpcWriteOptions(compression="zstd")
+    with pa.ipc.new_file(path, schema, options=options) as writer:
+        for batch in read_arrow_batches(columns, part_paths, id_format):
+            arrays = [
+                pa.DictionaryArray.from_arrays(
+                    pc.index_in(column.cast(pa.string()), value_set=dictionaries[name]).cast(pa.int32()),
+                    dictionaries[name]
+                ) if name in dictionaries else column
+                for name, column in zip(batch.schema.names, batch.columns)
+            ]
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            row_count += batch.num_rows
+    return row_count
+
+# Helper function to read the part files' rows in batches of NPZ_BATCH_ROWS
+# parsed rows
+def part_row_batches(part_paths):
+    for part_path in part_paths:
+        with open(part_path, newline="") as part:
+            rows = csv.reader(part)
+            while batch := list(itertools.islice(rows, NPZ_BATCH_ROWS)):
+                yield batch
+
+# NumPy fallback sink: one typed array per column in a compressed .npz archive;
+# category columns are stored as int32 codes plus a "<column>.categories" array.
+# The parts are converted NPZ_BATCH_ROWS rows at a time into typed chunk files
+# (category columns as codes into the batch's own sorted categories), which are
+# then copied into one .npy file per column, with the codes mapped to the
+# table's categories, and the column files compressed into the archive
+def write_npz(path, columns, part_paths, id_format):
+    import numpy as np
+
+    offset = 1 if id_format is not None else 0
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(path) or ".") as column_dir:
+        chunks = []
+        row_count = 0
+        for batch in part_row_batches(part_paths):
+            chunk = {}
+            if id_format is not None:
+                chunk[columns[0][0]] = np.array([id_format.format(n) for n in range(row_count + 1, row_count + len(batch) + 1)])
+            for (name, kind), values in zip(columns[offset:], zip(*batch)):
+                if kind == "category":
+                    chunk[f"{name}.categories"], chunk[name] = np.unique(np.array(values, dtype=str), return_inverse=True)
+                else:
+                    chunk[name] = np.array(values, dtype=NUMPY_TYPES[kind])
+            for name, values in chunk.items():
+                np.save(f"{column_dir}/{name}.{len(chunks)}.npy", values)
+            chunks.append({name: values.dtype for name, values in chunk.items()})
+            row_count += len(batch)
+
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+            chunk_path = lambda chunk_name, i: f"{column_dir}/{chunk_name}.{i}.npy"
+            for name, kind in columns:
+                if kind == "category":
+                    batch_categories = [np.load(chunk_path(f"{name}.categories", i)) for i in range(len(chunks))]
+                    categories = np.unique(np.concatenate(batch_categories)) if chunks else np.array([], dtype=str)
+                    np.save(f"{column_dir}/{name}.categories.npy", categories)
+                    dtype = np.dtype(np.int32)
+                elif chunks:
+                    dtype = max((chunk[name] for chunk in chunks), key=lambda chunk_dtype: chunk_dtype.itemsize)
+                else:
+                    dtype = np.array([], dtype=NUMPY_TYPES[kind]).dtype
+                column = np.lib.format.open_memmap(f"{column_dir}/{name}.npy", "w+", dtype, (row_count,))
+                start = 0
+                for i in range(len(chunks)):
+                    values = np.load(chunk_path(name, i))
+                    if kind == "category":
+                        values = np.searchsorted(categories, batch_categories[i])[values]
+                    column[start:start + len(values)] = values
+                    start += len(values)
+                    os.remove(chunk_path(name, i))
+                column.flush()
+                del column
+                archive.write(f"{column_dir}/{name}.npy", f"{name}.npy")
+                os.remove(f"{column_dir}/{name}.npy")
+                if kind == "category":
+                    archive.write(f"{column_dir}/{name}.categories.npy", f"{name}.categories.npy")
+    return row_count
+
+SINKS = {
+    "csv": write_csv,
+    "csv.gz": functools.partial(write_csv, opener=functools.partial(gzip.open, compresslevel=6)),
+    "csv.xz": functools.partial(write_csv, opener=lzma.open),
+    "parquet": write_parquet,
+    "feather": write_feather,
+    "npz": write_npz
+}
+
+# Formats an existing output file can be extended in place
+APPENDABLE_FORMATS = ["csv", "csv.gz", "csv.xz"]
+
+# Write a table from its headerless CSV part files to its final output file,
+# numbering the sequential ID column (the first column) when id_format is given.
+# With existing_rows the rows are appended to the file, which already holds that
+# many rows. CSV formats are written through the writer pipeline with the given
+# writer settings. Returns the number of rows written.
+def write_output(output_format, path, columns, part_paths, id_format=None, existing_rows=None, writer=None):
+    options = {"writer": writer} if output_format in PIPELINED_FORMATS else {}
+    if existing_rows is None:
+        return SINKS[output_format](path, columns, part_paths, id_format, **options)
+    if output_format not in APPENDABLE_FORMATS:
+        raise ValueError(f"Cannot append rows to {output_format} output")
+    return SINKS[output_format](path, columns, part_paths, id_format, existing_rows=existing_rows, **options)
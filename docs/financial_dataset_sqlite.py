@@ -0,0 +1,210 @@
+import argparse
+import csv
+import gzip
+import itertools
+import lzma
+import os
+import sqlite3
+import time
+from financial_dataset_generator import ROLLUP_COLUMNS, TABLE_COLUMNS
+from financial_dataset_metrics import table_paths
+
+# SQLite export: the generated tables loaded into one local database, for
+# ad-hoc SQL and lightweight dashboards. Rows are bulk-loaded with executemany()
+# in one transaction per table and the query indexes are built once the tables
+# are full. CSV values are inserted as text; the column types' affinities store
+# them as INTEGER and REAL.
+SQLITE_DATABASE = "financial_dataset.sqlite"
+
+# Formats the export can stream
+STREAMED_FORMATS = (".csv", ".csv.gz", ".csv.xz")
+
+# Rows per executemany() call, and rows per INSERT statement: multi-row
+# VALUES lists cut the per-statement overhead of the load by about a quarter
+SQLITE_BATCH_ROWS = 50000
+SQLITE_ROWS_PER_INSERT = 50
+
+# Column kinds mapped to SQLite column types; dates stay ISO-8601 text
+SQLITE_TYPES = {"str": "TEXT", "category": "TEXT", "date": "DATE", "int": "INTEGER", "float": "REAL"}
+
+# Parents before children, so the foreign keys can be checked in load order
+SQLITE_TABLES = [
+    "advisors", "products", "customers", "enrollments", "market_data", "account_balances",
+    "service_interactions", "engagement", "retention", "rollup_balances", "rollup_service", "rollup_engagement"
+]
+
+# Primary keys, and foreign keys as (column, parent table) referencing the parent's primary key
+SQLITE_PRIMARY_KEYS = {
+    "advisors": "advisor_id",
+    "products": "product_id",
+    "customers": "customer_id",
+    "market_data": "date"
+}
+SQLITE_FOREIGN_KEYS = {
+    "enrollments": [("customer_id", "customers"), ("product_id", "products"), ("advisor_id", "advisors")],
+    "account_balances": [("customer_id", "customers"), ("product_id", "products")],
+    "service_interactions": [("customer_id", "customers")],
+    "engagement": [("customer_id", "customers")],
+    "retention": [("customer_id", "customers"), ("product_id", "products")],
+    "rollup_balances": [("product_id", "products")]
+}
+
+# Sequential IDs of the large tables: declared as unique indexes built after
+# the load rather than primary keys, which would be maintained row by row
+SQLITE_UNIQUE_KEYS = {
+    "enrollments": "enrollment_id",
+    "account_balances": "balance_id",
+    "service_interactions": "interaction_id",
+    "engagement": "engagement_id"
+}
+
+# Query indexes, built after the load: (customer_id, date), (product_id, date)
+# and date on each table's own date column
+SQLITE_INDEXES = {
+    "customers": [("enrollment_date",)],
+    "enrollments": [("customer_id", "enrollment_date"), ("product_id", "enrollment_date"), ("enrollment_date",)],
+    "account_balances": [("customer_id", "date"), ("product_id", "date"), ("date",)],
+    "service_interactions": [("customer_id", "date"), ("date",)],
+    "engagement": [("customer_id", "date"), ("date",)],
+    "retention": [("customer_id", "churn_date"), ("product_id", "churn_date"), ("churn_date",)],
+    "rollup_balances": [("product_id", "month"), ("month",)],
+    "rollup_service": [("month",)],
+    "rollup_engagement": [("month",)]
+}
+
+# Bulk-load settings: no rollback journal and no fsync while loading and
+# indexing (an interrupted export is simply rerun; a WAL journal would write
+# every page twice), a 256 MB page cache, and in-memory temporary storage and
+# one sorter thread per CPU for the index builds. Foreign keys are checked
+# after the load, not on every insert.
+LOAD_PRAGMAS = [
+    "journal_mode = OFF", "synchronous = OFF", "cache_size = -262144", "temp_store = MEMORY",
+    f"threads = {os.cpu_count() or 1}", "foreign_keys = OFF"
+]
+
+# Settings left on the finished database: WAL, so dashboards can read while a
+# query writes, and synchronous = NORMAL, the safe setting under WAL
+READ_PRAGMAS = ["journal_mode = WAL", "synchronous = NORMAL"]
+
+# Rows sampled per index by ANALYZE for the query planner's statistics
+ANALYSIS_LIMIT = 1000
+
+# Helper function for a table's CREATE TABLE statement
+def create_table_sql(table, columns):
+    definitions = [f"{name} {SQLITE_TYPES[kind]}" for name, kind in columns]
+    if table in SQLITE_PRIMARY_KEYS:
+        definitions.append(f"PRIMARY KEY ({SQLITE_PRIMARY_KEYS[table]})")
+    for column, parent in SQLITE_FOREIGN_KEYS.get(table, []):
+        definitions.append(f"FOREIGN KEY ({column}) REFERENCES {parent} ({SQLITE_PRIMARY_KEYS[parent]})")
+    return f"CREATE TABLE {table} (\n    " + ",\n    ".join(definitions) + "\n)"
+
+# Helper function to bulk-insert a generated CSV file (a table, or one of its
+# month partitions) in one transaction; returns the number of rows loaded
+def insert_rows(connection, table, path):
+    opener = {".gz": gzip.open, ".xz": lzma.open}.get(os.path.splitext(path)[1], open)
+    row_count = 0
+    with opener(path, "rt", newline="") as table_file:
+        reader = csv.reader(table_file)
+        header = next(reader)
+        values = f"({', '.join('?' * len(header))})"
+        insert = f"INSERT INTO {table} ({', '.join(header)}) VALUES "
+        insert_many = insert + ", ".join([values] * SQLITE_ROWS_PER_INSERT)
+        with connection:
+            for batch in iter(lambda: list(itertools.islice(reader, SQLITE_BATCH_ROWS)), []):
+                full = len(batch) - len(batch) % SQLITE_ROWS_PER_INSERT
+                connection.executemany(insert_many, (
+                    list(itertools.chain.from_iterable(batch[i:i + SQLITE_ROWS_PER_INSERT]))
+                    for i in range(0, full, SQLITE_ROWS_PER_INSERT)
+                ))
+                connection.executemany(insert + values, batch[full:])
+                row_count += len(batch)
+    return row_count
+
+# Load every generated table found in output_dir (rollup tables included) into
+# a new SQLite database at database_path, replacing any previous export.
+# Returns per-table row counts and timings, and the foreign key violations
+# found when check_foreign_keys is set.
+def export_sqlite(output_dir, database_path=None, check_foreign_keys=False):
+    database_path = database_path or os.path.join(output_dir, SQLITE_DATABASE)
+    schemas = {**TABLE_COLUMNS, **ROLLUP_COLUMNS}
+    paths = {}
+    for table in SQLITE_TABLES:
+        try:
+            paths[table] = table_paths(output_dir, table)
+        except FileNotFoundError:
+            continue
+        for path in paths[table]:
+            if not path.endswith(STREAMED_FORMATS):
+                raise ValueError(f"Only CSV outputs can be exported to SQLite, not {os.path.basename(path)}")
+    if not paths:
+        raise FileNotFoundError(f"No generated tables found in '{output_dir}'")
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(database_path + suffix):
+            os.remove(database_path + suffix)
+
+    export_start = time.perf_counter()
+    connection = sqlite3.connect(database_path)
+    try:
+        for pragma in LOAD_PRAGMAS:
+            connection.execute(f"PRAGMA {pragma}")
+        for table in paths:
+            connection.execute(create_table_sql(table, schemas[table]))
+
+        tables = {}
+        for table, table_files in paths.items():
+            table_start = time.perf_counter()
+            row_count = sum(insert_rows(connection, table, path) for path in table_files)
+            tables[table] = {"rows": row_count, "seconds": round(time.perf_counter() - table_start, 3)}
+
+        index_start = time.perf_counter()
+        with connection:
+            for table in paths:
+                if table in SQLITE_UNIQUE_KEYS:
+                    column = SQLITE_UNIQUE_KEYS[table]
+                    connection.execute(f"CREATE UNIQUE INDEX idx_{table}_{column} ON {table} ({column})")
+                for columns in SQLITE_INDEXES.get(table, []):
+                    connection.execute(
+                        f"CREATE INDEX idx_{table}_{'_'.join(columns)} ON {table} ({', '.join(columns)})"
+                    )
+        connection.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+        connection.execute("ANALYZE")
+        index_seconds = time.perf_counter() - index_start
+        for pragma in READ_PRAGMAS:
+            connection.execute(f"PRAGMA {pragma}")
+
+        violations = None
+        if check_foreign_keys:
+            violations = len(connection.execute("PRAGMA foreign_key_check").fetchall())
+    finally:
+        connection.close()
+
+    return {
+        "database": database_path,
+        "tables": tables,
+        "index_seconds": round(index_seconds, 3),
+        "seconds": round(time.perf_counter() - export_start, 3),
+        "bytes": os.path.getsize(database_path),
+        "foreign_key_violations": violations
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load the generated CSV tables into a local SQLite database.")
+    parser.add_argument("--output-dir", default="financial_dataset",
+                        help="directory holding the generated tables (default: %(default)s)")
+    parser.add_argument("--database", help=f"database file to create (default: OUTPUT_DIR/{SQLITE_DATABASE})")
+    parser.add_argument("--check-foreign-keys", action="store_true",
+                        help="run PRAGMA foreign_key_check on the loaded database")
+    args = parser.parse_args(argv)
+
+    result = export_sqlite(args.output_dir, args.database, args.check_foreign_keys)
+    for table, stats in result["tables"].items():
+        print(f"Loaded {stats['rows']} {table} rows in {stats['seconds']:.2f} seconds.")
+    print(f"Built indexes in {result['index_seconds']:.2f} seconds.")
+    if result["foreign_key_violations"] is not None:
+        print(f"Found {result['foreign_key_violations']} foreign key violations.")
+    print(f"SQLite database written to {result['database']} in {result['seconds']:.2f} seconds "
+          f"({result['bytes'] / 1e6:,.1f} MB).")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+import argparse
+import csv
+import datetime
+import json
+import os
+import sys
+import numpy as np
+from financial_dataset_metrics import parse_ids, read_batches, table_paths
+
+# Columnar store for account_balances: one fixed-width .npy file per column,
+# memory-mapped when opened, so lookups never re-parse the generated table.
+#
+# Every column is stored twice, in two row orders, so both kinds of lookup are
+# one contiguous slice of the memory-mapped columns (no rows are gathered or
+# copied): by_month/ clusters rows by month, then customer, product and date,
+# with each month's rows at month_offsets; by_customer/ clusters them by
+# customer, then product and date, with each customer's rows at
+# customer_offsets. The store takes twice the disk space of one copy.
+STORE_DIR = "balance_store"
+STORE_META = "store.json"
+STORE_ORDERS = {"month": "by_month", "customer": "by_customer"}
+
+# Stored columns and their on-disk types: IDs as their integer number
+# (CUS000123 -> 123), dates as day offsets from the first day of the first month
+STORE_COLUMNS = {
+    "customer": "int32",
+    "product": "int32",
+    "day": "int32",
+    "balance": "float64",
+    "contributions_mtd": "float64",
+    "withdrawals_mtd": "float64",
+    "investment_returns_mtd": "float64",
+    "fees_mtd": "float64"
+}
+VALUE_COLUMNS = ["balance", "contributions_mtd", "withdrawals_mtd", "investment_returns_mtd", "fees_mtd"]
+
+# Keys the rows of each month and each customer are sorted by, last key first
+SORT_KEYS = {"month": ["day", "product", "customer"], "customer": ["day", "product"]}
+
+# Rows sorted in memory at a time when the store is built (whole months or
+# customers, so a month with more rows is sorted on its own)
+SORT_CHUNK_ROWS = 1 << 20
+
+# Build the store from the generated account_balances table, in any output
+# format, without loading the table: a first pass over its batches counts the
+# rows of every month and customer, which gives each one its range of rows in
+# both orders; a second pass writes every batch's rows into their ranges of the
+# memory-mapped columns, in table order; then each range is sorted in place,
+# SORT_CHUNK_ROWS rows at a time.
+def build_store(output_dir, store_dir=None):
+    store_dir = store_dir or os.path.join(output_dir, STORE_DIR)
+    paths = table_paths(output_dir, "account_balances")
+
+    month_counts = {}
+    customer_counts = np.zeros(0, dtype=np.int64)
+    for _, batch in read_batches(paths, "account_balances", ["customer_id", "date"]):
+        months, counts = np.unique(batch["date"].astype("datetime64[M]").astype(np.int64), return_counts=True)
+        for month, count in zip(months.tolist(), counts.tolist()):
+            month_counts[month] = month_counts.get(month, 0) + count
+        counts = np.bincount(parse_ids(batch["customer_id"]))
+        if len(counts) > len(customer_counts):
+            counts[:len(customer_counts)] += customer_counts
+            customer_counts = counts
+        else:
+            customer_counts[:len(counts)] += counts
+
+    epoch = np.datetime64(min(month_counts) if month_counts else 0, "M")
+    num_months = max(month_counts) - min(month_counts) + 1 if month_counts else 0
+    month_sizes = np.zeros(num_months, dtype=np.int64)
+    for month, count in month_counts.items():
+        month_sizes[month - int(epoch.astype(np.int64))] = count
+    offsets = {
+        "month": np.concatenate([[0], np.cumsum(month_sizes)]).astype(np.int64),
+        "customer": np.concatenate([[0], np.cumsum(customer_counts)]).astype(np.int64)
+    }
+    rows = int(offsets["month"][-1])
+
+    stored = {}
+    for order, directory in STORE_ORDERS.items():
+        os.makedirs(os.path.join(store_dir, directory), exist_ok=True)
+        stored[order] = {
+            name: np.lib.format.open_memmap(
+                os.path.join(store_dir, directory, f"{name}.npy"), mode="w+", dtype=dtype, shape=(rows,)
+            )
+            for name, dtype in STORE_COLUMNS.items()
+        }
+
+    # Next free row of every month and customer range
+    next_rows = {order: order_offsets[:-1].copy() for order, order_offsets in offsets.items()}
+    columns = ["customer_id", "product_id", "date"] + VALUE_COLUMNS
+    for _, batch in read_batches(paths, "account_balances", columns):
+        dates = batch["date"]
+        values = {
+            "customer": parse_ids(batch["customer_id"]),
+            "product": parse_ids(batch["product_id"]),
+            "day": (dates - epoch.astype("datetime64[D]")).astype(np.int64),
+            **{name: batch[name] for name in VALUE_COLUMNS}
+        }
+        buckets = {"month": (dates.astype("datetime64[M]") - epoch).astype(np.int64), "customer": values["customer"]}
+        for order, bucket in buckets.items():
+            positions = bucket_positions(bucket, next_rows[order])
+            for name, column in stored[order].items():
+                column[positions] = values[name]
+
+    for order, columns in stored.items():
+        sort_buckets(columns, offsets[order], SORT_KEYS[order])
+        for column in columns.values():
+            column.flush()
+    np.save(os.path.join(store_dir, "month_offsets.npy"), offsets["month"])
+    np.save(os.path.join(store_dir, "customer_offsets.npy"), offsets["customer"])
+
+    meta = {
+        "epoch": str(epoch.astype("datetime64[D]")),
+        "num_months": num_months,
+        "num_customers": len(customer_counts),
+        "rows": rows,
+        "columns": STORE_COLUMNS
+    }
+    with open(os.path.join(store_dir, STORE_META), "w") as meta_file:
+        json.dump(meta, meta_file, indent=2)
+    return meta
+
+# Helper function to place a batch's rows in their buckets (months or
+# customers): each row goes to its bucket's next free row, in batch order, and
+# next_rows is advanced past them
+def bucket_positions(bucket, next_rows):
+    order = np.argsort(bucket, kind="stable")
+    sorted_bucket = bucket[order]
+    first_in_bucket = np.searchsorted(sorted_bucket, sorted_bucket)
+    positions = np.empty(len(bucket), dtype=np.int64)
+    positions[order] = next_rows[sorted_bucket] + np.arange(len(bucket)) - first_in_bucket
+    next_rows += np.bincount(bucket, minlength=len(next_rows))
+    return positions
+
+# Helper function to sort the rows of every bucket by the sort keys, in place,
+# a block of whole buckets (about SORT_CHUNK_ROWS rows) at a time
+def sort_buckets(columns, offsets, keys):
+    start = 0
+    while start < offsets[-1]:
+        # The buckets ending within SORT_CHUNK_ROWS rows, or else the next bucket alone
+        first = int(np.searchsorted(offsets, start, side="right")) - 1
+        last = int(np.searchsorted(offsets, start + SORT_CHUNK_ROWS, side="right")) - 1
+        last = max(last, first + 1)
+        stop = int(offsets[last])
+        bucket = np.repeat(np.arange(last - first), np.diff(offsets[first:last + 1]))
+        order = np.lexsort([np.asarray(columns[key][start:stop]) for key in keys] + [bucket])
+        if not np.array_equal(order, np.arange(len(order))):
+            for column in columns.values():
+                column[start:stop] = column[start:stop][order]
+        start = stop
+
+# Open a store: every column and index is a read-only memory map
+def open_store(store_dir):
+    with open(os.path.join(store_dir, STORE_META)) as meta_file:
+        meta = json.load(meta_file)
+    load = lambda *path: np.load(os.path.join(store_dir, *path[:-1], f"{path[-1]}.npy"), mmap_mode="r")
+    return {
+        "meta": meta,
+        "epoch": np.datetime64(meta["epoch"], "D"),
+        "columns": {name: load(STORE_ORDERS["month"], name) for name in STORE_COLUMNS},
+        "customer_columns": {name: load(STORE_ORDERS["customer"], name) for name in STORE_COLUMNS},
+        "month_offsets": load("month_offsets"),
+        "customer_offsets": load("customer_offsets")
+    }
+
+# Helper function to turn a month ("2024-09", "2024-09-15" or a date) into its
+# number counted from the store's first month
+def month_number(store, month):
+    if isinstance(month, (datetime.date, np.datetime64)):
+        month = np.datetime64(month, "M")
+    else:
+        month = np.datetime64(str(month)[:7], "M")
+    return int((month - store["epoch"].astype("datetime64[M]")).astype(np.int64))
+
+# Balances for a range of months, first to last inclusive: views into the
+# memory-mapped columns, nothing is copied
+def month_balances(store, first, last=None):
+    num_months = store["meta"]["num_months"]
+    first_month = min(max(month_number(store, first), 0), num_months)
+    last_month = min(max(month_number(store, first if last is None else last) + 1, first_month), num_months)
+    start, stop = store["month_offsets"][first_month], store["month_offsets"][last_month]
+    return {name: column[start:stop] for name, column in store["columns"].items()}
+
+# A customer's balance history, ordered by product and date; product_id
+# narrows it to one account. Views into the customer-ordered memory-mapped
+# columns, nothing is copied.
+def customer_balances(store, customer_id, product_id=None):
+    customer = int(parse_ids([customer_id])[0]) if isinstance(customer_id, str) else int(customer_id)
+    start = stop = 0
+    if 0 <= customer < store["meta"]["num_customers"]:
+        start, stop = store["customer_offsets"][customer], store["customer_offsets"][customer + 1]
+    if product_id is not None:
+        product = int(parse_ids([product_id])[0]) if isinstance(product_id, str) else int(product_id)
+        products = store["customer_columns"]["product"][start:stop]
+        start, stop = start + np.searchsorted(products, product), start + np.searchsorted(products, product, side="right")
+    return {name: column[start:stop] for name, column in store["customer_columns"].items()}
+
+# Helper function to convert stored day offsets back to dates
+def balance_dates(store, days):
+    return store["epoch"] + np.asarray(days, dtype="timedelta64[D]")
+
+# Helper function to turn looked-up balances back into account_balances style rows
+def balance_rows(store, balances):
+    dates = balance_dates(store, balances["day"]).astype(str).tolist()
+    customers = balances["customer"].tolist()
+    products = balances["product"].tolist()
+    values = [balances[name].tolist() for name in VALUE_COLUMNS]
+    for i, date in enumerate(dates):
+        yield [f"CUS{customers[i]:06d}", f"PRD{products[i]:04d}", date] + [column[i] for column in values]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the memory-mapped account balance store.")
+    parser.add_argument("--output-dir", default="financial_dataset",
+                        help="directory holding the generated tables (default: %(default)s)")
+    parser.add_argument("--store-dir", help=f"store directory (default: OUTPUT_DIR/{STORE_DIR})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("build", help="build the store from account_balances")
+    customer_parser = commands.add_parser("customer", help="print one customer's balance history")
+    customer_parser.add_argument("customer_id")
+    customer_parser.add_argument("--product-id")
+    month_parser = commands.add_parser("month", help="print the balances of a month, or a range of months")
+    month_parser.add_argument("first", metavar="MONTH", help="month as YYYY-MM")
+    month_parser.add_argument("last", nargs="?", metavar="LAST_MONTH", help="last month of the range")
+    args = parser.parse_args(argv)
+    store_dir = args.store_dir or os.path.join(args.output_dir, STORE_DIR)
+
+    if args.command == "build":
+        meta = build_store(args.output_dir, store_dir)
+        print(f"Stored {meta['rows']} account_balances rows ({meta['num_months']} months) in '{store_dir}'.")
+        return
+
+    store = open_store(store_dir)
+    if args.command == "customer":
+        balances = customer_balances(store, args.customer_id, args.product_id)
+    else:
+        balances = month_balances(store, args.first, args.last)
+    writer = csv.writer(sys.stdout)
+    writer.writerow(["customer_id", "product_id", "date"] + VALUE_COLUMNS)
+    writer.writerows(balance_rows(store, balances))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+from financial_dataset_generator import (
+    CHANNELS, CONTRIBUTION_FREQUENCIES, CUSTOMER_SEGMENTS, SEGMENT_WEIGHTS, TABLE_COLUMNS
+)
+from financial_dataset_metrics import parse_ids, read_batches, table_paths
+
+# Streaming checks of a generated dataset that is too large to load: every CSV
+# output is read once, in batches, in this order, so the keys a table refers to
+# are known before it is read. Keys are kept as integer-decoded IDs: one byte
+# (or one date) per customer, advisor and product, and the enrollments as a
+# sorted array of customer x product keys with their enrollment dates.
+TABLE_ORDER = [
+    "advisors", "products", "customers", "enrollments", "account_balances",
+    "service_interactions", "engagement", "retention", "market_data"
+]
+
+# Formats the validator can stream
+STREAMED_FORMATS = (".csv", ".csv.gz", ".csv.xz")
+
+# Violations kept as examples per check; all of them are counted
+MAX_EXAMPLES = 20
+
+# Days from enrollment before a churn date may fall (see generate_retention())
+MIN_CHURN_DAYS = 90
+
+# Allowed deviation of an observed share from its expected weight: this many
+# standard errors, and never less than MIN_SHARE_TOLERANCE
+SHARE_STANDARD_ERRORS = 4
+MIN_SHARE_TOLERANCE = 0.01
+
+# Helper function to record a check's violations: the count, and the row
+# number and offending value of the first MAX_EXAMPLES
+def check(report, name, failed, first_row=None, values=None):
+    entry = report["checks"].setdefault(name, {"violations": 0, "examples": []})
+    failed = np.asarray(failed)
+    count = int(failed.sum())
+    if count == 0:
+        return
+    entry["violations"] += count
+    room = MAX_EXAMPLES - len(entry["examples"])
+    for index in np.nonzero(failed)[0][:max(room, 0)].tolist():
+        entry["examples"].append({
+            "row": None if first_row is None else first_row + index,
+            "value": None if values is None else str(values[index])
+        })
+
+# Helper function to grow a key array, indexed by ID number, to hold `size` IDs
+def grow(keys, size, fill):
+    if len(keys) >= size:
+        return keys
+    grown = np.full(max(size, 2 * len(keys)), fill, dtype=keys.dtype)
+    grown[:len(keys)] = keys
+    return grown
+
+# Helper function to look IDs up in a key array, False/fill where out of range
+def lookup(keys, ids, fill):
+    found = np.full(len(ids), fill, dtype=keys.dtype)
+    in_range = (ids >= 0) & (ids < len(keys))
+    found[in_range] = keys[ids[in_range]]
+    return found
+
+# Helper function for the primary key checks: IDs seen before, in this batch
+# or an earlier one, are duplicates; returns the grown key array with the IDs
+# marked as seen
+def mark_unique(report, name, seen, ids, first_row, values):
+    seen = grow(seen, int(ids.max()) + 1 if len(ids) else 0, False)
+    duplicate = seen[ids].copy()
+    order = np.argsort(ids, kind="stable")
+    repeated = order[1:][ids[order][1:] == ids[order][:-1]]
+    duplicate[repeated] = True
+    check(report, name, duplicate, first_row, values)
+    seen[ids] = True
+    return seen
+
+# Helper function for sequential ID columns (enrollment_id, balance_id, ...),
+# numbered 1, 2, 3, ... in row order. Partitions hold their rows in month
+# order, so the IDs of a partitioned table are only checked to be unique.
+def check_sequence(report, state, table, batch, first_row):
+    id_column = TABLE_COLUMNS[table][0][0]
+    ids = batch[id_column]
+    numbers = parse_ids(ids)
+    if state["partitioned"]:
+        state["ids"] = mark_unique(report, f"{table}.duplicate_{id_column}", state["ids"], numbers, first_row, ids)
+    else:
+        check(report, f"{table}.{id_column}_sequence", numbers != first_row + np.arange(len(ids)), first_row, ids)
+
+# Helper function to check categorical values against their vocabulary
+def check_values(report, name, values, vocabulary, first_row):
+    check(report, name, ~np.isin(values, vocabulary), first_row, values)
+
+# Helper function to compare observed shares with their expected weights
+def check_shares(report, name, counts, weights, labels):
+    total = counts.sum()
+    shares = counts / total if total else np.zeros(len(counts))
+    weights = np.asarray(weights, dtype=np.float64)
+    tolerance = np.maximum(SHARE_STANDARD_ERRORS * np.sqrt(weights * (1 - weights) / max(total, 1)), MIN_SHARE_TOLERANCE)
+    report["distributions"][name] = {
+        label: {"expected": float(weight), "observed": round(float(share), 4)}
+        for label, weight, share in zip(labels, weights, shares)
+    }
+    if total:
+        check(report, name, np.abs(shares - weights) > tolerance, None, np.array(labels))
+
+# Per-table checks. Each one streams its table and updates the key state that
+# later tables are checked against.
+def check_advisors(report, state, batches):
+    for first_row, batch in batches:
+        ids = parse_ids(batch["advisor_id"])
+        state["advisors"] = mark_unique(report, "advisors.duplicate_advisor_id", state["advisors"], ids, first_row, batch["advisor_id"])
+        satisfaction = batch["customer_satisfaction_avg"]
+        check(report, "advisors.satisfaction_range", (satisfaction < 1) | (satisfaction > 5), first_row, satisfaction)
+        yield len(ids)
+
+def check_products(report, state, batches):
+    for first_row, batch in batches:
+        ids = parse_ids(batch["product_id"])
+        state["products"] = mark_unique(report, "products.duplicate_product_id", state["products"], ids, first_row, batch["product_id"])
+        state["launch_dates"] = grow(state["launch_dates"], len(state["products"]), 0)
+        state["launch_dates"][ids] = batch["launch_date"].astype(np.int64)
+        yield len(ids)
+
+def check_customers(report, state, batches):
+    segment_counts = np.zeros(len(CUSTOMER_SEGMENTS), dtype=np.int64)
+    for first_row, batch in batches:
+        ids = parse_ids(batch["customer_id"])
+        state["customers"] = mark_unique(report, "customers.duplicate_customer_id", state["customers"], ids, first_row, batch["customer_id"])
+        state["customer_dates"] = grow(state["customer_dates"], len(state["customers"]), 0)
+        state["customer_dates"][ids] = batch["enrollment_date"].astype(np.int64)
+        segments = batch["customer_segment"]
+        check_values(report, "customers.customer_segment_values", segments, CUSTOMER_SEGMENTS, first_row)
+        segment_counts += np.array([np.count_nonzero(segments == segment) for segment in CUSTOMER_SEGMENTS])
+        yield len(ids)
+    check_shares(report, "customers.segment_weights", segment_counts, SEGMENT_WEIGHTS, CUSTOMER_SEGMENTS)
+
+def check_enrollments(report, state, batches):
+    keys, dates = [], []
+    for first_row, batch in batches:
+        check_sequence(report, state, "enrollments", batch, first_row)
+        customers = parse_ids(batch["customer_id"])
+        products = parse_ids(batch["product_id"])
+        enrolled = batch["enrollment_date"].astype(np.int64)
+        if state["customers"] is not None:
+            check(report, "enrollments.customer_id_exists", ~lookup(state["customers"], customers, False),
+                  first_row, batch["customer_id"])
+            check(report, "enrollments.after_customer_enrollment",
+                  enrolled < lookup(state["customer_dates"], customers, 0), first_row, batch["enrollment_date"])
+        if state["products"] is not None:
+            check(report, "enrollments.product_id_exists", ~lookup(state["products"], products, False),
+                  first_row, batch["product_id"])
+            check(report, "enrollments.after_product_launch",
+                  enrolled < lookup(state["launch_dates"], products, 0), first_row, batch["enrollment_date"])
+        if state["advisors"] is not None:
+            check(report, "enrollments.advisor_id_exists", ~lookup(state["advisors"], parse_ids(batch["advisor_id"]), False),
+                  first_row, batch["advisor_id"])
+        check_values(report, "enrollments.contribution_frequency_values", batch["contribution_frequency"],
+                     CONTRIBUTION_FREQUENCIES, first_row)
+        check(report, "enrollments.initial_investment_positive", batch["initial_investment"] <= 0,
+              first_row, batch["initial_investment"])
+        keys.append(customers * state["product_slots"] + products)
+        dates.append(enrolled)
+        yield len(customers)
+
+    keys = np.concatenate(keys) if keys else np.zeros(0, dtype=np.int64)
+    dates = np.concatenate(dates) if dates else np.zeros(0, dtype=np.int64)
+    order = np.argsort(keys, kind="stable")
+    state["enrollment_keys"], state["enrollment_dates"] = keys[order], dates[order]
+    duplicate = np.zeros(len(keys), dtype=bool)
+    duplicate[order[1:][state["enrollment_keys"][1:] == state["enrollment_keys"][:-1]]] = True
+    check(report, "enrollments.duplicate_customer_product", duplicate, 1)
+
+# Helper function to find the enrollment of each (customer, product) pair;
+# returns whether it exists and its enrollment date
+def find_enrollments(state, customers, products):
+    keys = customers * state["product_slots"] + products
+    positions = np.minimum(np.searchsorted(state["enrollment_keys"], keys), max(len(state["enrollment_keys"]) - 1, 0))
+    if not len(state["enrollment_keys"]):
+        return np.zeros(len(keys), dtype=bool), np.zeros(len(keys), dtype=np.int64)
+    return state["enrollment_keys"][positions] == keys, state["enrollment_dates"][positions]
+
+def check_account_balances(report, state, batches):
+    for first_row, batch in batches:
+        check_sequence(report, state, "account_balances", batch, first_row)
+        if state["enrollment_keys"] is not None:
+            exists, enrolled = find_enrollments(state, parse_ids(batch["customer_id"]), parse_ids(batch["product_id"]))
+            check(report, "account_balances.enrollment_exists", ~exists, first_row, batch["balance_id"])
+            check(report, "account_balances.after_enrollment", exists & (batch["date"].astype(np.int64) < enrolled),
+                  first_row, batch["date"])
+        check(report, "account_balances.balance_non_negative", batch["balance"] < 0, first_row, batch["balance"])
+        for column in ("contributions_mtd", "withdrawals_mtd", "fees_mtd"):
+            check(report, f"account_balances.{column}_non_negative", batch[column] < 0, first_row, batch[column])
+        yield len(batch["balance_id"])
+
+# Helper function for the customer checks shared by the event tables: the
+# customer exists and the event falls on or after their enrollment
+def check_event_customers(report, state, table, batch, first_row):
+    if state["customers"] is None:
+        return
+    customers = parse_ids(batch["customer_id"])
+    check(report, f"{table}.customer_id_exists", ~lookup(state["customers"], customers, False), first_row, batch["customer_id"])
+    check(report, f"{table}.after_customer_enrollment",
+          batch["date"].astype(np.int64) < lookup(state["customer_dates"], customers, 0), first_row, batch["date"])
+
+def check_service_interactions(report, state, batches):
+    for first_row, batch in batches:
+        check_sequence(report, state, "service_interactions", batch, first_row)
+        check_event_customers(report, state, "service_interactions", batch, first_row)
+        check_values(report, "service_interactions.channel_values", batch["channel"], CHANNELS, first_row)
+        check_values(report, "service_interactions.resolution_status_values", batch["resolution_status"],
+                     ["Resolved", "Partially Resolved", "Unresolved"], first_row)
+        satisfaction = batch["satisfaction_score"]
+        check(report, "service_interactions.satisfaction_range", (satisfaction < 1) | (satisfaction > 5),
+              first_row, satisfaction)
+        check(report, "service_interactions.duration_positive", batch["duration_minutes"] <= 0,
+              first_row, batch["duration_minutes"])
+        yield len(satisfaction)
+
+def check_engagement(report, state, batches):
+    for first_row, batch in batches:
+        check_sequence(report, state, "engagement", batch, first_row)
+        check_event_customers(report, state, "engagement", batch, first_row)
+        for column in ("session_duration", "pages_viewed", "actions_taken"):
+            check(report, f"engagement.{column}_positive", batch[column] < 1, first_row, batch[column])
+        yield len(batch["engagement_id"])
+
+def check_retention(report, state, batches):
+    churned = 0
+    for first_row, batch in batches:
+        if state["enrollment_keys"] is not None:
+            exists, enrolled = find_enrollments(state, parse_ids(batch["customer_id"]), parse_ids(batch["product_id"]))
+            check(report, "retention.enrollment_exists", ~exists, first_row, batch["customer_id"])
+            check(report, "retention.churn_after_enrollment",
+                  exists & (batch["churn_date"].astype(np.int64) < enrolled + MIN_CHURN_DAYS), first_row, batch["churn_date"])
+        churned += len(batch["customer_id"])
+        yield len(batch["customer_id"])
+    if state["enrollment_keys"] is not None and len(state["enrollment_keys"]):
+        # About 5% of enrollments churn (fewer when enrolled too late to churn)
+        share = churned / len(state["enrollment_keys"])
+        report["distributions"]["retention.churn_share"] = {"expected": 0.05, "observed": round(share, 4)}
+        check(report, "retention.churn_share", [share > 0.05 + MIN_SHARE_TOLERANCE], None, [share])
+
+def check_market_data(report, state, batches):
+    previous = None
+    for first_row, batch in batches:
+        dates = batch["date"].astype(np.int64)
+        if previous is not None:
+            dates = np.concatenate([[previous], dates])
+        check(report, "market_data.dates_increasing", dates[1:] <= dates[:-1], first_row, batch["date"])
+        previous = dates[-1]
+        for column in ("sp500_index", "bond_index"):
+            check(report, f"market_data.{column}_positive", batch[column] <= 0, first_row, batch[column])
+        yield len(batch["date"])
+
+TABLE_CHECKS = {
+    "advisors": (check_advisors, ["advisor_id", "customer_satisfaction_avg"]),
+    "products": (check_products, ["product_id", "launch_date"]),
+    "customers": (check_customers, ["customer_id", "enrollment_date", "customer_segment"]),
+    "enrollments": (check_enrollments, [
+        "enrollment_id", "customer_id", "product_id", "enrollment_date", "initial_investment",
+        "contribution_frequency", "advisor_id"
+    ]),
+    "account_balances": (check_account_balances, [
+        "balance_id", "customer_id", "product_id", "date", "balance", "contributions_mtd", "withdrawals_mtd", "fees_mtd"
+    ]),
+    "service_interactions": (check_service_interactions, [
+        "interaction_id", "customer_id", "date", "channel", "satisfaction_score", "resolution_status", "duration_minutes"
+    ]),
+    "engagement": (check_engagement, [
+        "engagement_id", "customer_id", "date", "session_duration", "pages_viewed", "actions_taken"
+    ]),
+    "retention": (check_retention, ["customer_id", "product_id", "churn_date"]),
+    "market_data": (check_market_data, ["date", "sp500_index", "bond_index"])
+}
+
+# Validate every CSV table found in output_dir; tables that are missing are
+# skipped, along with the checks of other tables against their keys
+def validate(output_dir):
+    report = {"output_dir": output_dir, "tables": {}, "checks": {}, "distributions": {}}
+    state = {
+        "advisors": None, "products": None, "launch_dates": None,
+        "customers": None, "customer_dates": None,
+        "enrollment_keys": None, "enrollment_dates": None,
+        "product_slots": 1, "partitioned": False, "ids": None
+    }
+    for table in TABLE_ORDER:
+        try:
+            paths = table_paths(output_dir, table)
+        except FileNotFoundError:
+            continue
+        for path in paths:
+            if not path.endswith(STREAMED_FORMATS):
+                raise ValueError(f"Only CSV outputs can be validated, not {os.path.basename(path)}")
+        # Partitions live in a directory named after the table
+        state["partitioned"] = any(os.path.dirname(path) == os.path.join(output_dir, table) for path in paths)
+        state["ids"] = np.zeros(0, dtype=bool)
+
+        # Key arrays start empty and grow with the IDs they see
+        if table in ("advisors", "products", "customers"):
+            state[table] = np.zeros(0, dtype=bool)
+        if table == "products":
+            state["launch_dates"] = np.zeros(0, dtype=np.int64)
+        if table == "customers":
+            state["customer_dates"] = np.zeros(0, dtype=np.int64)
+        if table == "enrollments":
+            # Enrollment keys need every product ID to fit below product_slots
+            state["product_slots"] = max(len(state["products"]) if state["products"] is not None else 0, 10 ** 4)
+
+        table_check, columns = TABLE_CHECKS[table]
+        table_start = time.perf_counter()
+        rows = sum(table_check(report, state, read_batches(paths, table, columns)))
+        report["tables"][table] = {
+            "paths": paths, "rows": rows, "seconds": round(time.perf_counter() - table_start, 3)
+        }
+
+    if not report["tables"]:
+        raise FileNotFoundError(f"No generated tables found in '{output_dir}'")
+    report["violations"] = sum(entry["violations"] for entry in report["checks"].values())
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check referential integrity and distributions of the generated CSV tables.")
+    parser.add_argument("--output-dir", default="financial_dataset",
+                        help="directory holding the generated tables (default: %(default)s)")
+    parser.add_argument("--report", help="also write the full report, with example rows, to this JSON file")
+    args = parser.parse_args(argv)
+
+    report = validate(args.output_dir)
+    for table, stats in report["tables"].items():
+        print(f"Checked {stats['rows']} {table} rows in {stats['seconds']:.2f} seconds.")
+    for name, entry in report["checks"].items():
+        if entry["violations"]:
+            rows = ", ".join(str(example["row"]) for example in entry["examples"] if example["row"] is not None)
+            print(f"FAILED {name}: {entry['violations']} violations" + (f" (rows {rows})" if rows else ""))
+    if args.report:
+        with open(args.report, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+        print(f"Validation report written to {args.report}.")
+    if not report["violations"]:
+        print(f"All {len(report['checks'])} checks passed.")
+    return 1 if report["violations"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
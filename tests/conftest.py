@@ -0,0 +1,30 @@
+import os
+import sys
+import pytest
+
+# The generator and its tools are flat scripts in docs/ that import each other
+# by module name
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "docs"))
+
+from financial_dataset_generator import generate
+
+# Row counts small enough for a dataset to generate in a couple of seconds
+SMALL_ROWS = {"customers": 200, "service_interactions": 500, "engagement": 1000}
+
+# Generate a small dataset into output_dir; the identity vocabulary is cached
+# in the session's temporary directory instead of the user's cache directory
+@pytest.fixture(scope="session")
+def make_dataset(tmp_path_factory):
+    vocabulary = str(tmp_path_factory.mktemp("cache") / "identity_vocabulary.json")
+
+    def make(output_dir, **config):
+        config = dict({"rows": SMALL_ROWS, "workers": 1, "identity_vocabulary": vocabulary}, **config)
+        generate(dict(config, output_dir=str(output_dir)))
+        return str(output_dir)
+
+    return make
+
+# The default small dataset, generated once per session; tests must not modify it
+@pytest.fixture(scope="session")
+def small_dataset(make_dataset, tmp_path_factory):
+    return make_dataset(tmp_path_factory.mktemp("small") / "financial_dataset")
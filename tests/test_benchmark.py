@@ -0,0 +1,31 @@
+import pytest
+from financial_dataset_benchmark import DEFAULT_THRESHOLD, MIN_TIMED_SECONDS, compare_results
+
+def results(*stages):
+    return {"results": [
+        {"scale": 1, "stage": stage, "rows": 1000, "seconds": seconds, "rows_per_second": rate, "peak_memory": peak}
+        for stage, seconds, rate, peak in stages
+    ]}
+
+BASELINE = results(("customers", 1.0, 1000.0, 1000), ("engagement", 1.0, 1000.0, 1000))
+
+@pytest.mark.parametrize("rate, peak, regressed", [
+    (905.0, 1095, []),  # Within the threshold both ways
+    (1500.0, 500, []),  # Faster and smaller is never a regression
+    (895.0, 1000, ["rows_per_second"]),
+    (1000.0, 1105, ["peak_memory"]),
+    (800.0, 1200, ["rows_per_second", "peak_memory"])
+])
+def test_regressions_above_the_threshold(rate, peak, regressed):
+    current = results(("customers", 1.0, 1000.0, 1000), ("engagement", 1.0, rate, peak))
+    regressions = compare_results(BASELINE, current, DEFAULT_THRESHOLD)
+    assert [r["metric"] for r in regressions] == regressed
+    for regression in regressions:
+        assert regression["stage"] == "engagement"
+        assert regression["change"] == round(regression["current"] / regression["baseline"] - 1, 4)
+
+def test_untimed_and_new_stages_are_skipped():
+    baseline = results(("customers", MIN_TIMED_SECONDS / 2, 1000.0, 1000))
+    current = results(("customers", MIN_TIMED_SECONDS / 2, 100.0, 1000), ("engagement", 1.0, 1.0, None))
+    assert compare_results(baseline, current, DEFAULT_THRESHOLD) == []
+    assert compare_results(baseline, results(("customers", 1.0, 1000.0, 2000)), DEFAULT_THRESHOLD)[0]["metric"] == "peak_memory"
@@ -0,0 +1,51 @@
+import csv
+import os
+import shutil
+import numpy as np
+from financial_dataset_features import FEATURE_RING, FEATURE_TABLE, RING_TYPES, build_features
+from financial_dataset_generator import append
+from financial_dataset_metrics import load_table
+
+def read_bytes(path):
+    with open(path, "rb") as table_file:
+        return table_file.read()
+
+def test_update_equals_rebuild(make_dataset, tmp_path):
+    output_dir = make_dataset(tmp_path / "financial_dataset")
+    table_path = os.path.join(output_dir, FEATURE_TABLE)
+    built = build_features(output_dir, str(tmp_path / "updated"))
+
+    append(output_dir, months=2, workers=1)
+    updated = build_features(output_dir, str(tmp_path / "updated"), update=True)
+    assert updated["updated_months"] == 3
+    updated_table = read_bytes(table_path)
+
+    rebuilt = build_features(output_dir, str(tmp_path / "rebuilt"))
+    assert read_bytes(table_path) == updated_table
+    assert rebuilt["rows"] == updated["rows"] > built["rows"]
+
+    # An update with nothing appended rewrites the last month as it was
+    build_features(output_dir, str(tmp_path / "updated"), update=True)
+    assert read_bytes(table_path) == updated_table
+
+def test_features_match_rows(small_dataset, tmp_path):
+    # The feature table is written next to the tables, so into a copy of the dataset
+    output_dir = shutil.copytree(small_dataset, str(tmp_path / "financial_dataset"))
+    meta = build_features(output_dir, str(tmp_path / "store"))
+    with open(meta["table"], newline="") as table_file:
+        rows = [row for row in csv.DictReader(table_file) if row["month"] == f"{meta['last_month']}-01"]
+
+    # Interactions and balances of every customer over the last 3 months, from the rows
+    last_month = np.datetime64(meta["last_month"], "M")
+    interactions = load_table(output_dir, "service_interactions", ["customer_id", "date"])
+    recent = interactions["date"].astype("datetime64[M]") > last_month - 3
+    counts = dict(zip(*np.unique(interactions["customer_id"][recent], return_counts=True)))
+    balances = load_table(output_dir, "account_balances", ["customer_id", "date", "balance"])
+    current = balances["date"].astype("datetime64[M]") == last_month
+    for row in rows:
+        assert int(row["interactions_3m"]) == counts.get(row["customer_id"], 0)
+        expected = balances["balance"][current & (balances["customer_id"] == row["customer_id"])].sum()
+        assert float(row["balance"]) == round(expected, 2)
+
+    with np.load(os.path.join(str(tmp_path / "store"), FEATURE_RING)) as ring:
+        assert {name: ring[name].dtype for name in ring.files} == {name: np.dtype(t) for name, t in RING_TYPES.items()}
@@ -0,0 +1,263 @@
+import csv
+import filecmp
+import json
+import os
+import numpy as np
+import pytest
+from financial_dataset_generator import (
+    APPEND_TABLES, CHANNELS, CUSTOMER_SEGMENTS, ROLLUP_COLUMNS, RUN_REPORT, TABLE_COLUMNS, append, load_checkpoint
+)
+from financial_dataset_metrics import load_table
+from financial_dataset_validator import validate
+
+ENGINES = ["balance_engine", "market_engine", "event_engine", "enrollment_engine"]
+
+def table_files(output_dir):
+    return sorted(name for name in os.listdir(output_dir) if name.endswith(".csv"))
+
+# Helper function to check that two datasets' tables (all of them when none
+# are given) are byte-identical
+def assert_same_tables(first_dir, second_dir, tables=None):
+    if tables is None:
+        names = table_files(first_dir)
+        assert names == table_files(second_dir)
+    else:
+        names = [f"{table}.csv" for table in tables]
+    for name in names:
+        assert filecmp.cmp(os.path.join(first_dir, name), os.path.join(second_dir, name), shallow=False), name
+
+def relative_difference(first, second):
+    return abs(first - second) / abs(first)
+
+# Shards are generated from their own RNG streams, so the tables do not depend
+# on how many processes generate them
+@pytest.mark.parametrize("engine", ["loop", "vectorized"])
+def test_output_is_independent_of_workers(make_dataset, tmp_path, engine):
+    config = {name: engine for name in ENGINES}
+    config.update(shard_size=60, rollups=True)
+    one = make_dataset(tmp_path / "one", workers=1, **config)
+    three = make_dataset(tmp_path / "three", workers=3, **config)
+    assert len(table_files(one)) == 12
+    assert_same_tables(one, three)
+
+@pytest.fixture(scope="module")
+def engine_datasets(make_dataset, small_dataset, tmp_path_factory):
+    output_dir = tmp_path_factory.mktemp("engines")
+    datasets = {"loop": small_dataset}
+    for engine in ENGINES:
+        datasets[engine] = make_dataset(output_dir / engine, **{engine: "vectorized"})
+    return datasets
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_vectorized_engine_output_is_valid(engine_datasets, engine):
+    report = validate(engine_datasets[engine])
+    assert not {name: entry for name, entry in report["checks"].items() if entry["violations"]}
+
+def test_balance_engine_parity(engine_datasets):
+    loop_dir, vectorized_dir = engine_datasets["loop"], engine_datasets["balance_engine"]
+    assert_same_tables(loop_dir, vectorized_dir, ["customers", "enrollments", "market_data"])
+    columns = ["balance_id", "customer_id", "product_id", "date", "balance", "contributions_mtd",
+               "withdrawals_mtd", "investment_returns_mtd", "fees_mtd"]
+    loop = load_table(loop_dir, "account_balances", columns)
+    vectorized = load_table(vectorized_dir, "account_balances", columns)
+
+    # The same enrollment-months and contributions, with balances from other draws
+    for name in ["balance_id", "customer_id", "product_id", "date", "contributions_mtd"]:
+        np.testing.assert_array_equal(loop[name], vectorized[name])
+    assert relative_difference(loop["balance"].mean(), vectorized["balance"].mean()) < 0.05
+    assert abs((loop["withdrawals_mtd"] > 0).mean() - (vectorized["withdrawals_mtd"] > 0).mean()) < 0.01
+    for name in ["fees_mtd", "investment_returns_mtd"]:
+        loop_rate = (loop[name] / loop["balance"]).mean()
+        assert relative_difference(loop_rate, (vectorized[name] / vectorized["balance"]).mean()) < 0.05
+
+def test_market_engine_parity(engine_datasets):
+    loop_dir, vectorized_dir = engine_datasets["loop"], engine_datasets["market_engine"]
+    assert_same_tables(loop_dir, vectorized_dir, ["customers", "enrollments", "service_interactions", "engagement"])
+    columns = ["date", "sp500_index", "bond_index"]
+    loop = load_table(loop_dir, "market_data", columns)
+    vectorized = load_table(vectorized_dir, "market_data", columns)
+
+    # Every business day from the start date; the loop walk skips Mondays
+    dates = vectorized["date"]
+    assert dates[0] == loop["date"][0]
+    assert np.is_busday(dates[1:]).all() and (np.diff(dates) > np.timedelta64(0, "D")).all()
+    assert np.isin(loop["date"], dates).all()
+    for name in ["sp500_index", "bond_index"]:
+        loop_volatility = np.diff(np.log(loop[name])).std()
+        assert relative_difference(loop_volatility, np.diff(np.log(vectorized[name])).std()) < 0.25
+
+def test_event_engine_parity(engine_datasets):
+    loop_dir, vectorized_dir = engine_datasets["loop"], engine_datasets["event_engine"]
+    assert_same_tables(loop_dir, vectorized_dir, ["customers", "enrollments", "account_balances"])
+
+    columns = ["interaction_id", "channel", "satisfaction_score", "resolution_status", "duration_minutes"]
+    loop = load_table(loop_dir, "service_interactions", columns)
+    vectorized = load_table(vectorized_dir, "service_interactions", columns)
+    np.testing.assert_array_equal(loop["interaction_id"], vectorized["interaction_id"])
+    for channel in CHANNELS:
+        assert abs((loop["channel"] == channel).mean() - (vectorized["channel"] == channel).mean()) < 0.05
+    assert abs(loop["satisfaction_score"].mean() - vectorized["satisfaction_score"].mean()) < 0.15
+    resolved = lambda table: (table["resolution_status"] == "Resolved").mean()
+    assert abs(resolved(loop) - resolved(vectorized)) < 0.06
+    assert relative_difference(loop["duration_minutes"].mean(), vectorized["duration_minutes"].mean()) < 0.1
+
+    columns = ["engagement_id", "session_duration", "pages_viewed"]
+    loop = load_table(loop_dir, "engagement", columns)
+    vectorized = load_table(vectorized_dir, "engagement", columns)
+    np.testing.assert_array_equal(loop["engagement_id"], vectorized["engagement_id"])
+    for name in ["session_duration", "pages_viewed"]:
+        assert relative_difference(loop[name].mean(), vectorized[name].mean()) < 0.1
+
+def test_enrollment_engine_parity(engine_datasets):
+    loop_dir, vectorized_dir = engine_datasets["loop"], engine_datasets["enrollment_engine"]
+    assert_same_tables(loop_dir, vectorized_dir, ["customers", "products", "advisors", "market_data"])
+    customers = load_table(loop_dir, "customers", ["customer_id", "customer_segment"])
+    columns = ["customer_id", "product_id", "initial_investment", "channel", "advisor_id"]
+    loop = load_table(loop_dir, "enrollments", columns)
+    vectorized = load_table(vectorized_dir, "enrollments", columns)
+
+    assert relative_difference(len(loop["customer_id"]), len(vectorized["customer_id"])) < 0.1
+    for segment in CUSTOMER_SEGMENTS:
+        members = customers["customer_id"][customers["customer_segment"] == segment]
+        if len(members) >= 20:
+            per_customer = lambda table: np.isin(table["customer_id"], members).sum() / len(members)
+            assert relative_difference(per_customer(loop), per_customer(vectorized)) < 0.15, segment
+    assert relative_difference(loop["initial_investment"].mean(), vectorized["initial_investment"].mean()) < 0.1
+    digital = lambda table: np.isin(table["channel"], ["Web", "Mobile App"]).mean()
+    assert abs(digital(loop) - digital(vectorized)) < 0.08
+
+    # Distinct products per customer, and one advisor for all of a customer's products
+    pairs = np.char.add(vectorized["customer_id"], vectorized["product_id"])
+    assert len(np.unique(pairs)) == len(pairs)
+    advisors = np.char.add(vectorized["customer_id"], vectorized["advisor_id"])
+    assert len(np.unique(advisors)) == len(np.unique(vectorized["customer_id"]))
+
+def test_run_report(make_dataset, tmp_path):
+    output_dir = make_dataset(tmp_path / "financial_dataset", trace_memory=True)
+    with open(os.path.join(output_dir, RUN_REPORT)) as report_file:
+        report = json.load(report_file)
+
+    assert {"started", "seconds", "config", "output_dir", "output_format", "stages", "row_counts"} <= set(report)
+    assert set(report["stages"]) == set(TABLE_COLUMNS) == set(report["row_counts"])
+    for table, stats in report["stages"].items():
+        assert set(stats) == {"rows", "seconds", "rows_per_second", "peak_memory", "bytes_written"}, table
+        assert stats["rows"] == report["row_counts"][table] == len(load_table(output_dir, table, [TABLE_COLUMNS[table][0][0]]).popitem()[1])
+        assert stats["seconds"] >= 0 and stats["peak_memory"] > 0 and stats["bytes_written"] > 0
+        if stats["seconds"] > 0:
+            assert stats["rows_per_second"] == pytest.approx(stats["rows"] / stats["seconds"], rel=1e-3)
+
+# Helper function to read a dataset's tables as bytes
+def read_tables(output_dir):
+    tables = {}
+    for name in table_files(output_dir):
+        with open(os.path.join(output_dir, name), "rb") as table_file:
+            tables[name] = table_file.read()
+    return tables
+
+def test_append_keeps_existing_rows(make_dataset, tmp_path):
+    output_dir = make_dataset(tmp_path / "financial_dataset")
+    generated = read_tables(output_dir)
+
+    append(output_dir, months=1, workers=1)
+    once = read_tables(output_dir)
+    append(output_dir, months=1, workers=1)
+    twice = read_tables(output_dir)
+
+    # Appended tables only grow; every row written before stays as it was
+    for name, table in generated.items():
+        if name[:-len(".csv")] in APPEND_TABLES:
+            assert len(generated[name]) < len(once[name]) < len(twice[name]), name
+            assert once[name].startswith(table) and twice[name].startswith(once[name]), name
+        else:
+            assert once[name] == twice[name] == table, name
+
+    # The checkpoint resumes the run where it ended: the new months follow the
+    # old end date, and the sequential IDs carry on
+    end_date = np.datetime64(load_checkpoint(output_dir)["config"]["end_date"])
+    balances = load_table(output_dir, "account_balances", ["balance_id", "date"])
+    assert balances["date"].max() <= end_date
+    assert balances["balance_id"][-1] == f"BAL{len(balances['balance_id']):08d}"
+    market = load_table(output_dir, "market_data", ["date"])
+    assert (np.diff(market["date"]) > np.timedelta64(0, "D")).all()
+
+# Helper function to sum values per group key, the rows of a rollup table
+def group_sums(keys, values):
+    groups, inverse = np.unique(np.array(keys).T, axis=0, return_inverse=True)
+    sums = [np.bincount(inverse.ravel(), value, minlength=len(groups)) for value in values]
+    return {tuple(group): tuple(column[i] for column in sums) for i, group in enumerate(groups.tolist())}
+
+# Helper function to read a rollup table's columns, typed as in ROLLUP_COLUMNS
+def load_rollup(output_dir, table):
+    with open(os.path.join(output_dir, f"{table}.csv"), newline="") as table_file:
+        rows = list(csv.DictReader(table_file))
+    types = {"date": str, "category": str, "int": int, "float": float}
+    return {name: np.array([types[kind](row[name]) for row in rows]) for name, kind in ROLLUP_COLUMNS[table]}
+
+def assert_same_groups(rollup, base, tolerance):
+    assert set(rollup) == set(base)
+    for key, values in base.items():
+        np.testing.assert_allclose(rollup[key], values, rtol=0, atol=tolerance(values[0]), err_msg=str(key))
+
+# Rollups are summed from the unrounded values, so money sums may differ from
+# sums of the rounded rows by half a cent per row
+def test_rollups_equal_grouped_rows(make_dataset, tmp_path):
+    output_dir = make_dataset(tmp_path / "financial_dataset", rollups=True)
+    month = lambda dates: dates.astype("datetime64[M]").astype(str)
+    half_cents = lambda rows: 0.005 * rows + 1e-6
+
+    customers = load_table(output_dir, "customers", ["customer_id", "customer_segment"])
+    segments = dict(zip(customers["customer_id"].tolist(), customers["customer_segment"].tolist()))
+    columns = ["customer_id", "product_id", "date", "balance", "contributions_mtd", "withdrawals_mtd",
+               "investment_returns_mtd", "fees_mtd"]
+    balances = load_table(output_dir, "account_balances", columns)
+    rollup = load_rollup(output_dir, "rollup_balances")
+    assert_same_groups(
+        group_sums([rollup["month"].astype("datetime64[M]").astype(str), rollup["product_id"], rollup["customer_segment"]],
+                   [rollup[name] for name in ["balance_records", "aum", "contributions", "withdrawals", "investment_returns", "fees"]]),
+        group_sums([month(balances["date"]), balances["product_id"], [segments[c] for c in balances["customer_id"].tolist()]],
+                   [np.ones(len(balances["date"]))] + [balances[name] for name in columns[3:]]),
+        half_cents
+    )
+
+    interactions = load_table(output_dir, "service_interactions", ["date", "channel", "reason_code", "satisfaction_score", "resolution_status"])
+    rollup = load_rollup(output_dir, "rollup_service")
+    assert_same_groups(
+        group_sums([rollup["month"].astype("datetime64[M]").astype(str), rollup["channel"], rollup["reason_code"]],
+                   [rollup["interactions"], rollup["resolved_interactions"], rollup["avg_satisfaction_score"] * rollup["interactions"]]),
+        group_sums([month(interactions["date"]), interactions["channel"], interactions["reason_code"]],
+                   [np.ones(len(interactions["date"])), interactions["resolution_status"] == "Resolved", interactions["satisfaction_score"]]),
+        half_cents
+    )
+
+    columns = ["date", "device_type", "action_type", "session_duration", "pages_viewed", "actions_taken"]
+    engagement = load_table(output_dir, "engagement", columns)
+    rollup = load_rollup(output_dir, "rollup_engagement")
+    assert_same_groups(
+        group_sums([rollup["month"].astype("datetime64[M]").astype(str), rollup["device_type"], rollup["action_type"]],
+                   [rollup[name] for name in ["sessions", "session_minutes", "pages_viewed", "actions_taken"]]),
+        group_sums([month(engagement["date"]), engagement["device_type"], engagement["action_type"]],
+                   [np.ones(len(engagement["date"]))] + [engagement[name] for name in columns[3:]]),
+        lambda rows: 0
+    )
+
+# With exact lifetime values a churned enrollment's balances stop on its churn
+# date and its lifetime value is the fees it paid, which the rows hold rounded
+@pytest.mark.parametrize("engine", ["loop", "vectorized"])
+def test_exact_lifetime_value_is_the_fees_paid(make_dataset, tmp_path, engine):
+    output_dir = make_dataset(tmp_path / "financial_dataset", balance_engine=engine, exact_lifetime_value=True)
+    enrollments = load_table(output_dir, "enrollments", ["customer_id", "product_id"])
+    accounts, counts = np.unique(np.char.add(enrollments["customer_id"], enrollments["product_id"]), return_counts=True)
+    single = set(accounts[counts == 1].tolist())
+
+    balances = load_table(output_dir, "account_balances", ["customer_id", "product_id", "date", "fees_mtd"])
+    balance_accounts = np.char.add(balances["customer_id"], balances["product_id"])
+    retention = load_table(output_dir, "retention", ["customer_id", "product_id", "churn_date", "total_customer_lifetime_value"])
+    checked = 0
+    for customer, product, churn_date, lifetime_value in zip(*retention.values()):
+        if customer + product not in single:
+            continue
+        rows = balance_accounts == customer + product
+        assert balances["date"][rows].max() <= churn_date
+        assert lifetime_value == pytest.approx(balances["fees_mtd"][rows].sum(), abs=0.005 * rows.sum() + 0.01)
+        checked += 1
+    assert checked > 0
@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+from financial_dataset_metrics import METRIC_COLUMNS, load_table, parse_ids
+
+def test_parse_ids_across_width_boundaries():
+    ids = ["CUS999999", "CUS1000000", "CUS000001", "CUS1234567", "CUS000100"]
+    assert parse_ids(ids).tolist() == [999999, 1000000, 1, 1234567, 100]
+    assert parse_ids(np.array(["ENR9999999", "ENR10000000"])).tolist() == [9999999, 10000000]
+    assert parse_ids([]).tolist() == []
+
+@pytest.mark.parametrize("output_format", ["csv.gz", "csv.xz", "parquet", "npz"])
+def test_load_table_matches_csv(make_dataset, small_dataset, tmp_path, output_format):
+    output_dir = make_dataset(tmp_path / output_format, output_format=output_format)
+    for table, columns in METRIC_COLUMNS.items():
+        expected = load_table(small_dataset, table, columns)
+        loaded = load_table(output_dir, table, columns)
+        for name in columns:
+            np.testing.assert_array_equal(loaded[name], expected[name], err_msg=f"{table}.{name}")
@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+from financial_dataset_generator import MANIFEST, PARTITIONED_TABLES, append
+
+def read_manifest(output_dir):
+    with open(os.path.join(output_dir, MANIFEST)) as manifest_file:
+        return json.load(manifest_file)["tables"]
+
+# Helper function to check every partition against its manifest entry: the
+# SHA-256 and count of its rows (the lines after the header) and its date range
+def check_partitions(output_dir, manifest):
+    for table, partitions in manifest.items():
+        for month, partition in partitions.items():
+            with open(os.path.join(output_dir, partition["path"]), "rb") as partition_file:
+                partition_file.readline()
+                rows = partition_file.read()
+            assert hashlib.sha256(rows).hexdigest() == partition["sha256"], partition["path"]
+            lines = rows.decode().splitlines()
+            assert len(lines) == partition["rows"]
+            assert partition["first_date"][:7] == partition["last_date"][:7] == month
+            assert partition["path"] == f"{table}/{month}.csv"
+
+def modified_times(output_dir, manifest):
+    return {
+        partition["path"]: os.stat(os.path.join(output_dir, partition["path"])).st_mtime_ns
+        for partitions in manifest.values() for partition in partitions.values()
+    }
+
+def test_partitions_hold_the_table_rows(make_dataset, small_dataset, tmp_path):
+    output_dir = make_dataset(tmp_path / "partitioned", partition_months=True)
+    manifest = read_manifest(output_dir)
+    assert set(manifest) == set(PARTITIONED_TABLES)
+    check_partitions(output_dir, manifest)
+
+    # Sorted by their IDs, the partitions' rows are the single-file table's rows
+    for table, partitions in manifest.items():
+        rows = []
+        for month in sorted(partitions):
+            with open(os.path.join(output_dir, partitions[month]["path"])) as partition_file:
+                rows.extend(partition_file.read().splitlines()[1:])
+        with open(os.path.join(small_dataset, f"{table}.csv")) as table_file:
+            assert sorted(rows) == table_file.read().splitlines()[1:]
+
+def test_unchanged_partitions_are_not_rewritten(make_dataset, tmp_path):
+    output_dir = make_dataset(tmp_path / "partitioned", partition_months=True)
+    manifest = read_manifest(output_dir)
+    written = modified_times(output_dir, manifest)
+
+    # The same run again: every partition hashes the same and is left as it is
+    make_dataset(output_dir, partition_months=True)
+    rerun = read_manifest(output_dir)
+    assert not any(p["changed"] for partitions in rerun.values() for p in partitions.values())
+    assert {table: {m: p["sha256"] for m, p in partitions.items()} for table, partitions in rerun.items()} == \
+           {table: {m: p["sha256"] for m, p in partitions.items()} for table, partitions in manifest.items()}
+    assert modified_times(output_dir, rerun) == written
+
+    # A missing partition is the only one written again
+    missing = manifest["engagement"]["2022-06"]["path"]
+    os.remove(os.path.join(output_dir, missing))
+    make_dataset(output_dir, partition_months=True)
+    changed = [p["path"] for partitions in read_manifest(output_dir).values() for p in partitions.values() if p["changed"]]
+    assert changed == [missing]
+    check_partitions(output_dir, read_manifest(output_dir))
+
+def test_append_extends_the_last_partitions(make_dataset, tmp_path):
+    output_dir = make_dataset(tmp_path / "partitioned", partition_months=True)
+    manifest = read_manifest(output_dir)
+    written = modified_times(output_dir, manifest)
+
+    append(output_dir, months=1, workers=1)
+    appended = read_manifest(output_dir)
+    check_partitions(output_dir, appended)
+    for table, partitions in appended.items():
+        last_month = max(manifest[table])
+        assert max(partitions) > last_month
+        for month, partition in partitions.items():
+            # Months before the old last month are untouched, later ones are
+            # new, and the old last month changed only if rows were added to it
+            if month == last_month:
+                assert partition["changed"] == (partition["rows"] > manifest[table][month]["rows"])
+            else:
+                assert partition["changed"] == (month > last_month)
+            if month < last_month:
+                assert partition == dict(manifest[table][month], changed=False)
+                assert os.stat(os.path.join(output_dir, partition["path"])).st_mtime_ns == written[partition["path"]]
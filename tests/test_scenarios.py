@@ -0,0 +1,28 @@
+import csv
+import numpy as np
+import financial_dataset_scenarios
+from financial_dataset_scenarios import PERCENTILES, SCENARIO_MEASURES, run_scenarios
+
+def read_bytes(path):
+    with open(path, "rb") as bands_file:
+        return bands_file.read()
+
+# Every scenario draws from its own streams, so the bands are the same whatever
+# the worker count, block size or chunk size
+def test_bands_are_independent_of_workers_and_blocks(small_dataset, tmp_path, monkeypatch):
+    single = run_scenarios(small_dataset, scenarios=50, months=3, workers=1, output=str(tmp_path / "single.csv"))
+    monkeypatch.setattr(financial_dataset_scenarios, "SCENARIO_BLOCK", 7)
+    monkeypatch.setattr(financial_dataset_scenarios, "SCENARIO_CELLS", 1000)
+    split = run_scenarios(small_dataset, scenarios=50, months=3, workers=3, output=str(tmp_path / "split.csv"))
+    assert split["rows"] == single["rows"] > 3
+    assert read_bytes(split["path"]) == read_bytes(single["path"])
+
+def test_bands_are_ordered(small_dataset, tmp_path):
+    result = run_scenarios(small_dataset, scenarios=40, months=2, workers=1, output=str(tmp_path / "bands.csv"))
+    with open(result["path"], newline="") as bands_file:
+        rows = list(csv.DictReader(bands_file))
+    assert len(rows) == result["rows"]
+    for row in rows:
+        for measure in SCENARIO_MEASURES:
+            bands = np.array([float(row[f"{measure}_p{percentile:02d}"]) for percentile in PERCENTILES])
+            assert (np.diff(bands) >= 0).all(), (row["month"], row["product_id"], row["customer_segment"], measure)
@@ -0,0 +1,63 @@
+import filecmp
+import io
+import os
+import numpy as np
+import pytest
+import financial_dataset_sinks
+from financial_dataset_generator import TABLE_COLUMNS
+from financial_dataset_metrics import load_table
+from financial_dataset_sinks import HAVE_PYARROW, write_batches
+
+# Small batches, so the typed sinks write every table in several pieces
+@pytest.mark.parametrize("output_format", [
+    "npz", pytest.param("feather", marks=pytest.mark.skipif(not HAVE_PYARROW, reason="needs pyarrow"))
+])
+def test_typed_formats_hold_the_csv_rows(make_dataset, small_dataset, tmp_path, monkeypatch, output_format):
+    monkeypatch.setattr(financial_dataset_sinks, "NPZ_BATCH_ROWS", 300)
+    output_dir = make_dataset(tmp_path / output_format, output_format=output_format)
+    for table, columns in TABLE_COLUMNS.items():
+        names = [name for name, _ in columns]
+        typed = load_table(output_dir, table, names)
+        rows = load_table(small_dataset, table, names)
+        for name in names:
+            np.testing.assert_array_equal(typed[name], rows[name], err_msg=f"{table}.{name}")
+
+# The background writer with a one-batch queue writes the same files as
+# synchronous writes
+def test_background_writer_matches_synchronous(make_dataset, small_dataset, tmp_path):
+    output_dir = make_dataset(tmp_path / "background", background_writer=True, writer_queue_batches=1, flush_policy="batch")
+    names = sorted(name for name in os.listdir(small_dataset) if name.endswith(".csv"))
+    assert names == sorted(name for name in os.listdir(output_dir) if name.endswith(".csv"))
+    for name in names:
+        assert filecmp.cmp(os.path.join(small_dataset, name), os.path.join(output_dir, name), shallow=False), name
+
+@pytest.mark.parametrize("background", [False, True])
+def test_writer_errors_are_raised(background):
+    produced = []
+
+    def batches():
+        for index in range(100):
+            produced.append(index)
+            yield [index]
+
+    def write_batch(batch):
+        if batch[0] == 3:
+            raise OSError("disk full")
+        out.write(f"{batch[0]}\n")
+
+    out = io.StringIO()
+    with pytest.raises(OSError, match="disk full"):
+        write_batches(out, batches(), write_batch, {"background": background, "queue_batches": 1})
+    assert out.getvalue() == "0\n1\n2\n"
+    # Generation stops soon after the failure instead of running to the end
+    assert len(produced) < 10
+
+def test_background_writes_match_synchronous_writes():
+    written = {}
+    for background in (False, True):
+        out = io.StringIO()
+        count = write_batches(out, ([f"{i},{j}\n" for j in range(i)] for i in range(50)),
+                              lambda batch: out.writelines(batch), {"background": background, "queue_batches": 2})
+        written[background] = (count, out.getvalue())
+    assert written[True] == written[False]
+    assert written[True][0] == sum(range(50))
@@ -0,0 +1,21 @@
+import os
+import sqlite3
+from financial_dataset_sqlite import SQLITE_TABLES, export_sqlite
+
+def test_export_holds_every_row(small_dataset, tmp_path):
+    database = str(tmp_path / "financial_dataset.sqlite")
+    result = export_sqlite(small_dataset, database, check_foreign_keys=True)
+    assert result["foreign_key_violations"] == 0
+
+    tables = [table for table in SQLITE_TABLES if os.path.exists(os.path.join(small_dataset, f"{table}.csv"))]
+    assert set(result["tables"]) == set(tables)
+    connection = sqlite3.connect(database)
+    try:
+        for table in tables:
+            with open(os.path.join(small_dataset, f"{table}.csv")) as table_file:
+                rows = sum(1 for _ in table_file) - 1
+            assert result["tables"][table]["rows"] == rows, table
+            assert connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == rows, table
+        assert connection.execute("PRAGMA foreign_key_check").fetchall() == []
+    finally:
+        connection.close()
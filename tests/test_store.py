@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+import financial_dataset_store
+from financial_dataset_metrics import load_table, parse_ids
+from financial_dataset_store import (
+    STORE_COLUMNS, VALUE_COLUMNS, build_store, customer_balances, month_balances, open_store
+)
+
+# The expected store rows: account_balances loaded whole and sorted by keys
+def expected_rows(output_dir, keys):
+    balances = load_table(output_dir, "account_balances", ["customer_id", "product_id", "date"] + VALUE_COLUMNS)
+    epoch = balances["date"].astype("datetime64[M]").min().astype("datetime64[D]")
+    columns = {
+        "customer": parse_ids(balances["customer_id"]),
+        "product": parse_ids(balances["product_id"]),
+        "day": (balances["date"] - epoch).astype(np.int64),
+        "month": balances["date"].astype("datetime64[M]").astype(np.int64),
+        **{name: balances[name] for name in VALUE_COLUMNS}
+    }
+    order = np.lexsort([columns[key] for key in reversed(keys)])
+    return {name: column[order] for name, column in columns.items()}
+
+# Small sort chunks make the build sort many blocks of months and customers
+@pytest.mark.parametrize("sort_chunk_rows", [1 << 20, 500])
+def test_store_matches_table(small_dataset, tmp_path, monkeypatch, sort_chunk_rows):
+    monkeypatch.setattr(financial_dataset_store, "SORT_CHUNK_ROWS", sort_chunk_rows)
+    meta = build_store(small_dataset, str(tmp_path / "store"))
+    store = open_store(str(tmp_path / "store"))
+
+    by_month = expected_rows(small_dataset, ["month", "customer", "product", "day"])
+    assert meta["rows"] == len(by_month["customer"])
+    for name in STORE_COLUMNS:
+        np.testing.assert_array_equal(store["columns"][name], by_month[name])
+
+    by_customer = expected_rows(small_dataset, ["customer", "product", "day"])
+    for customer in range(meta["num_customers"] + 1):
+        balances = customer_balances(store, f"CUS{customer:06d}")
+        rows = by_customer["customer"] == customer
+        for name in STORE_COLUMNS:
+            np.testing.assert_array_equal(balances[name], by_customer[name][rows])
+        if rows.any():
+            product = int(by_customer["product"][rows][0])
+            account = customer_balances(store, customer, f"PRD{product:04d}")
+            np.testing.assert_array_equal(account["day"], by_customer["day"][rows & (by_customer["product"] == product)])
+
+def test_lookups_are_views(small_dataset, tmp_path):
+    build_store(small_dataset, str(tmp_path / "store"))
+    store = open_store(str(tmp_path / "store"))
+    for balances, columns in (
+        (month_balances(store, "2024-01", "2024-03"), store["columns"]),
+        (customer_balances(store, "CUS000001"), store["customer_columns"])
+    ):
+        assert len(balances["balance"])
+        for name, column in balances.items():
+            assert np.shares_memory(column, columns[name])
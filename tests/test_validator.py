@@ -0,0 +1,44 @@
+import csv
+import os
+import financial_dataset_metrics
+from financial_dataset_validator import validate
+
+# Number added to every customer ID, so the small dataset's customers run from
+# CUS999901 to CUS1000100 and cross the six-digit width
+CUSTOMER_OFFSET = 999900
+
+def renumber_customers(source_dir, output_dir):
+    os.makedirs(output_dir)
+    for name in os.listdir(source_dir):
+        if not name.endswith(".csv"):
+            continue
+        with open(os.path.join(source_dir, name), newline="") as source, \
+                open(os.path.join(output_dir, name), "w", newline="") as output:
+            reader = csv.reader(source)
+            writer = csv.writer(output)
+            header = next(reader)
+            writer.writerow(header)
+            column = header.index("customer_id") if "customer_id" in header else None
+            for row in reader:
+                if column is not None:
+                    row[column] = f"CUS{int(row[column][3:]) + CUSTOMER_OFFSET:06d}"
+                writer.writerow(row)
+
+def failed_checks(report):
+    return {name: entry for name, entry in report["checks"].items() if entry["violations"]}
+
+def test_generated_dataset_is_valid(small_dataset):
+    report = validate(small_dataset)
+    assert not failed_checks(report)
+    assert report["tables"]["customers"]["rows"] == 200
+
+# Small batches, so some hold only six-digit customer IDs and others both widths
+def test_ids_crossing_a_width_boundary_are_valid(small_dataset, tmp_path, monkeypatch):
+    monkeypatch.setattr(financial_dataset_metrics, "BLOCK_BYTES", 4096)
+    monkeypatch.setattr(financial_dataset_metrics, "BATCH_ROWS", 50)
+    output_dir = str(tmp_path / "renumbered")
+    renumber_customers(small_dataset, output_dir)
+    report = validate(output_dir)
+    assert not failed_checks(report)
+    assert report["checks"]["enrollments.customer_id_exists"]["violations"] == 0
+    assert report["tables"]["account_balances"]["rows"] == validate(small_dataset)["tables"]["account_balances"]["rows"]